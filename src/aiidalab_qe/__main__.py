@@ -1,5 +1,6 @@
 """For running the app from the command line used for post_install script."""
 
+import contextlib
 from pathlib import Path
 import sys
 import click
@@ -56,6 +57,24 @@ def install_pseudos(profile, source):
         raise click.ClickException(f"Failed to set up pseudo potentials: {error}")
 
 
+@cli.command()
+@click.option("-f", "--force", is_flag=True, help="Download the archives again.")
+@click.option("-p", "--profile", default=_DEFAULT_PROFILE, help="AiiDA profile name.")
+def install_xas_pseudos(force, profile):
+    """Download and import the core-hole pseudopotentials of the XAS plugin."""
+    load_profile(profile)
+    from aiidalab_qe.plugins.xas.setup_pseudos import install
+
+    try:
+        for msg in install(force=force):
+            click.echo(msg)
+        click.secho("Core-hole pseudopotentials are installed!", fg="green")
+    except Exception as error:
+        raise click.ClickException(
+            f"Failed to set up the core-hole pseudopotentials: {error}"
+        )
+
+
 @cli.command()
 @click.option(
     "dest",
@@ -100,5 +119,30 @@ def test_plugin(plugin_name, profile):
         sys.exit(1)  # Exit with status 1 to indicate failure
 
 
+@cli.command()
+@click.option("-p", "--profile", default=_DEFAULT_PROFILE, help="AiiDA profile name.")
+@click.option("--json", "as_json", is_flag=True, help="Print the timings as JSON.")
+def profile_startup(profile, as_json):
+    """Construct the app without displaying it and print the time of each phase."""
+    from aiidalab_qe.profiling import phase, profiler
+
+    profiler.enabled = True
+    # Only the report is printed to the standard output.
+    with contextlib.redirect_stdout(sys.stderr):
+        with phase("load AiiDA profile"):
+            load_profile(profile)
+        with phase("import the app"):
+            from aiidalab_qe.app.main import App
+        app = App(qe_auto_setup=False)
+        # The steps that are only created once they are reached.
+        with phase("deferred steps"):
+            app._build_steps(3)
+
+    if as_json:
+        click.echo(profiler.to_json())
+    else:
+        click.echo(profiler.format_table())
+
+
 if __name__ == "__main__":
     cli()
@@ -13,78 +13,179 @@ from aiidalab_qe.app.result import ViewQeAppWorkChainStatusAndResultsStep
 from aiidalab_qe.app.structure import StructureSelectionStep
 from aiidalab_qe.app.submission import SubmitQeAppWorkChainStep
 from aiidalab_qe.common import QeAppWorkChainSelector
+from aiidalab_qe.common.setup_codes import QESetupWidget
+from aiidalab_qe.common.setup_pseudos import PseudosInstallWidget
+from aiidalab_qe.profiling import phase, profiler
+
+
+class LazyStep(ipw.VBox, WizardAppWidgetStep):
+    """Placeholder of a step of the wizard, the step is only created when needed.
+
+    The state of the placeholder follows the state of the step once created.
+    """
+
+    def __init__(self, create_step, auto_advance=False, **kwargs):
+        self._create_step = create_step
+        self.step = None
+        super().__init__(auto_advance=auto_advance, **kwargs)
+
+    def build(self):
+        """Create the step, if not done yet, and return it."""
+        if self.step is None:
+            self.step = self._create_step()
+            ipw.dlink((self.step, "state"), (self, "state"))
+            self.children = [self.step]
+        return self.step
+
+    def can_reset(self):
+        return self.step is None or self.step.can_reset()
+
+    def reset(self):
+        if self.step is not None and hasattr(self.step, "reset"):
+            self.step.reset()
 
 
 class App(ipw.VBox):
-    """The main widget that combines all the application steps together."""
+    """The main widget that combines all the application steps together.
+
+    Only the structure step is created with the app. The configuration and
+    submission steps are created together once one of them is needed, e.g.
+    when the structure is confirmed, and the results step once it is reached.
+    The setup of the codes and pseudopotentials starts with the app, its
+    status is shown by the submission step once created.
+    """
+
+    def __init__(self, qe_auto_setup=True, profile_startup=False):
+        if profile_startup:
+            # The timings are reported by ``aiidalab_qe.profiling.profiler``.
+            profiler.enabled = True
+
+        with phase("App"):
+            self._init_app(qe_auto_setup)
+
+    def _init_app(self, qe_auto_setup):
+        self.qe_auto_setup = qe_auto_setup
+
+        # Start the setup in the background, independently of the steps.
+        with phase("pseudopotentials installation check"):
+            self._sssp_installation_status = PseudosInstallWidget(
+                auto_start=qe_auto_setup
+            )
+        with phase("QE setup check"):
+            self._qe_setup_status = QESetupWidget(auto_start=qe_auto_setup)
 
-    def __init__(self, qe_auto_setup=True):
         # Create the application steps
-        self.structure_step = StructureSelectionStep(auto_advance=True)
+        with phase("structure step"):
+            self.structure_step = StructureSelectionStep(auto_advance=True)
         self.structure_step.observe(self._observe_structure_selection, "structure")
-        self.configure_step = ConfigureQeAppWorkChainStep(auto_advance=True)
-        self.submit_step = SubmitQeAppWorkChainStep(
-            auto_advance=True,
-            qe_auto_setup=qe_auto_setup,
+        self._lazy_steps = [
+            LazyStep(self._create_configure_step, auto_advance=True),
+            LazyStep(self._create_submit_step, auto_advance=True),
+            LazyStep(self._create_results_step),
+        ]
+
+        # Add the application steps to the application
+        self._wizard_app_widget = WizardAppWidget(
+            steps=[
+                ("Select structure", self.structure_step),
+                ("Configure workflow", self._lazy_steps[0]),
+                ("Choose computational resources", self._lazy_steps[1]),
+                ("Status & Results", self._lazy_steps[2]),
+            ]
         )
-        self.results_step = ViewQeAppWorkChainStatusAndResultsStep()
+        self._wizard_app_widget.observe(self._build_selected_step, "selected_index")
+        self._wizard_app_widget.observe(self._observe_selected_index, "selected_index")
 
-        # Link the application steps
+        # Add process selection header
+        with phase("work chain selector"):
+            self.work_chain_selector = QeAppWorkChainSelector(
+                layout=ipw.Layout(width="auto")
+            )
+        self.work_chain_selector.observe(self._observe_process_selection, "value")
+
+        super().__init__(
+            children=[
+                self.work_chain_selector,
+                self._wizard_app_widget,
+            ]
+        )
+
+    def _create_configure_step(self):
+        with phase("configure step"):
+            configure_step = ConfigureQeAppWorkChainStep(auto_advance=True)
         ipw.dlink(
             (self.structure_step, "state"),
-            (self.configure_step, "previous_step_state"),
+            (configure_step, "previous_step_state"),
         )
         ipw.dlink(
             (self.structure_step, "confirmed_structure"),
-            (self.submit_step, "input_structure"),
+            (configure_step, "input_structure"),
         )
+        return configure_step
+
+    def _create_submit_step(self):
+        with phase("submit step"):
+            submit_step = SubmitQeAppWorkChainStep(
+                auto_advance=True,
+                qe_auto_setup=self.qe_auto_setup,
+                sssp_installation_status=self._sssp_installation_status,
+                qe_setup_status=self._qe_setup_status,
+            )
         ipw.dlink(
             (self.structure_step, "confirmed_structure"),
-            (self.configure_step, "input_structure"),
+            (submit_step, "input_structure"),
         )
+        configure_step = self._lazy_steps[0].step
         ipw.dlink(
-            (self.configure_step, "state"),
-            (self.submit_step, "previous_step_state"),
+            (configure_step, "state"),
+            (submit_step, "previous_step_state"),
         )
         ipw.dlink(
-            (self.configure_step, "configuration_parameters"),
-            (self.submit_step, "input_parameters"),
+            (configure_step, "configuration_parameters"),
+            (submit_step, "input_parameters"),
         )
         ipw.dlink(
-            (self.submit_step, "process"),
-            (self.results_step, "process"),
-            transform=lambda node: node.uuid if node is not None else None,
+            (submit_step, "process"),
+            (self.work_chain_selector, "value"),
+            transform=lambda node: None if node is None else node.pk,
         )
+        return submit_step
 
-        # Add the application steps to the application
-        self._wizard_app_widget = WizardAppWidget(
-            steps=[
-                ("Select structure", self.structure_step),
-                ("Configure workflow", self.configure_step),
-                ("Choose computational resources", self.submit_step),
-                ("Status & Results", self.results_step),
-            ]
+    def _create_results_step(self):
+        with phase("results step"):
+            results_step = ViewQeAppWorkChainStatusAndResultsStep()
+        ipw.dlink(
+            (self._lazy_steps[1].step, "process"),
+            (results_step, "process"),
+            transform=lambda node: node.uuid if node is not None else None,
         )
-        self._wizard_app_widget.observe(self._observe_selected_index, "selected_index")
+        return results_step
 
-        # Add process selection header
-        self.work_chain_selector = QeAppWorkChainSelector(
-            layout=ipw.Layout(width="auto")
-        )
-        self.work_chain_selector.observe(self._observe_process_selection, "value")
+    def _build_steps(self, index):
+        """Create the steps up to the step ``index`` of the wizard, in order."""
+        # The submission step is created with the configuration step, whose
+        # state and parameters it follows.
+        for lazy_step in self._lazy_steps[: max(index, 2)]:
+            lazy_step.build()
 
-        ipw.dlink(
-            (self.submit_step, "process"),
-            (self.work_chain_selector, "value"),
-            transform=lambda node: None if node is None else node.pk,
-        )
+    def _build_selected_step(self, change):
+        if change["new"]:
+            self._build_steps(change["new"])
 
-        super().__init__(
-            children=[
-                self.work_chain_selector,
-                self._wizard_app_widget,
-            ]
-        )
+    @property
+    def configure_step(self):
+        self._build_steps(1)
+        return self._lazy_steps[0].step
+
+    @property
+    def submit_step(self):
+        self._build_steps(2)
+        return self._lazy_steps[1].step
+
+    @property
+    def results_step(self):
+        self._build_steps(3)
+        return self._lazy_steps[2].step
 
     @property
     def steps(self):
@@ -107,11 +208,13 @@ class App(ipw.VBox):
         new_idx = change["new"]
         # only when entering the submit step, check and udpate the blocker messages
         # steps[new_idx][0] is the title of the step
-        if self.steps[new_idx][1] is not self.submit_step:
+        if self.steps[new_idx][1] is not self._lazy_steps[1]:
             return
         blockers = []
         # Loop over all steps before the submit step
         for title, step in self.steps[:new_idx]:
+            if isinstance(step, LazyStep):
+                step = step.build()
             # check if the step is saved
             if not step.is_saved():
                 step.state = WizardAppWidgetStep.State.CONFIGURED
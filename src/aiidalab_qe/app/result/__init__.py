@@ -5,10 +5,10 @@ from aiida.engine import ProcessState
 from aiida.engine.processes import control
 from aiidalab_widgets_base import (
     AiidaNodeViewWidget,
-    ProcessMonitor,
     ProcessNodesTreeWidget,
     WizardAppWidgetStep,
 )
+from aiidalab_qe.common.process import AdaptiveProcessMonitor
 
 # trigger registration of the viewer widget:
 from .workchain_viewer import WorkChainViewer  # noqa: F401
@@ -37,7 +37,7 @@ class ViewQeAppWorkChainStatusAndResultsStep(ipw.VBox, WizardAppWidgetStep):
         self.process_status = ipw.VBox(children=[self.process_tree, self.node_view])
 
         # Setup process monitor
-        self.process_monitor = ProcessMonitor(
+        self.process_monitor = AdaptiveProcessMonitor(
             timeout=0.2,
             callbacks=[
                 self.process_tree.update,
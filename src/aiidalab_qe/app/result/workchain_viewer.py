@@ -1,8 +1,17 @@
+import html
+import json
+import os
+import posixpath
 import shutil
+import stat
+import threading
 import typing as t
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from importlib import resources
 from pathlib import Path
-from tempfile import TemporaryDirectory
+from tempfile import SpooledTemporaryFile
 
 import ipywidgets as ipw
 import traitlets as tl
@@ -10,18 +19,50 @@ from aiida import orm
 from aiida.cmdline.utils.common import get_workchain_report
 from aiida.common import LinkType
 from aiida.orm.utils.serialize import deserialize_unsafe
-from aiidalab_widgets_base import ProcessMonitor, register_viewer_widget
+from aiidalab_widgets_base import register_viewer_widget
 from aiidalab_widgets_base.viewers import StructureDataViewer
-from filelock import FileLock, Timeout
+from filelock import FileLock
 from IPython.display import HTML, display
 from jinja2 import Environment
 
 from aiidalab_qe.app import static
 from aiidalab_qe.app.utils import get_entry_items
+from aiidalab_qe.common.process import AdaptiveProcessMonitor
 
 from .summary_viewer import SummaryView
 
 
+# Files read from the repository are kept in memory up to this size and
+# spooled to disk beyond, they are copied in chunks of ``COPY_CHUNK_SIZE``.
+SPOOL_MAX_SIZE = 8 * 1024**2
+COPY_CHUNK_SIZE = 1024**2
+
+# Number of threads reading the files from the repository for the archive.
+ARCHIVE_READ_WORKERS = 4
+
+# Folder of the output archives storing each pseudopotential once, by md5.
+ARCHIVE_PSEUDO_FOLDER = "pseudos"
+
+# Whether to build the output archive in the background as soon as a workflow
+# is finished, instead of when the download button is clicked.
+PREBUILD_ARCHIVE = os.environ.get("AIIDALAB_QE_PREBUILD_ARCHIVE", "0") == "1"
+
+
+def _get_main_loop():
+    """Return the event loop of the kernel, run in the main thread, if any."""
+    from IPython import get_ipython
+
+    return getattr(getattr(get_ipython(), "kernel", None), "io_loop", None)
+
+
+def _call_in_main_loop(main_loop, function, *args):
+    """Call ``function`` from ``main_loop``, or directly if there is none."""
+    if main_loop is None:
+        function(*args)
+    else:
+        main_loop.add_callback(function, *args)
+
+
 @register_viewer_widget("process.workflow.workchain.WorkChainNode.")
 class WorkChainViewer(ipw.VBox):
     _results_shown = tl.Set()
@@ -57,6 +98,10 @@ class WorkChainViewer(ipw.VBox):
         # get plugin result panels
         # and save them the results dictionary
         self.results = {}
+        # The result panels are only loaded when their tab is first selected,
+        # each one in a background thread.
+        self._results_loaded = set()
+        self._result_threads = {}
         entries = get_entry_items("aiidalab_qe.properties", "result")
         for identifier, entry_point in entries.items():
             result = entry_point(self.node)
@@ -83,22 +128,32 @@ class WorkChainViewer(ipw.VBox):
                 toggle_camera()
 
         self.result_tabs.observe(on_selected_index_change, "selected_index")
+        self.result_tabs.observe(self._on_result_tab_selected, "selected_index")
         self._update_view()
 
         super().__init__(
             children=[self.title, self.result_tabs],
             **kwargs,
         )
-        self._process_monitor = ProcessMonitor(
-            process=self.node,
+        self._main_loop = _get_main_loop()
+        self._process_monitor = AdaptiveProcessMonitor(
             callbacks=[
-                self._update_view,
+                self._schedule_update_view,
             ],
+            on_sealed=[self._prebuild_archive] if PREBUILD_ARCHIVE else None,
         )
+        if self._main_loop is not None or PREBUILD_ARCHIVE:
+            # Outside of a notebook, the view is not updated.
+            self._process_monitor.value = self.node.uuid
+
+    def _schedule_update_view(self):
+        """Update the view in the main thread, called by the process monitor."""
+        if self._main_loop is not None:
+            self._main_loop.add_callback(self._update_view)
 
     def _update_view(self):
         with self.hold_trait_notifications():
-            if self.node.is_finished:
+            if self.node.is_finished and not hasattr(self, "workflows_output"):
                 self._show_workflow_output()
             # if the structure is present in the workchain,
             # the structure tab will be added.
@@ -122,7 +177,12 @@ class WorkChainViewer(ipw.VBox):
                         label in self.node.outputs for label in result.workchain_labels
                     ]
                     if all(results_ready):
-                        result._update_view()
+                        result.children = [
+                            ipw.HTML(
+                                f"""<i class="fa fa-spinner fa-spin" aria-hidden="true"></i>
+                                Loading {result.title} results..."""
+                            )
+                        ]
                         self._results_shown.add(result.identifier)
                         # add this plugin result panel
                         self.result_tabs.children += (result,)
@@ -130,10 +190,84 @@ class WorkChainViewer(ipw.VBox):
                         index = len(self.result_tabs.children) - 1
                         self.result_tabs.set_title(index, result.title)
 
+    def _on_result_tab_selected(self, change):
+        """Load the result panel of the selected tab, if not done yet."""
+        if change["new"] is None:
+            return
+        result = self.result_tabs.children[change["new"]]
+        identifier = getattr(result, "identifier", None)
+        if (
+            self.results.get(identifier) is result
+            and identifier not in self._results_loaded
+        ):
+            self._results_loaded.add(identifier)
+            main_loop = _get_main_loop()
+            if main_loop is None:
+                # Nothing to keep responsive, e.g. outside of a notebook.
+                self._build_result(result)
+                return
+            thread = threading.Thread(
+                target=self._load_result, args=(result, result.node.uuid, main_loop)
+            )
+            self._result_threads[identifier] = thread
+            thread.start()
+
+    @classmethod
+    def _load_result(cls, result, uuid, main_loop):
+        """Extract the data of a result panel, then build its widgets in the main thread.
+
+        Only plain data is extracted in the worker thread: the nodes loaded
+        there could not be used by the callbacks of the widgets, which are run
+        in the main thread.
+        """
+        try:
+            result.load_data(orm.load_node(uuid))
+        except Exception as error:
+            main_loop.add_callback(cls._show_result_error, result, error)
+        else:
+            main_loop.add_callback(cls._build_result, result)
+
+    @classmethod
+    def _build_result(cls, result):
+        try:
+            result._update_view()
+        except Exception as error:
+            cls._show_result_error(result, error)
+
+    @staticmethod
+    def _show_result_error(result, error):
+        result.children = [
+            ipw.HTML(
+                f"""<div class="alert alert-danger">
+                Failed to load the {result.title} results: {error}</div>"""
+            )
+        ]
+
     def _show_structure(self):
         """Show the structure of the workchain."""
         self.structure_tab = StructureDataViewer(structure=self.node.outputs.structure)
 
+    def _prebuild_archive(self, process_uuid):
+        """Build the output archive once the workflow is finished.
+
+        Called by the process monitor in its thread, where the node is loaded.
+        """
+        node = orm.load_node(process_uuid)
+        if not node.is_finished:
+            return
+        if hasattr(self, "workflows_output"):
+            self.workflows_output.prebuild_archive(node, self._main_loop)
+            return
+        try:
+            WorkChainOutputs.build_archive(node, WorkChainOutputs.archive_path(node))
+        except Exception as error:
+            _call_in_main_loop(self._main_loop, self._show_archive_error, error)
+
+    def _show_archive_error(self, error):
+        # The outputs of the finished workflow are shown first, if not yet.
+        self._update_view()
+        self.workflows_output.show_archive_error(error)
+
     def _show_workflow_output(self):
         self.workflows_output = WorkChainOutputs(self.node)
 
@@ -147,12 +281,14 @@ class WorkChainOutputs(ipw.VBox):
     _busy = tl.Bool(read_only=True)
 
     def __init__(self, node, export_dir=None, **kwargs):
-        self.export_dir = Path.cwd().joinpath("exports")
+        self.export_dir = Path(export_dir) if export_dir else None
 
         if node.process_label != "QeAppWorkChain":
             raise KeyError(str(node.node_type))
 
         self.node = node
+        # The node is loaded again by UUID in the threads building the archive.
+        self._uuid = node.uuid
 
         self._create_archive_indicator = ipw.HTML(
             """<button disabled>
@@ -166,6 +302,8 @@ class WorkChainOutputs(ipw.VBox):
         )
         self._download_archive_button.on_click(self._download_archive)
         self._download_button_container = ipw.Box([self._download_archive_button])
+        # Shows why the archive could not be built.
+        self._archive_message = ipw.HTML()
 
         if node.exit_status != 0:
             title = ipw.HTML(
@@ -192,6 +330,7 @@ class WorkChainOutputs(ipw.VBox):
                     children=[title, self._download_button_container],
                     layout=ipw.Layout(justify_content="space-between", margin="10px"),
                 ),
+                self._archive_message,
                 output,
             ],
             **kwargs,
@@ -209,30 +348,68 @@ class WorkChainOutputs(ipw.VBox):
             else self._download_archive_button
         ]
 
-    def _download_archive(self, _):
-        fn_archive = self.export_dir.joinpath(str(self.node.uuid)).with_suffix(".zip")
-        fn_lockfile = fn_archive.with_suffix(".lock")
+    @staticmethod
+    def archive_path(node: orm.WorkChainNode, export_dir=None) -> Path:
+        """Return the path of the output archive of ``node``."""
+        export_dir = export_dir or Path.cwd().joinpath("exports")
+        return export_dir.joinpath(str(node.uuid)).with_suffix(".zip")
 
+    @classmethod
+    def build_archive(cls, node: orm.WorkChainNode, fn_archive: Path) -> None:
+        """Write the output archive of ``node`` to ``fn_archive``, if not done yet.
+
+        If another process is building the archive, wait for it to finish.
+        """
+        fn_archive.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(fn_archive.with_suffix(".lock")):
+            if not fn_archive.is_file():
+                cls._write_archive(node, fn_archive)
+
+    def prebuild_archive(self, node=None, main_loop=None):
+        """Build the output archive, showing the progress instead of the button.
+
+        Meant to be called in a background thread, ``node`` must be loaded in
+        that thread and is loaded again if not given. Return whether the
+        archive was built, an error is shown from ``main_loop`` if given.
+        """
         try:
             self.set_trait("_busy", True)
-            # Create exports archive directory.
-            fn_archive.parent.mkdir(parents=True, exist_ok=True)
-            # Try to obtain lock for creating archive...
-            with FileLock(fn_lockfile, timeout=0):
-                # Check whether archive file already exists.
-                if not fn_archive.is_file():
-                    # Create archive file.
-                    with TemporaryDirectory() as tmpdir:
-                        self._prepare_calcjob_io(self.node, Path(tmpdir))
-                        shutil.make_archive(fn_archive.with_suffix(""), "zip", tmpdir)
-            Path(fn_lockfile).unlink()  # Delete lock file.
-        except Timeout:
-            # Failed to obtain lock, presuming some other process is working on it.
-            with FileLock(fn_lockfile, timeout=20):
-                assert fn_archive.is_file()
+            node = node or orm.load_node(self._uuid)
+            self.build_archive(node, self.archive_path(node, self.export_dir))
+        except Exception as error:
+            _call_in_main_loop(main_loop, self.show_archive_error, error)
+            return False
         finally:
             self.set_trait("_busy", False)
+        return True
+
+    def show_archive_error(self, error):
+        self._archive_message.value = f"""<div class="alert alert-danger">
+            Failed to create the output archive: {html.escape(str(error))}</div>"""
+
+    def _download_archive(self, _):
+        self._archive_message.value = ""
+        fn_archive = self.archive_path(self.node, self.export_dir)
+
+        if fn_archive.is_file():
+            # The archive was built already, e.g. in the background.
+            self._serve_archive(fn_archive)
+            return
+
+        # The archive is built in the background, or waited for if another
+        # process is building it, and served once it is ready.
+        self._archive_thread = threading.Thread(
+            target=self._build_and_serve_archive,
+            args=(fn_archive, _get_main_loop()),
+        )
+        self._archive_thread.start()
 
+    def _build_and_serve_archive(self, fn_archive, main_loop):
+        if self.prebuild_archive(main_loop=main_loop):
+            # The download link is displayed from the main thread.
+            _call_in_main_loop(main_loop, self._serve_archive, fn_archive)
+
+    def _serve_archive(self, fn_archive: Path) -> None:
         id = f"dl_{self.node.uuid}"
 
         display(
@@ -257,11 +434,127 @@ class WorkChainOutputs(ipw.VBox):
         )
 
     @classmethod
-    def _prepare_calcjob_io(cls, node: orm.WorkChainNode, root_folder: Path):
-        """Prepare the calculation job input and output files.
+    def _write_archive(cls, node: orm.WorkChainNode, filename: Path) -> None:
+        """Write the calculation job input and output files to the zip ``filename``.
+
+        The files are read from the repository by a pool of threads, see
+        ``_iter_object_handles``, and written to the archive in chunks. Files
+        with the same content are read only once.
+
+        The pseudopotentials are stored once in the ``pseudos/<md5>/`` folders,
+        the ``pseudo`` folder of each calculation contains relative symbolic
+        links to them. The links are also listed in ``pseudos/manifest.json``,
+        for the tools that do not extract symbolic links.
 
         :param node: QeAppWorkChain node.
+        :param filename: path of the zip archive.
+        """
+        files, links = cls._prepare_calcjob_io(node)
+        arcnames = {}
+        for arcname, source, path in files:
+            key = source.base.repository.get_object(path).key
+            if arcname not in arcnames.get(key, []):
+                arcnames.setdefault(key, []).append(arcname)
+
+        tmp_filename = filename.with_name(f"{filename.name}.{os.getpid()}.tmp")
+        try:
+            with zipfile.ZipFile(tmp_filename, "w", zipfile.ZIP_DEFLATED) as zf:
+                repository = node.backend.get_repository()
+                for key, stream in cls._iter_object_handles(repository, list(arcnames)):
+                    if len(arcnames[key]) == 1:
+                        with zf.open(arcnames[key][0], "w", force_zip64=True) as target:
+                            shutil.copyfileobj(stream, target, COPY_CHUNK_SIZE)
+                        continue
+                    # The stream can only be read once.
+                    with SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE) as handle:
+                        shutil.copyfileobj(stream, handle, COPY_CHUNK_SIZE)
+                        for arcname in arcnames[key]:
+                            handle.seek(0)
+                            with zf.open(arcname, "w", force_zip64=True) as target:
+                                shutil.copyfileobj(handle, target, COPY_CHUNK_SIZE)
+
+                for arcname, target in links.items():
+                    info = zipfile.ZipInfo(arcname)
+                    info.create_system = 3  # Unix, to store the file mode
+                    info.external_attr = (stat.S_IFLNK | 0o777) << 16
+                    zf.writestr(
+                        info, posixpath.relpath(target, posixpath.dirname(arcname))
+                    )
+                if links:
+                    zf.writestr(
+                        f"{ARCHIVE_PSEUDO_FOLDER}/manifest.json",
+                        json.dumps(links, indent=2),
+                    )
+            # Atomic, so an incomplete archive is never served.
+            os.replace(tmp_filename, filename)
+        finally:
+            Path(tmp_filename).unlink(missing_ok=True)
+
+    @staticmethod
+    def _iter_object_handles(repository, keys: list) -> t.Iterator[tuple]:
+        """Yield the key and a file handle of each object of ``keys``.
+
+        On a disk-objectstore repository, the objects are read ahead in the
+        order of ``keys`` by a pool of ``ARCHIVE_READ_WORKERS`` threads, each
+        with its own container, as the objectstore does not need the database
+        session of the thread. The objects are spooled to disk beyond
+        ``SPOOL_MAX_SIZE``. Otherwise, they are streamed one after the other
+        from the repository, in the order in which they are stored.
         """
+        container = getattr(repository, "_container", None)
+        if container is None or ARCHIVE_READ_WORKERS < 2:
+            yield from repository.iter_object_streams(keys)
+            return
+
+        from disk_objectstore import Container
+
+        local = threading.local()
+        containers = []
+
+        def read(key):
+            if not hasattr(local, "container"):
+                local.container = Container(container.get_folder())
+                containers.append(local.container)
+            handle = SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+            with local.container.get_object_stream(key) as stream:
+                shutil.copyfileobj(stream, handle, COPY_CHUNK_SIZE)
+            handle.seek(0)
+            return handle
+
+        # Only a few objects are read ahead, to bound the memory used.
+        pending = deque()
+        executor = ThreadPoolExecutor(ARCHIVE_READ_WORKERS)
+        try:
+            for key in keys:
+                pending.append((key, executor.submit(read, key)))
+                if len(pending) < 2 * ARCHIVE_READ_WORKERS:
+                    continue
+                key, future = pending.popleft()
+                with future.result() as handle:
+                    yield key, handle
+            while pending:
+                key, future = pending.popleft()
+                with future.result() as handle:
+                    yield key, handle
+        finally:
+            for _, future in pending:
+                if not future.cancel() and future.exception() is None:
+                    future.result().close()
+            executor.shutdown()
+            for local_container in containers:
+                local_container.close()
+
+    @classmethod
+    def _prepare_calcjob_io(cls, node: orm.WorkChainNode) -> tuple:
+        """Return the calculation job input and output files to export.
+
+        :param node: QeAppWorkChain node.
+        :return: list of tuples of the path in the archive, and the node and
+            the repository path to read the file from, and the mapping of the
+            paths of the links to the shared pseudopotentials to their targets.
+        """
+        files = []
+        links = {}
         counter = 1
 
         for link1 in node.get_outgoing(link_type=LinkType.CALL_WORK):
@@ -281,12 +574,16 @@ class WorkChainOutputs(ipw.VBox):
 
                     fdname = f"{counter_str}-{link1.link_label}-{base_label}-{pw_label}"
 
-                    folder_path = root_folder / fdname
-
-                    cls._write_calcjob_io(link3.node, folder_path)
+                    calcjob_files, calcjob_links = cls._write_calcjob_io(
+                        link3.node, fdname
+                    )
+                    files.extend(calcjob_files)
+                    links.update(calcjob_links)
 
                     counter += 1
 
+        return files, links
+
     @staticmethod
     def _get_final_calcjob(node: orm.WorkChainNode) -> t.Union[None, orm.CalcJobNode]:
         """Get the final calculation job node called by a work chain node.
@@ -305,31 +602,25 @@ class WorkChainOutputs(ipw.VBox):
         return final_calcjob
 
     @staticmethod
-    def _write_calcjob_io(calcjob: orm.CalcJobNode, folder: Path) -> None:
-        """Write the ``calcjob`` in and output files to ``folder``.
+    def _write_calcjob_io(calcjob: orm.CalcJobNode, folder: str) -> tuple:
+        """Return the ``calcjob`` in and output files to write to ``folder``.
 
         :param calcjob: calculation job node for which to write the IO files.
-        :param folder: folder to which to write the IO files.
+        :param folder: folder in the archive to which to write the IO files.
+        :return: the files and the links to the shared pseudopotentials.
         """
-        folder.mkdir(exist_ok=True)
-        input_filepath = folder / "aiida.in"
-
-        with calcjob.open(calcjob.get_option("input_filename"), "r") as ihandle:
-            with input_filepath.open("w") as ohandle:
-                ohandle.write(ihandle.read())
-
-        pseudo_folder = folder / "pseudo"
-        pseudo_folder.mkdir(exist_ok=True)
+        input_filename = calcjob.get_option("input_filename")
+        entries = [(f"{folder}/aiida.in", calcjob, input_filename)]
+        links = {}
 
         for _, pseudo in calcjob.inputs.pseudos.items():
-            pseudo_path = pseudo_folder / pseudo.filename
-
-            with pseudo_path.open("w") as handle:
-                handle.write(pseudo.get_content())
+            shared = f"{ARCHIVE_PSEUDO_FOLDER}/{pseudo.md5}/{pseudo.filename}"
+            entries.append((shared, pseudo, pseudo.filename))
+            links[f"{folder}/pseudo/{pseudo.filename}"] = shared
 
         retrieved = calcjob.outputs.retrieved
 
         for filename in retrieved.list_object_names():
-            out_filepath = folder / filename
-            with out_filepath.open("w") as handle:
-                handle.write(retrieved.get_object_content(filename))
+            entries.append((f"{folder}/{filename}", retrieved, filename))
+
+        return entries, links
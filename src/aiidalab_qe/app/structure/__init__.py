@@ -21,6 +21,7 @@ from aiidalab_widgets_base import (
 
 from aiidalab_qe.app.utils import get_entry_items
 from aiidalab_qe.common import AddingTagsEditor
+from aiidalab_qe.profiling import phase
 from aiida_quantumespresso.data.hubbard_structure import HubbardStructureData
 
 # The Examples list of (name, file) tuple curretly passed to
@@ -51,9 +52,12 @@ class StructureSelectionStep(ipw.VBox, WizardAppWidgetStep):
     confirmed_structure = tl.Instance(aiida.orm.StructureData, allow_none=True)
 
     def __init__(self, description=None, **kwargs):
+        # The OPTIMADE importer queries the list of providers.
+        with phase("OPTIMADE importer"):
+            optimade_importer = OptimadeQueryWidget(embedded=False)
         importers = [
             StructureUploadWidget(title="Upload file"),
-            OptimadeQueryWidget(embedded=False),
+            optimade_importer,
             StructureBrowserWidget(
                 title="AiiDA database",
                 query_types=(
@@ -22,6 +22,7 @@ from aiidalab_qe.common.widgets import (
     PwCodeResourceSetupWidget,
     QEAppComputationalResourcesWidget,
 )
+from aiidalab_qe.profiling import phase
 from aiidalab_qe.workflows import QeAppWorkChain
 
 
@@ -65,7 +66,13 @@ class SubmitQeAppWorkChainStep(ipw.VBox, WizardAppWidgetStep):
     internal_submission_blockers = tl.List(tl.Unicode())
     external_submission_blockers = tl.List(tl.Unicode())
 
-    def __init__(self, qe_auto_setup=True, **kwargs):
+    def __init__(
+        self,
+        qe_auto_setup=True,
+        sssp_installation_status=None,
+        qe_setup_status=None,
+        **kwargs,
+    ):
         self.message_area = ipw.Output()
         self._submission_blocker_messages = ipw.HTML()
 
@@ -112,8 +119,14 @@ class SubmitQeAppWorkChainStep(ipw.VBox, WizardAppWidgetStep):
         # they are not yet installed. The widget will remain in a "busy" state
         # in case that the installation was already triggered elsewhere, e.g.,
         # by the start up scripts.  The submission is blocked while the
-        # potentials are not yet installed.
-        self.sssp_installation_status = PseudosInstallWidget(auto_start=qe_auto_setup)
+        # potentials are not yet installed. The setup widgets may be given,
+        # e.g. by the app, to start the setup before the step is created.
+        if sssp_installation_status is None:
+            with phase("pseudopotentials installation check"):
+                sssp_installation_status = PseudosInstallWidget(
+                    auto_start=qe_auto_setup
+                )
+        self.sssp_installation_status = sssp_installation_status
         self.sssp_installation_status.observe(self._update_state, ["busy", "installed"])
         self.sssp_installation_status.observe(self._toggle_install_widgets, "installed")
 
@@ -121,7 +134,10 @@ class SubmitQeAppWorkChainStep(ipw.VBox, WizardAppWidgetStep):
         # expected labels (e.g. "pw-7.2@localhost") and triggers both the
         # installation of QE into a dedicated conda environment and the setup of
         # the codes in case that they are not already configured.
-        self.qe_setup_status = QESetupWidget(auto_start=qe_auto_setup)
+        if qe_setup_status is None:
+            with phase("QE setup check"):
+                qe_setup_status = QESetupWidget(auto_start=qe_auto_setup)
+        self.qe_setup_status = qe_setup_status
         self.qe_setup_status.observe(self._update_state, "busy")
         self.qe_setup_status.observe(self._toggle_install_widgets, "installed")
         self.qe_setup_status.observe(self._auto_select_code, "installed")
@@ -140,6 +156,9 @@ class SubmitQeAppWorkChainStep(ipw.VBox, WizardAppWidgetStep):
                 self.submit_button,
             ]
         )
+        # The setup may have finished before the step was created.
+        for status in (self.sssp_installation_status, self.qe_setup_status):
+            self._toggle_install_widgets({"new": status.installed, "owner": status})
         # set default codes
         self.set_selected_codes(DEFAULT_PARAMETERS["codes"])
 
@@ -1,41 +1,11 @@
 from importlib.metadata import distributions
 
-
-def print_error(entry_point, e):
-    print(f"\033[91mFailed to load plugin entry point {entry_point.name}.\033[0m")
-    print(
-        "\033[93mThis may be due to compatibility issues with the current QEApp version.\033[0m"
-    )
-    print("\033[93mPlease contact the plugin author for further assistance.\033[0m")
-    print(
-        "\033[93mThus, the plugin will not be available. However, you can still use the rest of the app.\033[0m"
-    )
-    print(f"\033[91mError message: {e}\033[0m\n")
-
-
-# load entry points
-def get_entries(entry_point_name="aiidalab_qe.properties"):
-    from importlib.metadata import entry_points
-
-    entries = {}
-    for entry_point in entry_points().get(entry_point_name, []):
-        try:
-            # Attempt to load the entry point
-            loaded_entry_point = entry_point.load()
-            entries[entry_point.name] = loaded_entry_point
-        except Exception as e:
-            print_error(entry_point, e)
-
-    return entries
-
-
-def get_entry_items(entry_point_name, item_name="outline"):
-    entries = get_entries(entry_point_name)
-    return {
-        name: entry_point.get(item_name)
-        for name, entry_point in entries.items()
-        if entry_point.get(item_name, False)
-    }
+from aiidalab_qe.plugins.entry_points import (  # noqa: F401
+    get_entries,
+    get_entry_items,
+    print_error,
+    registry,
+)
 
 
 def get_entry_points_for_package(
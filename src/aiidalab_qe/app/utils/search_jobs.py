@@ -1,72 +1,69 @@
+import html
+import threading
+from datetime import datetime, time, timedelta, timezone
+
 import ipywidgets as ipw
-import pandas as pd
 from aiida.orm import QueryBuilder
+from aiidalab_qe.plugins.entry_points import registry
 from aiidalab_qe.workflows import QeAppWorkChain
 from IPython.display import display
 
+# (description, value of the ``process_state`` attribute)
+JOB_STATES = [
+    ("", ""),
+    ("finished", "finished"),
+    ("waiting", "waiting"),
+    ("except", "excepted"),
+    ("killed", "killed"),
+]
+
+PAGE_SIZES = [10, 25, 50, 100, 200]
+
+
+def get_properties():
+    """Return the properties a job can compute, without loading the plugins."""
+    return ["relax"] + sorted(registry.get_names("aiidalab_qe.properties"))
+
 
 class QueryInterface:
-    def __init__(self):
-        self.df = self.load_data()
-        self.table = ipw.HTML()
-        self.setup_widgets()
+    """Search the ``QeAppWorkChain`` jobs.
 
-    def load_data(self):
-        projections = [
-            "id",
-            "extras.structure",
-            "ctime",
-            "attributes.process_state",
-            "label",
-            "extras.workchain.relax_type",
-            "extras.workchain.properties",
-        ]
-        headers = [
-            "PK",
-            "Structure",
-            "ctime",
-            "State",
-            "Label",
-            "Relax_type",
-            "Properties",
-        ]
+    All filters are applied by the database and only the rows of the current
+    page are fetched, so the cost of an interaction does not depend on the
+    total number of jobs in the profile.
 
-        qb = QueryBuilder()
-        qb.append(QeAppWorkChain, project=projections, tag="process")
-        qb.order_by({"process": {"ctime": "desc"}})
-        results = qb.all()
-
-        df = pd.DataFrame(results, columns=headers)
-        # Check if DataFrame is not empty
-        if not df.empty:
-            df["Creation time"] = df["ctime"].apply(
-                lambda x: x.strftime("%Y-%m-%d %H:%M:%S")
-            )
-            df["Delete"] = df["PK"].apply(
-                lambda pk: f'<a href="./delete.ipynb?pk={pk}" target="_blank">Delete</a>'
-            )
-            df["Inspect"] = df["PK"].apply(
-                lambda pk: f'<a href="./qe.ipynb?pk={pk}" target="_blank">Inspect</a>'
-            )
-        else:
-            # Initialize empty columns for an empty DataFrame
-            df["Creation time"] = pd.Series(dtype="str")
-            df["Delete"] = pd.Series(dtype="str")
-            df["Inspect"] = pd.Series(dtype="str")
-        return df[
-            [
-                "PK",
-                "Creation time",
-                "Structure",
-                "State",
-                "Label",
-                "Relax_type",
-                "Delete",
-                "Inspect",
-                "Properties",
-                "ctime",
-            ]
-        ]
+    The table is updated in a background thread once the filters have not
+    changed for ``debounce_delay`` seconds. An update started before the last
+    change of the filters does not modify the widgets.
+    """
+
+    projections = [
+        "id",
+        "ctime",
+        "extras.structure",
+        "attributes.process_state",
+        "label",
+        "extras.workchain.relax_type",
+    ]
+    headers = [
+        "PK",
+        "Creation time",
+        "Structure",
+        "State",
+        "Label",
+        "Relax_type",
+        "Delete",
+        "Inspect",
+    ]
+
+    def __init__(self, debounce_delay=0.3):
+        self.debounce_delay = debounce_delay
+        self.page = 0
+        self._generation = 0
+        self._timer = None
+        self._lock = threading.Lock()
+        self.table = ipw.HTML()
+        self.setup_widgets()
 
     def setup_widgets(self):
         self.css_style = """
@@ -80,8 +77,6 @@ class QueryInterface:
             </style>
             """
 
-        unique_properties = set(self.df["Properties"].explode())
-        unique_properties.discard(None)
         property_checkboxes = [
             ipw.Checkbox(
                 value=False,
@@ -89,17 +84,13 @@ class QueryInterface:
                 Layout=ipw.Layout(description_width="initial"),
                 indent=False,
             )
-            for prop in unique_properties
+            for prop in get_properties()
         ]
         self.properties_box = ipw.HBox(
             children=property_checkboxes, description="Properties:"
         )
-        # Replace 'None' in 'Properties' with an empty list
-        self.df["Properties"] = self.df["Properties"].apply(
-            lambda x: [] if x is None else x
-        )
         self.job_state_dropdown = ipw.Dropdown(
-            options=["", "finished", "waiting", "except", "killed"],
+            options=JOB_STATES,
             value="",
             description="Job State:",
         )
@@ -113,14 +104,28 @@ class QueryInterface:
         self.time_start = ipw.DatePicker(description="Start Time:")
         self.time_end = ipw.DatePicker(description="End Time:")
         self.time_box = ipw.HBox([self.time_start, self.time_end])
-        # self.apply_filters_btn = ipw.Button(description='Apply Filters')
-        # self.apply_filters_btn.on_click(self.apply_filters)
+        self.page_size_dropdown = ipw.Dropdown(
+            options=PAGE_SIZES,
+            value=50,
+            description="Jobs per page:",
+            style={"description_width": "initial"},
+        )
+        self.previous_page_button = ipw.Button(
+            icon="chevron-left", layout=ipw.Layout(width="40px")
+        )
+        self.next_page_button = ipw.Button(
+            icon="chevron-right", layout=ipw.Layout(width="40px")
+        )
+        self.page_info = ipw.HTML()
+        self.previous_page_button.on_click(self._on_previous_page)
+        self.next_page_button.on_click(self._on_next_page)
         for cb in property_checkboxes:
             cb.observe(self.apply_filters, names="value")
         self.time_start.observe(self.apply_filters, names="value")
         self.time_end.observe(self.apply_filters, names="value")
         self.job_state_dropdown.observe(self.apply_filters, names="value")
         self.label_search_field.observe(self.apply_filters, names="value")
+        self.page_size_dropdown.observe(self.apply_filters, names="value")
 
         self.filters_layout = ipw.VBox(
             [
@@ -133,54 +138,136 @@ class QueryInterface:
                         self.label_search_field,
                         self.job_state_dropdown,
                         self.time_box,
-                        #   self.apply_filters_btn,
+                        ipw.HBox(
+                            [
+                                self.page_size_dropdown,
+                                self.previous_page_button,
+                                self.next_page_button,
+                                self.page_info,
+                            ]
+                        ),
                     ]
                 ),
             ]
         )
-        self.get_table_value(self.df)
-
-    def get_table_value(self, display_df):
-        if display_df.empty:
-            self.table.value = "<h2>No results found</h2>"
-            return
-        display_df = display_df.drop(columns=["Properties", "ctime"])
-        self.table.value = self.css_style + display_df.to_html(
-            classes="df", escape=False, index=False
-        )
+        self.update_table()
 
-    def apply_filters(self, _):
+    def get_filters(self):
+        """Return the ``QueryBuilder`` filters corresponding to the widget values."""
+        filters = {}
+        if self.job_state_dropdown.value:
+            filters["attributes.process_state"] = self.job_state_dropdown.value
+        if self.label_search_field.value:
+            filters["label"] = {"ilike": f"%{self.label_search_field.value}%"}
         selected_properties = [
             cb.description for cb in self.properties_box.children if cb.value
         ]
-        filtered_df = self.df.copy()
-        filtered_df = filtered_df[
-            filtered_df["State"].str.contains(self.job_state_dropdown.value)
-        ]
-        if self.label_search_field.value:
-            filtered_df = filtered_df[
-                filtered_df["Label"].str.contains(
-                    self.label_search_field.value, case=False, na=False
-                )
-            ]
         if selected_properties:
-            filtered_df = filtered_df[
-                filtered_df["Properties"].apply(
-                    lambda x: all(item in x for item in selected_properties)
-                )
-            ]
-        if self.time_start.value and self.time_end.value:
-            start_time = pd.to_datetime(self.time_start.value).normalize()
-            end_time = pd.to_datetime(self.time_end.value).normalize() + pd.Timedelta(
-                days=1, milliseconds=-1
+            filters["extras.workchain.properties"] = {"contains": selected_properties}
+        ctime_filters = []
+        if self.time_start.value:
+            start_time = datetime.combine(
+                self.time_start.value, time.min, tzinfo=timezone.utc
+            )
+            ctime_filters.append({">=": start_time})
+        if self.time_end.value:
+            # the end date is included
+            end_time = datetime.combine(
+                self.time_end.value + timedelta(days=1), time.min, tzinfo=timezone.utc
+            )
+            ctime_filters.append({"<": end_time})
+        if ctime_filters:
+            filters["ctime"] = {"and": ctime_filters}
+        return filters
+
+    def get_query(self):
+        qb = QueryBuilder()
+        qb.append(QeAppWorkChain, filters=self.get_filters(), tag="process")
+        return qb
+
+    def schedule_update(self, delay=None):
+        """Update the table after ``delay`` seconds, cancelling pending updates."""
+        delay = self.debounce_delay if delay is None else delay
+        with self._lock:
+            self._generation += 1
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(
+                delay, self.update_table, kwargs={"generation": self._generation}
+            )
+            self._timer.start()
+
+    def _is_outdated(self, generation):
+        return generation is not None and generation != self._generation
+
+    def update_table(self, generation=None):
+        """Query the jobs of the current page and render them.
+
+        Nothing is done if the filters changed since the update with the given
+        ``generation`` was scheduled.
+        """
+        qb = self.get_query()
+        page_size = self.page_size_dropdown.value
+        page = self.page
+        total = qb.count()
+        num_pages = max(1, -(-total // page_size))
+        page = min(page, num_pages - 1)
+        if total == 0:
+            table = "<h2>No results found</h2>"
+        else:
+            if self._is_outdated(generation):
+                return
+            qb.add_projection("process", self.projections)
+            qb.order_by({"process": [{"ctime": "desc"}, {"id": "desc"}]})
+            qb.offset(page * page_size)
+            qb.limit(page_size)
+            table = self.css_style + self.render_rows(qb.all())
+
+        with self._lock:
+            if self._is_outdated(generation):
+                return
+            self.page = page
+            self.previous_page_button.disabled = page == 0
+            self.next_page_button.disabled = page >= num_pages - 1
+            self.page_info.value = (
+                f"Page {page + 1} of {num_pages} ({total} jobs in total)"
             )
-            start_time = start_time.tz_localize("UTC")
-            end_time = end_time.tz_localize("UTC")
-            filtered_df = filtered_df[
-                (filtered_df["ctime"] >= start_time)
-                & (filtered_df["ctime"] <= end_time)
+            self.table.value = table
+
+    @staticmethod
+    def render_rows(rows):
+        """Return the HTML table of the given rows of projected values."""
+        header = "".join(f"<th>{name}</th>" for name in QueryInterface.headers)
+        lines = []
+        for pk, ctime, structure, state, label, relax_type in rows:
+            cells = [
+                pk,
+                ctime.strftime("%Y-%m-%d %H:%M:%S"),
+                html.escape(str(structure)),
+                state,
+                html.escape(str(label)),
+                relax_type,
+                f'<a href="./delete.ipynb?pk={pk}" target="_blank">Delete</a>',
+                f'<a href="./qe.ipynb?pk={pk}" target="_blank">Inspect</a>',
             ]
-        self.get_table_value(filtered_df)
+            lines.append("".join(f"<td>{cell}</td>" for cell in cells))
+        return (
+            '<table border="1" class="dataframe df">'
+            f"<thead><tr>{header}</tr></thead>"
+            f"<tbody>{''.join(f'<tr>{line}</tr>' for line in lines)}</tbody></table>"
+        )
+
+    def apply_filters(self, _):
+        self.page = 0
+        self.schedule_update()
+
+    def _on_previous_page(self, _):
+        self.page = max(0, self.page - 1)
+        self.schedule_update(delay=0)
+
+    def _on_next_page(self, _):
+        self.page += 1
+        self.schedule_update(delay=0)
 
     def display(self):
         display(self.filters_layout)
@@ -1,15 +1,78 @@
 import base64
+import dataclasses
+import functools
 import json
+import typing as t
 
 import ipywidgets as ipw
 import numpy as np
 import plotly.graph_objects as go
-from aiida.orm import ProjectionData
+from aiida.orm import Node, ProjectionData, load_node
 from aiidalab_widgets_base.utils import string_range_to_list, StatusHTML
 from IPython.display import clear_output, display
 from plotly.subplots import make_subplots
 import re
 
+from aiidalab_qe.common.cache import DiskCache, register_dataclass
+
+# Processed plot data is cached on disk, so that reopening the results of a
+# finished workflow does not need to re-read and re-group all the projections.
+PLOT_DATA_CACHE = DiskCache("bandpdos")
+
+
+@register_dataclass
+@dataclasses.dataclass
+class Trace:
+    """A single (PDOS or projected bands) line of the plot.
+
+    The data are kept as NumPy arrays, they are only converted to lists when
+    the data are exported.
+    """
+
+    label: str
+    x: t.Optional[np.ndarray]
+    y: np.ndarray
+    color: str
+    line_style: str = "solid"
+
+
+def _trace_to_dict(trace, projected_bands=False):
+    """Return the dictionary of ``trace`` with the keys of the exported files.
+
+    The keys are the ones used before the traces were dataclasses, so that the
+    exported files do not change.
+    """
+    if trace.x is None:
+        return {"label": trace.label, "projections": trace.y, "color": trace.color}
+    if projected_bands:
+        return {"x": trace.x, "y": trace.y, "label": trace.label, "color": trace.color}
+    data = {
+        "label": trace.label,
+        "x": trace.x,
+        "y": trace.y,
+        "borderColor": trace.color,
+    }
+    if trace.label.startswith("Total DOS"):
+        data.update({"backgroundColor": "#999999", "backgroundAlpha": "40%"})
+    data["lineStyle"] = trace.line_style
+    return data
+
+
+def _to_json_compatible(data, projected_bands=False):
+    """Convert the nested plot data, including traces and arrays, to plain lists and dicts."""
+    if isinstance(data, Trace):
+        data = _trace_to_dict(data, projected_bands)
+    if isinstance(data, dict):
+        return {
+            key: _to_json_compatible(value, key == "projected_bands")
+            for key, value in data.items()
+        }
+    if isinstance(data, (list, tuple)):
+        return [_to_json_compatible(value, projected_bands) for value in data]
+    if isinstance(data, (np.ndarray, np.generic)):
+        return data.tolist()
+    return data
+
 
 class BandPdosPlotly:
     SETTINGS = {
@@ -28,6 +91,15 @@ class BandPdosPlotly:
         "horizontal_linecolor": "#111111",
         "vertical_range_bands": [-10, 10],
         "horizontal_range_pdos": [-10, 10],
+        # Rendering of the bands and projected bands traces: "svg", "webgl" or
+        # "auto", which uses WebGL when the number of band points is larger
+        # than "webgl_threshold". WebGL traces do not support spline smoothing.
+        "render_mode": "auto",
+        "webgl_threshold": 50000,
+        # Maximum number of points of each band and PDOS line sent to the
+        # frontend, longer lines are downsampled to the visible range (None to
+        # disable). The fat bands projections keep the points of their band.
+        "downsampling_points": 2000,
     }
 
     def __init__(self, bands_data=None, pdos_data=None, project_bands=False):
@@ -35,6 +107,11 @@ class BandPdosPlotly:
         self.pdos_data = pdos_data
         self.fermi_energy = self._get_fermi_energy()
         self.project_bands = project_bands and "projected_bands" in self.bands_data
+        self.use_webgl = self._use_webgl()
+        # Visible ranges (in plot coordinates) used to downsample the traces,
+        # the whole lines are downsampled unless the figure is zoomed in.
+        self.kpoints_range = None
+        self.energy_range = None
 
         # Plotly Axis
         # Plotly settings
@@ -74,6 +151,27 @@ class BandPdosPlotly:
                 fermi_data["fermi_energy"] = self.bands_data["fermi_energy"]
         return fermi_data
 
+    @property
+    def is_downsampled(self):
+        """Whether some of the lines are longer than the downsampling limit."""
+        n_points = self.SETTINGS["downsampling_points"]
+        lengths = [len(trace.x) for trace in (self.pdos_data or {}).get("dos", [])]
+        if self.bands_data:
+            lengths.append(len(self.bands_data["x"]))
+        return bool(n_points) and max(lengths, default=0) > n_points
+
+    def _use_webgl(self):
+        """Return whether the bands should be rendered with WebGL."""
+        render_mode = self.SETTINGS["render_mode"]
+        if render_mode == "auto":
+            return (
+                self.bands_data is not None
+                and np.size(self.bands_data["y"]) > self.SETTINGS["webgl_threshold"]
+            )
+        if render_mode not in ("svg", "webgl"):
+            raise ValueError(f"Invalid value for `render_mode`: {render_mode}")
+        return render_mode == "webgl"
+
     def _band_xaxis(self):
         """Function to return the xaxis for the bands plot."""
 
@@ -225,6 +323,74 @@ class BandPdosPlotly:
         )
         return fig
 
+    def update_figure(self, fig, update_bands=False, zoomed=False):
+        """Update the PDOS and projected bands traces of an existing figure.
+
+        The layout of the figure, and the band traces unless ``update_bands``
+        is set, are left untouched. The existing traces are updated in place,
+        so only the data that changed is sent to the frontend, and traces are
+        only added or removed if the number of lines changed. If ``zoomed`` is
+        set, the downsampled traces are resampled in the visible range of the
+        figure only, to show more details.
+        """
+        if zoomed and self.bands_data:
+            self.kpoints_range = self._visible_range(
+                fig.layout.xaxis, self._bands_xaxis.range
+            )
+        if zoomed and self.pdos_data:
+            if self.plot_type == "combined":
+                energy_axis, initial_axis = fig.layout.yaxis, self._bands_yaxis
+            else:
+                energy_axis, initial_axis = fig.layout.xaxis, self._pdos_xaxis
+            self.energy_range = self._visible_range(energy_axis, initial_axis.range)
+
+        new_traces = {
+            "projections": self._get_projection_traces() if self.project_bands else [],
+            "pdos": self._get_pdos_traces() if self.pdos_data else [],
+        }
+        if update_bands and self.bands_data:
+            new_traces["bands"] = self._get_band_traces()
+        columns = {"bands": 1, "projections": 1, "pdos": 2}
+
+        kept_traces = [
+            trace
+            for trace in fig.data
+            if trace.meta == "bands" and "bands" not in new_traces
+        ]
+        updates = []
+        for meta, traces in sorted(
+            new_traces.items(), key=lambda item: list(columns).index(item[0])
+        ):
+            old_traces = [trace for trace in fig.data if trace.meta == meta]
+            if len(traces) > len(old_traces):
+                self._add_traces_to_fig(fig, traces[len(old_traces) :], columns[meta])
+            kept_traces += [trace for trace in fig.data if trace.meta == meta][
+                : len(traces)
+            ]
+            updates += zip(old_traces, traces)
+
+        # Remove the traces that are not needed anymore
+        fig.data = kept_traces
+        with fig.batch_update():
+            for trace, new_trace in updates:
+                properties = new_trace.to_plotly_json()
+                properties.pop("type")
+                trace.update(properties)
+
+    @staticmethod
+    def _visible_range(axis, initial_range):
+        """Return the visible range of ``axis``, or None if it is autoranged or
+        shows the whole initial range, e.g. after the zoom is reset."""
+        if axis.autorange or axis.range is None:
+            return None
+        if (
+            initial_range is not None
+            and min(axis.range) <= min(initial_range)
+            and max(axis.range) >= max(initial_range)
+        ):
+            return None
+        return axis.range
+
     def _add_traces_to_fig(self, fig, traces, col):
         """Add a list of traces to a figure."""
         if self.plot_type == "combined":
@@ -236,6 +402,48 @@ class BandPdosPlotly:
 
     def _add_band_traces(self, fig):
         """Generate the band traces and add them to the figure."""
+        self._add_traces_to_fig(fig, self._get_band_traces(), 1)
+
+    def _downsample(self, x, y, x_range):
+        """Downsample the lines ``y`` sampled on ``x`` in the range ``x_range``."""
+        return downsample_lines(x, y, self.SETTINGS["downsampling_points"], x_range)
+
+    def _band_indices(self, spin):
+        """Return the indices of the k-points kept for each band of ``spin``."""
+        y_bands = self.bands_data["y"][:, self.bands_data["band_type_idx"] == spin].T
+        return downsample_indices(
+            np.array(self.bands_data["x"]),
+            y_bands,
+            self.SETTINGS["downsampling_points"],
+            self.kpoints_range,
+        )
+
+    def _downsample_projection(self, proj_bands, indices):
+        """Keep the points ``indices`` of each band of a projected bands trace.
+
+        The trace holds, for each band, the upper boundary of the fat band, the
+        lower boundary in reverse order and a NaN separator.
+        """
+        x_bands = np.array(self.bands_data["x"])
+        n_bands, n_kpoints = len(indices), len(x_bands)
+        if indices.shape[1] == n_kpoints or len(proj_bands.y) != n_bands * (
+            2 * n_kpoints + 1
+        ):
+            return proj_bands.x, proj_bands.y
+
+        y_mirror = proj_bands.y.reshape(n_bands, -1)
+        y_upper = np.take_along_axis(y_mirror[:, :n_kpoints], indices, axis=1)
+        y_lower = np.take_along_axis(
+            y_mirror[:, 2 * n_kpoints - 1 : n_kpoints - 1 : -1], indices, axis=1
+        )
+        x_bands = x_bands[indices]
+        return _prepare_combined_plotly_traces(
+            np.hstack([x_bands, x_bands[:, ::-1]]),
+            np.hstack([y_upper, y_lower[:, ::-1]]),
+        )
+
+    def _get_band_traces(self):
+        """Return the band traces."""
         colors = {
             (True, 0): self.SETTINGS["bands_up_linecolor"],
             (True, 1): self.SETTINGS["bands_down_linecolor"],
@@ -256,9 +464,11 @@ class BandPdosPlotly:
             if spin not in bands_data["band_type_idx"]:
                 continue
 
-            x_bands = np.array(bands_data["x"]).reshape(1, -1)
             # New shape: (number of bands, number of kpoints)
             y_bands = bands_data["y"][:, bands_data["band_type_idx"] == spin].T
+            indices = self._band_indices(spin)
+            x_bands = np.array(bands_data["x"])[indices]
+            y_bands = np.take_along_axis(y_bands, indices, axis=1)
             # Concatenate the bands and prepare the traces
             x_bands_comb, y_bands_comb = _prepare_combined_plotly_traces(
                 x_bands, y_bands
@@ -269,23 +479,28 @@ class BandPdosPlotly:
                 self.fermi_energy.get("fermi_energy"),
             )
 
+            line = dict(color=colors[(spin_polarized, spin)])
+            if not self.use_webgl:
+                line.update(shape="spline", smoothing=1.3)
+            scatter = go.Scattergl if self.use_webgl else go.Scatter
             scatter_objects.append(
-                go.Scatter(
+                scatter(
                     x=x_bands_comb,
                     y=y_bands_comb - fermi_energy,
                     mode="lines",
-                    line=dict(
-                        color=colors[(spin_polarized, spin)],
-                        shape="spline",
-                        smoothing=1.3,
-                    ),
+                    line=line,
                     showlegend=False,
+                    meta="bands",
                 )
             )
 
-        self._add_traces_to_fig(fig, scatter_objects, 1)
+        return scatter_objects
 
     def _add_pdos_traces(self, fig):
+        self._add_traces_to_fig(fig, self._get_pdos_traces(), 2)
+
+    def _get_pdos_traces(self):
+        """Return the PDOS traces."""
         # Extract DOS data
         dos_data = self.pdos_data["dos"]
 
@@ -301,32 +516,35 @@ class BandPdosPlotly:
 
         # Vectorize Scatter object creation
         for i, trace in enumerate(dos_data):
-            dos_np = np.array(trace["x"])
             fill = "tozerox" if self.plot_type == "combined" else "tozeroy"
             fermi_energy = fermi_energy_spin_mapping.get(
-                ("fermi_energy" in self.fermi_energy, trace["label"].endswith("(↑)")),
+                ("fermi_energy" in self.fermi_energy, trace.label.endswith("(↑)")),
                 self.fermi_energy.get("fermi_energy"),
             )
 
-            x_data = (
-                trace["y"] if self.plot_type == "combined" else dos_np - fermi_energy
-            )
-            y_data = (
-                dos_np - fermi_energy if self.plot_type == "combined" else trace["y"]
+            energy, dos = self._downsample(
+                trace.x - fermi_energy, trace.y, self.energy_range
             )
+            x_data = dos[0] if self.plot_type == "combined" else energy[0]
+            y_data = energy[0] if self.plot_type == "combined" else dos[0]
             scatter_objects[i] = go.Scatter(
                 x=x_data,
                 y=y_data,
                 fill=fill,
-                name=trace["label"],
-                line=dict(color=trace["borderColor"], shape="spline", smoothing=1.0),
-                legendgroup=trace["label"],
+                name=trace.label,
+                line=dict(color=trace.color, shape="spline", smoothing=1.0),
+                legendgroup=trace.label,
+                meta="pdos",
             )
 
-        self._add_traces_to_fig(fig, scatter_objects, 2)
+        return scatter_objects
 
     def _add_projection_traces(self, fig):
         """Function to add the projected bands traces to the bands plot."""
+        self._add_traces_to_fig(fig, self._get_projection_traces(), 1)
+
+    def _get_projection_traces(self):
+        """Return the projected bands traces."""
         projected_bands = self.bands_data["projected_bands"]
         # dictionary with keys (bool(spin polarized), bool(spin up))
         fermi_energy_spin_mapping = {
@@ -334,30 +552,41 @@ class BandPdosPlotly:
             (False, False): self.fermi_energy.get("fermi_energy_down", None),
         }
 
+        # The fill of the projections must follow the downsampled bands
+        band_indices = {
+            spin: self._band_indices(spin)
+            for spin in [0, 1]
+            if spin in self.bands_data["band_type_idx"]
+        }
+
+        scatter = go.Scattergl if self.use_webgl else go.Scatter
         scatter_objects = []
         for proj_bands in projected_bands:
+            spin = 1 if proj_bands.label.endswith("(↓)") else 0
+            x_proj, y_proj = self._downsample_projection(proj_bands, band_indices[spin])
             fermi_energy = fermi_energy_spin_mapping.get(
                 (
                     "fermi_energy" in self.fermi_energy,
-                    proj_bands["label"].endswith("(↑)"),
+                    proj_bands.label.endswith("(↑)"),
                 ),
                 self.fermi_energy.get("fermi_energy"),
             )
             scatter_objects.append(
-                go.Scatter(
-                    x=proj_bands["x"],
-                    y=np.array(proj_bands["y"]) - fermi_energy,
+                scatter(
+                    x=x_proj,
+                    y=y_proj - fermi_energy,
                     fill="toself",
-                    legendgroup=proj_bands["label"],
+                    legendgroup=proj_bands.label,
                     mode="lines",
-                    line=dict(width=0, color=proj_bands["color"]),
-                    name=proj_bands["label"],
+                    line=dict(width=0, color=proj_bands.color),
+                    name=proj_bands.label,
                     # If PDOS is present, use those legend entries
                     showlegend=True if self.plot_type == "bands" else False,
+                    meta="projections",
                 )
             )
 
-        self._add_traces_to_fig(fig, scatter_objects, 1)
+        return scatter_objects
 
     def _customize_combined_layout(self, fig):
         self._customize_layout(fig, self._bands_xaxis, self._bands_yaxis)
@@ -399,6 +628,8 @@ class BandPdosWidget(ipw.VBox):
     Parameters:
     - bands (optional): A node containing band structure data.
     - pdos (optional): A node containing PDOS data.
+    - bands_data, pdos_data (optional): The plot data for the default options,
+      if already extracted with `load_data`, e.g. in a worker thread.
 
     Attributes:
     - description: HTML description of the widget.
@@ -422,7 +653,9 @@ class BandPdosWidget(ipw.VBox):
     )
     projected_bands_width = 0.5
 
-    def __init__(self, bands=None, pdos=None, **kwargs):
+    def __init__(
+        self, bands=None, pdos=None, bands_data=None, pdos_data=None, **kwargs
+    ):
         if bands is None and pdos is None:
             raise ValueError("Either bands or pdos must be provided")
 
@@ -473,12 +706,19 @@ class BandPdosWidget(ipw.VBox):
         )
 
         # Information for the plot
-        self.pdos_data = self._get_pdos_data()
-        self.bands_data = self._get_bands_data()
+        self.pdos_data = self._get_pdos_data() if pdos_data is None else pdos_data
+        self.bands_data = self._get_bands_data() if bands_data is None else bands_data
         # Plotly widget
-        self.bandsplot_widget = BandPdosPlotly(
+        self._bandspdos_plot = BandPdosPlotly(
             bands_data=self.bands_data, pdos_data=self.pdos_data
-        ).bandspdosfigure
+        )
+        self.bandsplot_widget = self._bandspdos_plot.bandspdosfigure
+        # Resample the downsampled traces when zooming, the last resampled
+        # ranges are kept to resample only once per zoom
+        self._zoom_ranges = None
+        self.bandsplot_widget.layout.on_change(
+            self._on_zoom, "xaxis.range", "yaxis.range"
+        )
         # Output widget to display the bandsplot widget
         self.bands_widget = ipw.Output()
         # Output widget to clear the specific widgets
@@ -522,18 +762,11 @@ class BandPdosWidget(ipw.VBox):
         file_name_bands = "bands_data.json"
         file_name_pdos = "dos_data.json"
         if self.bands_data:
-            bands_data_export = {}
-            for key, value in self.bands_data.items():
-                if isinstance(value, np.ndarray):
-                    bands_data_export[key] = value.tolist()
-                else:
-                    bands_data_export[key] = value
-
-            json_str = json.dumps(bands_data_export)
+            json_str = json.dumps(_to_json_compatible(self.bands_data))
             b64_str = base64.b64encode(json_str.encode()).decode()
             self._download(payload=b64_str, filename=file_name_bands)
         if self.pdos_data:
-            json_str = json.dumps(self.pdos_data)
+            json_str = json.dumps(_to_json_compatible(self.pdos_data))
             b64_str = base64.b64encode(json_str.encode()).decode()
             self._download(payload=b64_str, filename=file_name_pdos)
 
@@ -554,40 +787,52 @@ class BandPdosWidget(ipw.VBox):
         )
         display(javas)
 
-    def _get_pdos_data(self):
-        if not self.pdos:
-            return None
-        expanded_selection, syntax_ok = string_range_to_list(
-            self.selected_atoms.value, shift=-1
-        )
-        if syntax_ok:
-            pdos = get_pdos_data(
-                self.pdos,
-                group_tag=self.dos_atoms_group.value,
-                plot_tag=self.dos_plot_group.value,
-                selected_atoms=expanded_selection,
-            )
-            return pdos
-        return None
+    @classmethod
+    def load_data(cls, bands=None, pdos=None):
+        """Return the plot data of the ``bands`` and ``pdos`` nodes for the default options.
 
-    def _get_bands_data(self):
-        if not self.bands:
+        Only plain data is returned, so that it can be extracted in a worker
+        thread and passed to the widget created in the main thread.
+        """
+        options = {"group_tag": "kinds", "plot_tag": "total", "selected_atoms": []}
+        return {
+            "bands_data": cls._plot_data(bands, "bands", **options),
+            "pdos_data": cls._plot_data(pdos, "pdos", **options),
+        }
+
+    @classmethod
+    def _plot_data(cls, outputs, kind, **options):
+        if not outputs:
             return None
+        if kind == "bands":
+            return get_cached_plot_data(
+                get_bands_projections_data,
+                outputs,
+                bands_width=cls.projected_bands_width,
+                **options,
+            )
+        return get_cached_plot_data(get_pdos_data, outputs, **options)
 
+    def _get_plot_data(self, outputs, kind):
         expanded_selection, syntax_ok = string_range_to_list(
             self.selected_atoms.value, shift=-1
         )
         if syntax_ok:
-            bands = get_bands_projections_data(
-                self.bands,
+            return self._plot_data(
+                outputs,
+                kind,
                 group_tag=self.dos_atoms_group.value,
                 plot_tag=self.dos_plot_group.value,
                 selected_atoms=expanded_selection,
-                bands_width=self.projected_bands_width,
             )
-            return bands
         return None
 
+    def _get_pdos_data(self):
+        return self._get_plot_data(self.pdos, "pdos")
+
+    def _get_bands_data(self):
+        return self._get_plot_data(self.bands, "bands")
+
     def _initial_view(self):
         with self.bands_widget:
             self._clear_output_and_display(self.bandsplot_widget)
@@ -605,12 +850,29 @@ class BandPdosWidget(ipw.VBox):
             else:
                 self.pdos_data = self._get_pdos_data()
                 self.bands_data = self._get_bands_data()
-                self.bandsplot_widget = BandPdosPlotly(
+                # The bands and the layout do not depend on the options, only
+                # the PDOS and projected bands traces need to be updated.
+                self._bandspdos_plot = BandPdosPlotly(
                     bands_data=self.bands_data,
                     pdos_data=self.pdos_data,
                     project_bands=self.project_bands_box.value,
-                ).bandspdosfigure
-                self._clear_output_and_display(self.bandsplot_widget)
+                )
+                self._bandspdos_plot.update_figure(self.bandsplot_widget)
+                self._zoom_ranges = None
+
+    def _on_zoom(self, layout, *_):
+        """Resample the downsampled traces in the new visible range.
+
+        A zoom can change the range of both axes in separate notifications,
+        the traces are only resampled if the visible ranges changed.
+        """
+        ranges = (layout.xaxis.range, layout.yaxis.range)
+        if not self._bandspdos_plot.is_downsampled or ranges == self._zoom_ranges:
+            return
+        self._zoom_ranges = ranges
+        self._bandspdos_plot.update_figure(
+            self.bandsplot_widget, update_bands=True, zoomed=True
+        )
 
     def _clear_output_and_display(self, widget=None):
         clear_output(wait=True)
@@ -618,12 +880,35 @@ class BandPdosWidget(ipw.VBox):
             display(widget)
 
 
+def _output_uuids(outputs):
+    """Return the sorted UUIDs of all the nodes in a (nested) outputs namespace."""
+    if isinstance(outputs, Node):
+        return [outputs.uuid]
+    return sorted(uuid for value in outputs.values() for uuid in _output_uuids(value))
+
+
+def get_cached_plot_data(function, outputs, **kwargs):
+    """Return ``function(outputs, **kwargs)``, using the on-disk plot data cache.
+
+    Stored nodes are immutable, so the UUIDs of the output nodes together with
+    the grouping options fully determine the processed data.
+    """
+    key = PLOT_DATA_CACHE.key(function.__name__, _output_uuids(outputs), kwargs)
+    data = PLOT_DATA_CACHE.get(key)
+    if data is None:
+        data = function(outputs, **kwargs)
+        if data is not None:
+            PLOT_DATA_CACHE.set(key, data)
+    return data
+
+
 def _prepare_combined_plotly_traces(x_to_conc, y_to_conc):
     """Combine multiple lines into a single trace.
 
     The rows of y are concatenated with a np.nan column as a separator. Moreover,
     the x values are ajduced to match the shape of the concatenated y values. These
     transfomred arrays, representing multiple datasets/lines, can be plotted in a single trace.
+    The x values are either shared by all lines, or given for each line (2D array).
     """
     if y_to_conc.ndim != 2:
         raise ValueError("y must be a 2D array")
@@ -639,12 +924,60 @@ def _prepare_combined_plotly_traces(x_to_conc, y_to_conc):
     ).flatten()
 
     # Same logic for the x axis
-    x_transf = x_to_conc.reshape(1, -1) * np.ones(y_dim0).reshape(-1, 1)
+    x_transf = np.broadcast_to(x_to_conc, y_to_conc.shape)
     x_transf = np.hstack([x_transf, np.full((y_dim0, 1), np.nan)]).flatten()
 
     return x_transf, y_transf
 
 
+def downsample_lines(x, y, n_points, x_range=None):
+    """Downsample lines to at most ``n_points`` points with min-max decimation.
+
+    The lines ``y`` (one line per row) are sampled on the increasing values ``x``.
+    If they are longer than ``n_points``, only the points in ``x_range`` and their
+    two neighbours are kept, and these are split into bins for which only the
+    minimum and the maximum are kept, so that the peaks are preserved.
+    Return the x values (one row for each line) and the y values.
+    """
+    y = np.atleast_2d(y)
+    indices = downsample_indices(x, y, n_points, x_range)
+    return x[indices], np.take_along_axis(y, indices, axis=1)
+
+
+def downsample_indices(x, y, n_points, x_range=None):
+    """Return the indices of the points kept by ``downsample_lines``.
+
+    The indices are given for each line, so that the same points can be selected
+    in data that follow the lines, e.g. the fat bands projections.
+    """
+    y = np.atleast_2d(y)
+    start, stop = 0, len(x)
+    if n_points and y.shape[1] > n_points and x_range is not None:
+        start = max(np.searchsorted(x, min(x_range), side="left") - 1, 0)
+        stop = min(np.searchsorted(x, max(x_range), side="right") + 1, len(x))
+        y = y[:, start:stop]
+
+    n_x = y.shape[1]
+    if not n_points or n_x <= n_points:
+        return np.broadcast_to(np.arange(start, start + n_x), y.shape)
+
+    n_bins = max(n_points // 2 - 1, 1)
+    bin_size = -(-n_x // n_bins)
+    # Repeat the last value to fill the last bins
+    binned = np.pad(y, ((0, 0), (0, n_bins * bin_size - n_x)), mode="edge")
+    binned = binned.reshape(len(y), n_bins, bin_size)
+    offsets = np.arange(n_bins) * bin_size
+    indices = np.hstack(
+        [
+            np.zeros((len(y), 1), dtype=int),
+            offsets + binned.argmin(axis=2),
+            offsets + binned.argmax(axis=2),
+            np.full((len(y), 1), n_x - 1),
+        ]
+    )
+    return start + np.sort(np.minimum(indices, n_x - 1), axis=1)
+
+
 def _prepare_projections_to_plot(bands_data, projections, bands_width):
     """Prepare the projected bands to be plotted.
 
@@ -664,8 +997,8 @@ def _prepare_projections_to_plot(bands_data, projections, bands_width):
 
         for proj in projections[spin]:
             # Create the upper and lower boundary of the fat bands based on the orbital projections
-            y_bands_proj_upper = y_bands + bands_width * proj["projections"].T
-            y_bands_proj_lower = y_bands - bands_width * proj["projections"].T
+            y_bands_proj_upper = y_bands + bands_width * proj.y.T
+            y_bands_proj_lower = y_bands - bands_width * proj.y.T
             # As mentioned above, the bands need to be concatenated with their mirror image
             # to create the filled areas properly
             y_bands_mirror = np.hstack(
@@ -678,12 +1011,12 @@ def _prepare_projections_to_plot(bands_data, projections, bands_width):
             )
 
             projected_bands.append(
-                {
-                    "x": x_bands_comb.tolist(),
-                    "y": y_bands_proj_comb.tolist(),
-                    "label": proj["label"],
-                    "color": proj["color"],
-                }
+                Trace(
+                    label=proj.label,
+                    x=x_bands_comb,
+                    y=y_bands_proj_comb,
+                    color=proj.color,
+                )
             )
     return projected_bands
 
@@ -759,15 +1092,12 @@ def get_pdos_data(pdos, group_tag, plot_tag, selected_atoms):
 
     if "projections" in pdos.projwfc:
         # Total DOS
-        tdos = {
-            "label": "Total DOS",
-            "x": energy_dos.tolist(),
-            "y": tdos_values.get("dos").tolist(),
-            "borderColor": "#8A8A8A",  # dark gray
-            "backgroundColor": "#999999",  # light gray
-            "backgroundAlpha": "40%",
-            "lineStyle": "solid",
-        }
+        tdos = Trace(
+            label="Total DOS",
+            x=energy_dos,
+            y=tdos_values.get("dos"),
+            color="#8A8A8A",  # dark gray
+        )
         dos.append(tdos)
         dos += _projections_curated_options(
             pdos.projwfc.projections,
@@ -778,24 +1108,19 @@ def get_pdos_data(pdos, group_tag, plot_tag, selected_atoms):
         )
     else:
         # Total DOS (↑) and Total DOS (↓)
-        tdos_up = {
-            "label": "Total DOS (↑)",
-            "x": energy_dos.tolist(),
-            "y": tdos_values.get("dos_spin_up").tolist(),
-            "borderColor": "#8A8A8A",  # dark gray
-            "backgroundColor": "#999999",  # light gray
-            "backgroundAlpha": "40%",
-            "lineStyle": "solid",
-        }
-        tdos_down = {
-            "label": "Total DOS (↓)",
-            "x": energy_dos.tolist(),
-            "y": (-tdos_values.get("dos_spin_down")).tolist(),
-            "borderColor": "#8A8A8A",  # dark gray
-            "backgroundColor": "#999999",  # light gray
-            "backgroundAlpha": "40%",
-            "lineStyle": "dash",
-        }
+        tdos_up = Trace(
+            label="Total DOS (↑)",
+            x=energy_dos,
+            y=tdos_values.get("dos_spin_up"),
+            color="#8A8A8A",  # dark gray
+        )
+        tdos_down = Trace(
+            label="Total DOS (↓)",
+            x=energy_dos,
+            y=-tdos_values.get("dos_spin_down"),
+            color="#8A8A8A",  # dark gray
+            line_style="dash",
+        )
         dos += [tdos_up, tdos_down]
 
         # Spin-up (↑) and Spin-down (↓)
@@ -826,7 +1151,7 @@ def get_pdos_data(pdos, group_tag, plot_tag, selected_atoms):
     else:
         data_dict["fermi_energy"] = pdos.nscf.output_parameters["fermi_energy"]
 
-    return json.loads(json.dumps(data_dict))
+    return data_dict
 
 
 def _get_grouping_key(
@@ -860,34 +1185,35 @@ def _get_grouping_key(
         return None
 
 
+# Constants for HTML tags
+HTML_TAGS = {
+    "s": "s",
+    "pz": "p<sub>z</sub>",
+    "px": "p<sub>x</sub>",
+    "py": "p<sub>y</sub>",
+    "dz2": "d<sub>z<sup>2</sup></sub>",
+    "dxy": "d<sub>xy</sub>",
+    "dxz": "d<sub>xz</sub>",
+    "dyz": "d<sub>yz</sub>",
+    "dx2-y2": "d<sub>x<sup>2</sup>-y<sup>2</sup></sub>",
+    "fz3": "f<sub>z<sup>3</sup></sub>",
+    "fxz2": "f<sub>xz<sup>2</sup></sub>",
+    "fyz2": "f<sub>yz<sup>2</sup></sub>",
+    "fxyz": "f<sub>xzy</sub>",
+    "fx(x2-3y2)": "f<sub>x(x<sup>2</sup>-3y<sup>2</sup>)</sub>",
+    "fy(3x2-y2)": "f<sub>y(3x<sup>2</sup>-y<sup>2</sup>)</sub>",
+    "fy(x2-z2)": "f<sub>y(x<sup>2</sup>-z<sup>2</sup>)</sub>",
+    0.5: "<sup>+1</sup>/<sub>2</sub>",
+    -0.5: "<sup>-1</sup>/<sub>2</sub>",
+    1.5: "<sup>+3</sup>/<sub>2</sub>",
+    -1.5: "<sup>-3</sup>/<sub>2</sub>",
+    2.5: "<sup>+5</sup>/<sub>2</sub>",
+    -2.5: "<sup>-5</sup>/<sub>2</sub>",
+}
+
+
 def _curate_orbitals(orbital):
     """Curate and transform the orbital data into the desired format."""
-    # Constants for HTML tags
-    HTML_TAGS = {
-        "s": "s",
-        "pz": "p<sub>z</sub>",
-        "px": "p<sub>x</sub>",
-        "py": "p<sub>y</sub>",
-        "dz2": "d<sub>z<sup>2</sup></sub>",
-        "dxy": "d<sub>xy</sub>",
-        "dxz": "d<sub>xz</sub>",
-        "dyz": "d<sub>yz</sub>",
-        "dx2-y2": "d<sub>x<sup>2</sup>-y<sup>2</sup></sub>",
-        "fz3": "f<sub>z<sup>3</sup></sub>",
-        "fxz2": "f<sub>xz<sup>2</sup></sub>",
-        "fyz2": "f<sub>yz<sup>2</sup></sub>",
-        "fxyz": "f<sub>xzy</sub>",
-        "fx(x2-3y2)": "f<sub>x(x<sup>2</sup>-3y<sup>2</sup>)</sub>",
-        "fy(3x2-y2)": "f<sub>y(3x<sup>2</sup>-y<sup>2</sup>)</sub>",
-        "fy(x2-z2)": "f<sub>y(x<sup>2</sup>-z<sup>2</sup>)</sub>",
-        0.5: "<sup>+1</sup>/<sub>2</sub>",
-        -0.5: "<sup>-1</sup>/<sub>2</sub>",
-        1.5: "<sup>+3</sup>/<sub>2</sub>",
-        -1.5: "<sup>-3</sup>/<sub>2</sub>",
-        2.5: "<sup>+5</sup>/<sub>2</sub>",
-        -2.5: "<sup>-5</sup>/<sub>2</sub>",
-    }
-
     orbital_data = orbital.get_orbital_dict()
     kind_name = orbital_data["kind_name"]
     atom_position = [round(i, 2) for i in orbital_data["position"]]
@@ -914,6 +1240,110 @@ def _curate_orbitals(orbital):
     return orbital_name_plotly, orbital_angular_momentum, kind_name, atom_position
 
 
+class OrbitalProjections:
+    """Orbital metadata table and stacked projections of a ``ProjectionData`` node.
+
+    The orbitals are curated only once, when the table is built. Every grouping
+    of the projections is then a single matrix product of a 0/1 grouping matrix
+    with the stacked 2D array of all the orbital projections.
+
+    Attributes:
+    - orbitals: one tuple (orbital_name_plotly, orbital_angular_momentum, kind_name,
+      atom_position) per orbital, as returned by ``_curate_orbitals``.
+    - atom_indices: index of the atom of each orbital, in order of first appearance.
+    - data: the projections (or PDOS) of all orbitals, stacked along the first axis.
+    - energy: the energy grid of the PDOS, ``None`` for the projections.
+    """
+
+    def __init__(self, projections: ProjectionData, projections_pdos="pdos"):
+        if projections_pdos == "pdos":
+            orbitals, data, energies = zip(*projections.get_pdos())
+            self.energy = energies[0]
+        elif projections_pdos == "projections":
+            orbitals, data = zip(*projections.get_projections())
+            self.energy = None
+        else:
+            raise ValueError(
+                f"Invalid value for `projections_pdos`: {projections_pdos}"
+            )
+
+        self.orbitals = [_curate_orbitals(orbital) for orbital in orbitals]
+        atom_indices = {}
+        self.atom_indices = np.array(
+            [
+                atom_indices.setdefault(tuple(atom_position), len(atom_indices))
+                for *_, atom_position in self.orbitals
+            ]
+        )
+        self.data = np.stack(data)
+        self._groups = {}
+
+    def _get_groups(self, group_tag, plot_tag):
+        """Return the label of each group and the group index of each orbital."""
+        if (group_tag, plot_tag) not in self._groups:
+            labels = {}
+            group_indices = []
+            for (
+                orbital_name_plotly,
+                orbital_angular_momentum,
+                kind_name,
+                atom_position,
+            ) in self.orbitals:
+                key = _get_grouping_key(
+                    group_tag,
+                    plot_tag,
+                    atom_position,
+                    kind_name,
+                    orbital_name_plotly,
+                    orbital_angular_momentum,
+                )
+                if key is None:
+                    break
+                group_indices.append(labels.setdefault(key, len(labels)))
+            self._groups[(group_tag, plot_tag)] = (
+                list(labels),
+                np.array(group_indices, dtype=int),
+            )
+        return self._groups[(group_tag, plot_tag)]
+
+    def group(self, group_tag, plot_tag, selected_atoms=None):
+        """Return a list of (label, summed projections) tuples.
+
+        Only the orbitals of the ``selected_atoms`` (atom indices) are included,
+        all orbitals if it is empty. The groups are ordered by the first
+        appearance of their orbitals, as in the ``ProjectionData``.
+        """
+        labels, group_indices = self._get_groups(group_tag, plot_tag)
+        if not labels:
+            return []
+
+        orbital_indices = np.arange(len(self.orbitals))
+        if selected_atoms:
+            orbital_indices = orbital_indices[
+                np.isin(self.atom_indices, selected_atoms)
+            ]
+        selected_groups, first_orbital = np.unique(
+            group_indices[orbital_indices], return_index=True
+        )
+        selected_groups = selected_groups[np.argsort(first_orbital)]
+        # Position of each group in the output
+        group_rank = np.empty(len(labels), dtype=int)
+        group_rank[selected_groups] = np.arange(len(selected_groups))
+
+        grouping_matrix = np.zeros((len(selected_groups), len(self.orbitals)))
+        grouping_matrix[group_rank[group_indices[orbital_indices]], orbital_indices] = 1
+        summed = (grouping_matrix @ self.data.reshape(len(self.orbitals), -1)).reshape(
+            -1, *self.data.shape[1:]
+        )
+        return [(labels[group], summed[i]) for i, group in enumerate(selected_groups)]
+
+
+@functools.lru_cache(maxsize=8)
+def _get_orbital_projections(uuid, projections_pdos):
+    """Return the (cached) ``OrbitalProjections`` of a stored ``ProjectionData`` node."""
+    return OrbitalProjections(load_node(uuid), projections_pdos)
+
+
 def _projections_curated_options(
     projections: ProjectionData,
     group_tag,
@@ -927,76 +1357,38 @@ def _projections_curated_options(
 
     This function can be used to extract the PDOS or the projections data.
     """
-    _proj_pdos = {}
-    list_positions = []
-
     # Constants for spin types
     SPIN_LABELS = {"up": "(↑)", "down": "(↓)", "none": ""}
     SIGN_MULT_FACTOR = {"up": 1, "down": -1, "none": 1}
 
-    if projections_pdos == "pdos":
-        proj_data = projections.get_pdos()
-    elif projections_pdos == "projections":
-        proj_data = projections.get_projections()
-    else:
-        raise ValueError(f"Invalid value for `projections_pdos`: {projections_pdos}")
-
-    for orb_proj in proj_data:
-        if projections_pdos == "pdos":
-            orbital, proj_pdos, energy = orb_proj
-        elif projections_pdos == "projections":
-            orbital, proj_pdos = orb_proj
-            energy = None
-
-        (
-            orbital_name_plotly,
-            orbital_angular_momentum,
-            kind_name,
-            atom_position,
-        ) = _curate_orbitals(orbital)
-
-        if atom_position not in list_positions:
-            list_positions.append(atom_position)
-
-        key = _get_grouping_key(
-            group_tag,
-            plot_tag,
-            atom_position,
-            kind_name,
-            orbital_name_plotly,
-            orbital_angular_momentum,
+    if projections.is_stored:
+        orbital_projections = _get_orbital_projections(
+            projections.uuid, projections_pdos
         )
-        if not selected_atoms:
-            if key:
-                _proj_pdos.setdefault(key, [energy, 0])[1] += proj_pdos
-
-        else:
-            try:
-                index = list_positions.index(atom_position)
-                if index in selected_atoms:
-                    if key:
-                        _proj_pdos.setdefault(key, [energy, 0])[1] += proj_pdos
-
-            except ValueError:
-                pass
+    else:
+        orbital_projections = OrbitalProjections(projections, projections_pdos)
 
     curated_proj = []
-    for label, (energy, proj_pdos) in _proj_pdos.items():
+    for label, proj_pdos in orbital_projections.group(
+        group_tag, plot_tag, selected_atoms
+    ):
         label += SPIN_LABELS[spin_type]
         if projections_pdos == "pdos":
-            orbital_proj_pdos = {
-                "label": label,
-                "x": energy.tolist(),
-                "y": (SIGN_MULT_FACTOR[spin_type] * proj_pdos).tolist(),
-                "borderColor": cmap(label),
-                "lineStyle": line_style,
-            }
+            orbital_proj_pdos = Trace(
+                label=label,
+                x=orbital_projections.energy,
+                y=SIGN_MULT_FACTOR[spin_type] * proj_pdos,
+                color=cmap(label),
+                line_style=line_style,
+            )
         else:
-            orbital_proj_pdos = {
-                "label": label,
-                "projections": proj_pdos,
-                "color": cmap(label),
-            }
+            # The projections on the bands, shape (number of kpoints, number of bands)
+            orbital_proj_pdos = Trace(
+                label=label,
+                x=None,
+                y=proj_pdos,
+                color=cmap(label),
+            )
         curated_proj.append(orbital_proj_pdos)
 
     return curated_proj
@@ -0,0 +1,223 @@
+"""Caches for processed result data.
+
+Authors: AiiDAlab team
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+
+import numpy as np
+
+__all__ = [
+    "BROADENING_CACHE",
+    "DiskCache",
+    "LRUCache",
+    "register_dataclass",
+    "round_to_step",
+]
+
+# The cache files are stored per AiiDA profile below this folder, unless the
+# ``AIIDALAB_QE_CACHE_DIR`` environment variable points to another location.
+DEFAULT_CACHE_ROOT = Path.home().joinpath(".cache", "aiidalab-qe")
+
+
+def _default_cache_dir(name: str) -> Path:
+    from aiida import get_profile
+
+    root = Path(os.environ.get("AIIDALAB_QE_CACHE_DIR", DEFAULT_CACHE_ROOT))
+    profile = get_profile()
+    return root / (profile.name if profile else "default") / name
+
+
+# Dataclasses that can be stored in the cache, by name.
+_DATACLASSES = {}
+
+
+def register_dataclass(cls):
+    """Class decorator allowing instances of the dataclass ``cls`` to be cached."""
+    _DATACLASSES[cls.__qualname__] = cls
+    return cls
+
+
+def _encode(obj, arrays: dict):
+    """Replace all arrays in a nested structure by references into ``arrays``."""
+    if isinstance(obj, np.ndarray):
+        name = f"arr_{len(arrays)}"
+        arrays[name] = obj
+        return {"__ndarray__": name}
+    if _DATACLASSES.get(type(obj).__qualname__) is type(obj):
+        fields = {
+            field.name: _encode(getattr(obj, field.name), arrays)
+            for field in dataclasses.fields(obj)
+        }
+        return {"__dataclass__": type(obj).__qualname__, "fields": fields}
+    if isinstance(obj, dict):
+        return {key: _encode(value, arrays) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_encode(value, arrays) for value in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def _decode(obj, arrays):
+    """Inverse of ``_encode``."""
+    if isinstance(obj, dict):
+        if set(obj) == {"__ndarray__"}:
+            return arrays[obj["__ndarray__"]]
+        if set(obj) == {"__dataclass__", "fields"}:
+            cls = _DATACLASSES[obj["__dataclass__"]]
+            return cls(**_decode(obj["fields"], arrays))
+        return {key: _decode(value, arrays) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_decode(value, arrays) for value in obj]
+    return obj
+
+
+class DiskCache:
+    """A size-bounded, least-recently-used cache stored as compressed NPZ files.
+
+    The cached values are nested dictionaries and lists of JSON-serializable
+    items, NumPy arrays and dataclasses registered with ``register_dataclass``.
+    The arrays are stored natively in the NPZ archive, while the remaining
+    structure is stored as a JSON string, so loading an entry never requires
+    unpickling.
+
+    Every entry is a single file named after the hash of its key. Reading an
+    entry updates its modification time, and whenever the total size of the
+    cache exceeds ``max_size`` bytes the least recently used entries are removed.
+    Any I/O error is treated as a cache miss, the cache is an optimization only.
+    """
+
+    # Increase this number whenever the format of the cached data changes,
+    # so that entries written by older versions are not used anymore.
+    FORMAT_VERSION = 2
+
+    def __init__(self, name, max_size=512 * 1024**2, cache_dir=None):
+        self.name = name
+        self.max_size = max_size
+        self._cache_dir = Path(cache_dir) if cache_dir else None
+
+    @property
+    def cache_dir(self) -> Path:
+        if self._cache_dir is None:
+            self._cache_dir = _default_cache_dir(self.name)
+        return self._cache_dir
+
+    def key(self, *parts) -> str:
+        """Return the key for the given JSON-serializable parts."""
+        payload = json.dumps([self.FORMAT_VERSION, *parts], sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.npz"
+
+    def get(self, key: str, default=None):
+        """Return the value stored under ``key``, or ``default`` if there is none."""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as npz:
+                arrays = {name: npz[name] for name in npz.files}
+            value = _decode(json.loads(str(arrays.pop("__tree__"))), arrays)
+            os.utime(path)
+        except FileNotFoundError:
+            return default
+        except (OSError, ValueError, KeyError, TypeError):
+            # Corrupted or incompatible entry, drop it.
+            path.unlink(missing_ok=True)
+            return default
+        return value
+
+    def set(self, key: str, value) -> None:
+        """Store ``value`` under ``key`` and evict old entries if needed."""
+        arrays = {}
+        tree = json.dumps(_encode(value, arrays))
+        path = self._path(key)
+        tmp_path = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # A unique file, since several threads may store the same key.
+            with NamedTemporaryFile(
+                dir=path.parent, prefix=f"{path.name}.", suffix=".tmp", delete=False
+            ) as handle:
+                tmp_path = Path(handle.name)
+                np.savez_compressed(handle, __tree__=np.array(tree), **arrays)
+            # Atomic, so concurrent readers never see a partially written file.
+            os.replace(tmp_path, path)
+            self._evict()
+        except OSError:
+            if tmp_path is not None:
+                tmp_path.unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        """Remove all entries of the cache."""
+        for path in self.cache_dir.glob("*.npz"):
+            path.unlink(missing_ok=True)
+
+    def _evict(self) -> None:
+        """Remove the least recently used entries until the cache fits ``max_size``."""
+        entries = []
+        for path in self.cache_dir.glob("*.npz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+
+
+def round_to_step(value: float, step: float) -> float:
+    """Round ``value`` to a multiple of ``step``, e.g. to use a slider value in a key."""
+    return round(round(value / step) * step, 10)
+
+
+class LRUCache:
+    """A thread-safe, in-memory cache keeping the ``max_size`` most recently used entries.
+
+    The cached values are returned as they are, they must not be modified.
+    """
+
+    def __init__(self, max_size=64):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Return the value stored under ``key``, or ``default`` if there is none."""
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def set(self, key, value) -> None:
+        """Store ``value`` under ``key`` and evict the least recently used entries."""
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        """Remove all entries of the cache."""
+        with self._lock:
+            self._entries.clear()
+
+
+# Broadened spectra of the XAS and XPS result panels, keyed on the node UUID,
+# the element and the broadening parameters rounded to the slider steps.
+BROADENING_CACHE = LRUCache(max_size=64)
@@ -95,7 +95,7 @@ class CalcJobNodeViewerWidget(ipw.VBox):
     def __init__(self, calcjob, **kwargs):
         self.calcjob = calcjob
         self.output_follower = CalcJobOutputFollower()
-        self.log_output = LogOutputWidget()
+        self.log_output = LogOutputWidget(get_payload=self._get_full_output)
 
         self.output_follower.calcjob_uuid = self.calcjob.uuid
         self.output_follower.observe(self._observe_output_follower_lineno, ["lineno"])
@@ -104,7 +104,15 @@ class CalcJobNodeViewerWidget(ipw.VBox):
             [ipw.HTML(f"CalcJob: {self.calcjob}"), self.log_output], **kwargs
         )
 
-    def _observe_output_follower_lineno(self, _):
+    def _observe_output_follower_lineno(self, change):
+        # Only the new lines are appended to the log.
+        num_new_lines = change["new"] - change["old"]
         with self.hold_trait_notifications():
             self.log_output.filename = self.output_follower.filename
-            self.log_output.value = "\n".join(self.output_follower.output)
+            if num_new_lines < 0:
+                self.log_output.clear()
+            elif num_new_lines > 0:
+                self.log_output.append(self.output_follower.output[-num_new_lines:])
+
+    def _get_full_output(self):
+        return "\n".join(self.output_follower.get_lines()).encode("utf-8")
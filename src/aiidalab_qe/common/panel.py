@@ -105,6 +105,7 @@ class ResultPanel(Panel):
 
     def __init__(self, node=None, **kwargs):
         self.node = node
+        self._data = None
         self.children = [
             ipw.VBox(
                 [ipw.Label(f"{self.title} not available.")],
@@ -121,6 +122,31 @@ class ResultPanel(Panel):
 
         return self.node.outputs
 
+    @property
+    def data(self):
+        """Data shown in the panel, extracted by ``_load_data`` on first access."""
+        if self._data is None and self.node is not None:
+            self._data = self._load_data(self.node)
+        return self._data
+
+    def load_data(self, node):
+        """Extract the data shown in the panel from ``node``.
+
+        As the nodes can only be used in the thread that loaded them, ``node``
+        is the node of the panel loaded again in the calling thread, e.g. a
+        worker thread.
+        """
+        self._data = self._load_data(node)
+
+    def _load_data(self, node):
+        """Return the data shown in the panel, extracted from ``node``.
+
+        Only plain data (e.g. NumPy arrays and dictionaries) must be returned,
+        not nodes, so that ``_update_view`` and the callbacks of the widgets
+        can use it from any thread.
+        """
+        return {}
+
     def _update_view(self):
         """Update the result in the panel.
 
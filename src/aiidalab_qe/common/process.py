@@ -1,10 +1,24 @@
 """Widgets related to process management."""
 
+import inspect
+import threading
+import time
+import traceback
+import warnings
 from dataclasses import make_dataclass
 
 import ipywidgets as ipw
 import traitlets as tl
+from aiida import orm
+from aiida.engine import ProcessState
 from aiida.tools.query.calculation import CalculationQueryBuilder
+from aiidalab_widgets_base import ProcessMonitor
+
+TERMINAL_PROCESS_STATES = (
+    ProcessState.FINISHED.value,
+    ProcessState.EXCEPTED.value,
+    ProcessState.KILLED.value,
+)
 
 
 class WorkChainSelector(ipw.HBox):
@@ -16,6 +30,16 @@ class WorkChainSelector(ipw.HBox):
     `extra_fields` attribute to a list of tuples, where each tuple contains the
     name of the field and the type of the field. The field names must match the
     names of the output keys of the `parse_extra_info` method.
+
+    To avoid one query per work chain in `parse_extra_info`, set the
+    `extra_projections` attribute to the list of node properties needed, e.g.
+    `["extras.structure"]`, and implement `parse_extra_projections` instead.
+    The properties are projected in the same query as the work chains.
+
+    The queried rows of the work chains found are cached, so that a refresh
+    only queries the work chains created or modified since the previous one
+    and the ones that were not terminated. The cached rows are formatted again
+    on every refresh, e.g. for the relative creation time.
     """
 
     # The PK of a WorkChainNode.
@@ -34,9 +58,18 @@ class WorkChainSelector(ipw.HBox):
     projections = ["pk", "ctime", "state", "label"]
     BASE_FIELDS = [("pk", int), ("ctime", str), ("state", str), ("label", str)]
     extra_fields = None
+    extra_projections = None
 
     def __init__(self, process_label, **kwargs):
         self.process_label = process_label
+        # The queried rows and the dropdown options of the work chains found
+        # so far by PK, the largest PK and modification time found and the PKs
+        # of the work chains not terminated yet.
+        self._rows = {}
+        self._options = {}
+        self._last_pk = None
+        self._last_mtime = None
+        self._active_pks = set()
         self.work_chains_prompt = ipw.HTML(
             "<b>Select computed workflow or start a new one:</b>&nbsp;"
         )
@@ -51,7 +84,7 @@ class WorkChainSelector(ipw.HBox):
         )
 
         if self.extra_fields is not None:
-            fmt_extra = "".join([f"{{wc.{field[0]}}}" for field in self.extra_fields])
+            fmt_extra = "\t".join([f"{{wc.{field[0]}}}" for field in self.extra_fields])
             self.fmt_workchain = self.BASE_FMT_WORKCHAIN + "\t" + fmt_extra
         else:
             self.fmt_workchain = self.BASE_FMT_WORKCHAIN
@@ -91,32 +124,143 @@ class WorkChainSelector(ipw.HBox):
         """Parse extra information about the work chain."""
         return dict()
 
-    def find_work_chains(self):
+    def parse_extra_projections(self, projected: dict) -> dict:
+        """Parse extra information about the work chain from the values of the
+        `extra_projections`, which are queried together with the work chains.
+
+        This avoids loading every work chain in `parse_extra_info`.
+        """
+        return dict()
+
+    def find_work_chains(self, filters=None):
+        """Yield the work chains, optionally restricted by additional node ``filters``."""
+        for row in self._query_work_chains(filters):
+            yield self._format_row(row)
+
+    def _format_row(self, row):
+        """Return the work chain of a row returned by ``_query_work_chains``."""
+        mapper = CalculationQueryBuilder().mapper
+        fields = self.BASE_FIELDS + (self.extra_fields or [])
+        WorkChain = make_dataclass("WorkChain", fields)
+        process_info = {
+            projection: mapper.format(projection, row["process"])
+            for projection in self.projections
+        }
+        process_info.update(row["extra_info"])
+        return WorkChain(**process_info)
+
+    def _query_work_chains(self, filters=None):
+        """Yield the unformatted rows of the matching work chains.
+
+        Each row holds the projected properties of the process, its process
+        state, modification time and parsed extra information.
+        """
         builder = CalculationQueryBuilder()
-        filters = builder.get_filters(
+        mapper = builder.mapper
+        query_filters = builder.get_filters(
             process_label=self.process_label,
         )
-        query_set = builder.get_query_set(
-            filters=filters,
-            order_by={"ctime": "desc"},
-        )
-        projected = builder.get_projected(
-            query_set,
-            projections=self.projections,
+        query_filters.update(filters or {})
+
+        # The node properties needed to format the projections, the state is
+        # formatted from several attributes.
+        required = {"process_state", "mtime"}
+        for projection in self.projections:
+            if projection == "state":
+                required.update({"process_state", "paused", "exit_status"})
+            else:
+                required.add(projection)
+        project = {mapper.get_attribute(projection) for projection in required}
+        extra_projections = list(self.extra_projections or [])
+
+        query = orm.QueryBuilder()
+        query.append(
+            orm.ProcessNode,
+            filters=query_filters,
+            project=sorted(project) + extra_projections,
+            tag="process",
         )
+        query.order_by({"process": {"ctime": "desc"}})
 
-        for result in projected[1:]:
-            process_info = dict(zip(self.projections, result))
+        process_state_key = mapper.get_attribute("process_state")
+        pk_key = mapper.get_attribute("pk")
 
+        for query_result in query.iterdict():
+            process = query_result["process"]
+            extra_info = {}
             if self.extra_fields is not None:
-                pk = process_info["pk"]
-                extra_info = self.parse_extra_info(pk)
-
-                yield make_dataclass("WorkChain", self.BASE_FIELDS + self.extra_fields)(
-                    **process_info, **extra_info
-                )
+                if self.extra_projections is not None:
+                    extra_info = self.parse_extra_projections(
+                        {key: process[key] for key in extra_projections}
+                    )
+                else:
+                    extra_info = self.parse_extra_info(process[pk_key])
+
+            yield {
+                "process": process,
+                "pk": process[pk_key],
+                "process_state": process[process_state_key],
+                "mtime": process[mapper.get_attribute("mtime")],
+                "extra_info": extra_info,
+            }
+
+    def _count_work_chains(self):
+        builder = CalculationQueryBuilder()
+        filters = builder.get_filters(process_label=self.process_label)
+        return orm.QueryBuilder().append(orm.ProcessNode, filters=filters).count()
+
+    def _update_options(self):
+        """Update the cached rows with the new, modified and not terminated work
+        chains, and format the options of all of them again.
+
+        Return whether any option changed.
+        """
+        self._fetch_rows()
+        if len(self._rows) != self._count_work_chains():
+            # Some terminated work chains were deleted, reload all of them.
+            self._rows.clear()
+            self._last_pk = None
+            self._last_mtime = None
+            self._active_pks.clear()
+            self._fetch_rows()
+
+        options = {
+            pk: (self.fmt_workchain.format(wc=self._format_row(row)), pk)
+            for pk, row in self._rows.items()
+        }
+        changed = options != self._options
+        self._options = options
+        return changed
+
+    def _fetch_rows(self):
+        if self._last_pk is None:
+            filters = None
+        else:
+            conditions = [
+                {"id": {">": self._last_pk}},
+                {"mtime": {">": self._last_mtime}},
+            ]
+            if self._active_pks:
+                conditions.append({"id": {"in": list(self._active_pks)}})
+            filters = {"or": conditions}
+
+        found = set()
+        for row in self._query_work_chains(filters):
+            pk = row["pk"]
+            self._rows[pk] = row
+            found.add(pk)
+            if row["process_state"] in TERMINAL_PROCESS_STATES:
+                self._active_pks.discard(pk)
             else:
-                yield make_dataclass("WorkChain", self.BASE_FIELDS)(**process_info)
+                self._active_pks.add(pk)
+            self._last_pk = max(pk, self._last_pk or 0)
+            if self._last_mtime is None or row["mtime"] > self._last_mtime:
+                self._last_mtime = row["mtime"]
+
+        # Work chains that were deleted while they were running.
+        for pk in self._active_pks - found:
+            self._active_pks.discard(pk)
+            self._rows.pop(pk)
 
     @tl.default("busy")
     def _default_busy(self):
@@ -131,6 +275,9 @@ class WorkChainSelector(ipw.HBox):
         try:
             self.set_trait("busy", True)  # disables the widget
 
+            if not self._update_options():
+                return
+
             with self.hold_trait_notifications():
                 # We need to restore the original value, because it may be reset due to this issue:
                 # https://github.com/jupyter-widgets/ipywidgets/issues/2230
@@ -139,10 +286,7 @@ class WorkChainSelector(ipw.HBox):
 
                 self.work_chains_selector.options = [
                     ("New workflow...", self._NO_PROCESS)
-                ] + [
-                    (self.fmt_workchain.format(wc=wc), wc.pk)
-                    for wc in self.find_work_chains()
-                ]
+                ] + [self._options[pk] for pk in sorted(self._options, reverse=True)]
 
                 self.work_chains_selector.value = original_value
         finally:
@@ -166,7 +310,138 @@ class WorkChainSelector(ipw.HBox):
 
 
 class QeAppWorkChainSelector(WorkChainSelector):
-    # extra_fields = [("formula", str), ("relax_info", str), ("properties_info", str)]
+    extra_fields = [("formula", str), ("relax_info", str), ("properties_info", str)]
+    extra_projections = ["extras.structure", "extras.workchain"]
 
     def __init__(self, **kwargs):
         super().__init__(process_label="QeAppWorkChain", **kwargs)
+
+    def parse_extra_projections(self, projected: dict) -> dict:
+        workchain = projected["extras.workchain"] or {}
+        properties = [p for p in workchain.get("properties", []) if p != "relax"]
+        if workchain.get("relax_type", "none") != "none":
+            relax_info = "structure is relaxed"
+        else:
+            relax_info = "structure is not relaxed"
+        return {
+            "formula": projected["extras.structure"] or "",
+            "relax_info": relax_info,
+            "properties_info": ", ".join(properties),
+        }
+
+
+class AdaptiveProcessMonitor(ProcessMonitor):
+    """A process monitor polling less and less often while nothing changes.
+
+    The callbacks are run every ``timeout`` seconds after a change of the state
+    or of the modification time of the process. While neither changes, the
+    delay doubles up to ``max_timeout`` seconds. If a message broker is
+    configured, a state change of the process or of one of its descendants
+    wakes up the monitor at once, e.g. when a calculation of the workflow
+    starts running.
+    """
+
+    def __init__(self, max_timeout=10.0, **kwargs):
+        self.max_timeout = max_timeout
+        self._wake_up = threading.Event()
+        # The PKs of the monitored process and of its descendants.
+        self._senders = frozenset()
+        super().__init__(**kwargs)
+
+    def _on_state_changed(self, _communicator, _body, sender, subject, _correlation_id):
+        if sender in self._senders:
+            self._wake_up.set()
+
+    @staticmethod
+    def _get_senders(process):
+        return frozenset(
+            [process.pk, *(node.pk for node in process.called_descendants)]
+        )
+
+    def _subscribe(self):
+        """Subscribe to the state changes broadcasted by the processes, if possible."""
+        import kiwipy
+        from aiida.manage import get_manager
+
+        try:
+            communicator = get_manager().get_communicator()
+            identifier = communicator.add_broadcast_subscriber(
+                kiwipy.BroadcastFilter(
+                    self._on_state_changed, subject="state_changed.*"
+                )
+            )
+        except Exception:
+            # No message broker, rely on polling only.
+            return None
+        return communicator, identifier
+
+    def _wait(self, timeout):
+        """Wait for ``timeout`` seconds, return whether the monitor was stopped or woken up."""
+        # The stop event is set by ``ProcessMonitor`` when the process changes,
+        # it is checked every ``self.timeout`` seconds.
+        deadline = time.monotonic() + timeout
+        while not self._monitor_thread_stop.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            if self._wake_up.wait(min(remaining, self.timeout)):
+                self._wake_up.clear()
+                return True
+        return True
+
+    def _monitor_process(self, process_uuid):
+        assert process_uuid is not None
+        process = orm.load_node(process_uuid)
+
+        disabled_funcs = set()
+
+        def _run(funcs):
+            for func in funcs:
+                # skip all functions that had previously raised an exception
+                if func in disabled_funcs:
+                    continue
+
+                try:
+                    if len(inspect.signature(func).parameters) > 0:
+                        func(process_uuid)
+                    else:
+                        func()
+                except Exception:
+                    warnings.warn(
+                        f"WARNING: The callback function {func.__name__!r} was disabled due to an error:\n{traceback.format_exc()}",
+                        stacklevel=2,
+                    )
+                    disabled_funcs.add(func)
+
+        subscription = self._subscribe()
+        try:
+            delay = self.timeout
+            last_seen = None
+            while not process.is_sealed:
+                _run(self.callbacks)
+
+                seen = (process.process_state, process.mtime)
+                if seen != last_seen:
+                    delay = self.timeout
+                    # The process may have called new processes.
+                    self._senders = self._get_senders(process)
+                else:
+                    delay = min(2 * delay, self.max_timeout)
+                last_seen = seen
+
+                if self._wait(delay):
+                    if self._monitor_thread_stop.is_set():
+                        break  # thread was signaled to be stopped
+                    # woken up by a state change
+                    last_seen = None
+        finally:
+            if subscription is not None:
+                communicator, identifier = subscription
+                communicator.remove_broadcast_subscriber(identifier)
+
+        # Final update:
+        _run(self.callbacks)
+
+        # Run special 'on_sealed' callback functions in case that process is sealed.
+        if process.is_sealed:
+            _run(self.on_sealed)
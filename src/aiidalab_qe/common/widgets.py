@@ -5,9 +5,12 @@ Authors: AiiDAlab team
 
 import base64
 import hashlib
+import os
+import shlex
+from array import array
+from collections import deque
 from copy import deepcopy
 from queue import Queue
-from tempfile import NamedTemporaryFile
 from threading import Event, Lock, Thread
 from time import time
 
@@ -36,6 +39,13 @@ __all__ = [
 
 
 class RollingOutput(ipw.VBox):
+    """Show text in a scrollable box.
+
+    The text is split in pages of ``page_size`` lines, each page is a widget of
+    its own. Thus, ``append`` only sends the new lines and the pages it changes
+    to the frontend, instead of the whole text.
+    """
+
     style = (
         "background-color: #253239; color: #cdd3df; line-height: normal; custom=test"
     )
@@ -43,14 +53,18 @@ class RollingOutput(ipw.VBox):
     value = traitlets.Unicode()
     auto_scroll = traitlets.Bool()
 
-    def __init__(self, num_min_lines=10, max_output_height="200px", **kwargs):
+    def __init__(
+        self, num_min_lines=10, max_output_height="200px", page_size=100, **kwargs
+    ):
         self._num_min_lines = num_min_lines
-        self._output = ipw.HTML(layout=ipw.Layout(min_width="50em"))
-        self._refresh_output()
+        self._page_size = page_size
+        self._pages = []
+        self._num_lines = 0
         super().__init__(
-            [self._output],
+            [],
             layout=ipw.Layout(max_height=max_output_height, min_width="51em"),
         )
+        self._refresh_output()
 
     @traitlets.default("value")
     def _default_value(self):
@@ -80,22 +94,71 @@ class RollingOutput(ipw.VBox):
 
     @traitlets.observe("value")
     def _refresh_output(self, _=None):
-        self._output.value = self._format_output(self.value)
+        self.clear()
+        self.append(self.value.splitlines())
+
+    def clear(self):
+        for _, page in self._pages:
+            page.close()
+        self._pages = []
+        self._num_lines = 0
+        self.children = []
+
+    def append(self, lines, max_lines=None):
+        """Append ``lines``, only the last ``max_lines`` lines are kept if given."""
+        if not lines and self._pages:
+            return
+        pages = self._pages
+        # Only the last page and the new ones change, or all of them as long as
+        # they are padded to the minimum number of lines.
+        first_changed = 0
+        if self._num_lines >= self._num_min_lines:
+            first_changed = max(len(pages) - 1, 0)
+        num_pages = len(pages)
+        dropped = False
+        for line in lines:
+            if not pages or len(pages[-1][0]) >= self._page_size:
+                pages.append(([], ipw.HTML(layout=ipw.Layout(min_width="50em"))))
+            pages[-1][0].append(line)
+        if not pages:
+            pages.append(([], ipw.HTML(layout=ipw.Layout(min_width="50em"))))
+        self._num_lines += len(lines)
+
+        first_trimmed = False
+        if max_lines is not None and self._num_lines > max_lines:
+            # Drop the oldest pages, then the oldest lines of the first page.
+            while self._num_lines - len(pages[0][0]) >= max_lines:
+                page_lines, page = pages.pop(0)
+                page.close()
+                self._num_lines -= len(page_lines)
+                first_changed = max(first_changed - 1, 0)
+                dropped = True
+            if self._num_lines > max_lines:
+                del pages[0][0][: self._num_lines - max_lines]
+                self._num_lines = max_lines
+                first_trimmed = True
+
+        changed = pages[first_changed:]
+        if first_trimmed and first_changed > 0:
+            changed.insert(0, pages[0])
+        for page_lines, page in changed:
+            page.value = self._format_output(page_lines, last=page is pages[-1][1])
+        if dropped or num_pages != len(pages):
+            self.children = [page for _, page in pages]
         if self.auto_scroll:
             self.scroll_to_bottom()
 
-    def _format_output(self, text):
-        lines = text.splitlines()
-
-        # Add empty lines to reach the minimum number of lines.
-        lines += [""] * max(0, self._num_min_lines - len(lines))
+    def _format_output(self, lines, last=True):
+        if last:
+            # Add empty lines to reach the minimum number of lines.
+            lines = lines + [""] * max(0, self._num_min_lines - self._num_lines)
 
         # Replace empty lines with single white space to ensure that they are
         # actually shown.
         lines = [line if len(line) > 0 else " " for line in lines]
 
         text = "\n".join(lines)
-        return f"""<pre style="{self.style}">{text}</pre>"""
+        return f"""<pre style="{self.style}; margin: 0">{text}</pre>"""
 
 
 class DownloadButton(ipw.Button):
@@ -105,7 +168,9 @@ class DownloadButton(ipw.Button):
     filename = traitlets.Unicode()
     payload = traitlets.Bytes()
 
-    def __init__(self, **kwargs):
+    def __init__(self, get_payload=None, **kwargs):
+        # If given, called on click to get the payload instead of ``payload``.
+        self.get_payload = get_payload
         super().__init__(**kwargs)
         self.on_click(self.__on_click)
 
@@ -118,8 +183,9 @@ class DownloadButton(ipw.Button):
         return "Download"
 
     def __on_click(self, _):
-        digest = hashlib.md5(self.payload).hexdigest()  # bypass browser cache
-        payload = base64.b64encode(self.payload).decode()
+        payload = self.payload if self.get_payload is None else self.get_payload()
+        digest = hashlib.md5(payload).hexdigest()  # bypass browser cache
+        payload = base64.b64encode(payload).decode()
 
         id = f"dl_{digest}"
 
@@ -170,17 +236,25 @@ class FilenameDisplayWidget(ipw.Box):
 
 
 class LogOutputWidget(ipw.VBox):
+    """Show the last lines of a log.
+
+    Only the last ``max_lines`` lines passed to ``append`` are kept, and each
+    call of ``append`` only sends the new lines to the frontend. ``value`` is
+    not synced with the frontend. The download button downloads ``value``, or
+    the bytes returned by ``get_payload`` if given, e.g. to download the whole
+    log.
+    """
+
     filename = traitlets.Unicode()
     value = traitlets.Unicode()
 
-    def __init__(self, placeholder=None, **kwargs):
+    def __init__(self, placeholder=None, max_lines=1000, get_payload=None, **kwargs):
         self.placeholder = placeholder
+        self.max_lines = max_lines
+        self._lines = deque(maxlen=max_lines)
 
-        self._rolling_output = RollingOutput(layout=ipw.Layout(flex="1 1 auto"))
-        ipw.dlink(
-            (self, "value"),
-            (self._rolling_output, "value"),
-            lambda value: value or self.placeholder or "",
+        self._rolling_output = RollingOutput(
+            layout=ipw.Layout(flex="1 1 auto"), value=self.placeholder or ""
         )
 
         self._filename_display = FilenameDisplayWidget(
@@ -192,16 +266,14 @@ class LogOutputWidget(ipw.VBox):
             lambda value: value or "[no filename]",
         )
 
+        # The payload is only computed on click, instead of being synced with
+        # the frontend on every change of the value.
         self._btn_download = DownloadButton(
+            get_payload=get_payload or (lambda: self.value.encode("utf-8")),
             layout=ipw.Layout(width="30px", flex="5 1 auto"),
             disabled=True,
         )
         ipw.dlink((self, "filename"), (self._btn_download, "filename"))
-        ipw.dlink(
-            (self, "value"),
-            (self._btn_download, "payload"),
-            transform=lambda value: value.encode("utf-8"),
-        )
 
         self._btn_scroll_down = ipw.Button(
             icon="angle-double-down",
@@ -244,16 +316,54 @@ class LogOutputWidget(ipw.VBox):
     def _observe_value(self, change):
         self._btn_download.disabled = not change["new"]
         self._btn_scroll_down.disabled = not change["new"]
+        if change["new"] != "\n".join(self._lines):
+            # The value was set directly, show it all again.
+            self._lines.clear()
+            self._lines.extend(change["new"].splitlines())
+            self._rolling_output.value = change["new"] or self.placeholder or ""
+
+    def append(self, lines):
+        """Append ``lines`` to the log, only the last ``max_lines`` lines are shown."""
+        if lines:
+            if not self._lines:
+                # Remove the placeholder.
+                self._rolling_output.clear()
+            self._lines.extend(lines)
+            self._rolling_output.append(lines, self.max_lines)
+            self.value = "\n".join(self._lines)
+
+    def clear(self):
+        self._lines.clear()
+        self.value = ""
+        self._rolling_output.clear()
+        self._rolling_output.append((self.placeholder or "").splitlines())
 
 
 class CalcJobOutputFollower(traitlets.HasTraits):
+    """Follow the output file of a calculation.
+
+    ``lineno`` is the number of lines read so far, while ``output`` only keeps
+    the last ``max_lines`` of them (all of them if ``max_lines`` is None). The
+    byte offset of every line in the file is indexed, so that older lines are
+    read again from the file by ``get_lines`` when needed.
+
+    The output is fetched every ``delay`` seconds while it grows. While it
+    does not change, the delay between two fetches doubles up to ``max_delay``
+    seconds.
+    """
+
     calcjob_uuid = traitlets.Unicode(allow_none=True)
     filename = traitlets.Unicode(allow_none=True)
     output = traitlets.List(trait=traitlets.Unicode)
     lineno = traitlets.Int()
 
-    def __init__(self, **kwargs):
+    def __init__(self, max_lines=10000, delay=0.2, max_delay=5.0, **kwargs):
+        self.max_lines = max_lines
+        self.delay = delay
+        self.max_delay = max_delay
         self._output_queue = Queue()
+        # The byte offset of the start of each line in the output file.
+        self._line_offsets = array("Q")
 
         self._lock = Lock()
         self._push_thread = None
@@ -276,10 +386,14 @@ class CalcJobOutputFollower(traitlets.HasTraits):
             if self._follow_output_thread:
                 self._follow_output_thread.join()
                 self._follow_output_thread = None
+                # The signal must not be cleared before the threads stopped.
+                self._push_thread.join()
+                self._pull_thread.join()
 
             # Reset all traitlets and signals.
             self.output.clear()
             self.lineno = 0
+            self._line_offsets = array("Q")
             self._stop_follow_output.clear()
 
             # (Re/)start following
@@ -296,47 +410,126 @@ class CalcJobOutputFollower(traitlets.HasTraits):
         self._push_thread = Thread(target=self._push_output, args=(calcjob_uuid,))
         self._push_thread.start()
 
-    def _fetch_output(self, calcjob):
+    @property
+    def first_lineno(self):
+        """The index of the first line kept in ``output``."""
+        return self.lineno - len(self.output)
+
+    def get_lines(self, start=0, stop=None):
+        """Return the lines ``start`` to ``stop`` of the output.
+
+        The lines that are not kept in ``output`` anymore are read again from
+        the output file, without the messages of the reads that failed.
+        """
+        stop = self.lineno if stop is None else min(stop, self.lineno)
+        first_lineno = self.first_lineno
+        if start >= stop:
+            return []
+        if start >= first_lineno:
+            return self.output[start - first_lineno : stop - first_lineno]
+
+        line_offsets = self._line_offsets
+        calcjob = load_node(self.calcjob_uuid)
+        offset = line_offsets[start]
+        size = line_offsets[stop] - offset if stop < len(line_offsets) else None
+        if "retrieved" not in calcjob.outputs and "remote_folder" in calcjob.outputs:
+            with calcjob.get_transport() as transport:
+                data = self._fetch_output(calcjob, offset, transport, size=size)
+        else:
+            data = self._fetch_output(calcjob, offset, size=size)
+        if size is not None:
+            # The range ends with the line break before the line ``stop``.
+            data = data.removesuffix(b"\n")
+        return [self._decode(line) for line in data.split(b"\n")[: stop - start]]
+
+    def _fetch_output(self, calcjob, offset=0, transport=None, size=None):
+        """Return the bytes of the output file of ``calcjob`` from ``offset`` on.
+
+        At most ``size`` bytes are returned if given. While the calculation is
+        running, the end of the remote file is read with ``tail`` through the
+        open ``transport``, so only the requested bytes are transferred.
+        """
         assert isinstance(calcjob, CalcJobNode)
         if "retrieved" in calcjob.outputs:
             try:
                 self.filename = calcjob.base.attributes.get("output_filename")
-                with calcjob.outputs.retrieved.base.repository.open(self.filename) as f:
-                    return f.read().splitlines()
+                with calcjob.outputs.retrieved.base.repository.open(
+                    self.filename, "rb"
+                ) as f:
+                    f.seek(offset)
+                    return f.read(-1 if size is None else size)
             except OSError:
-                return list()
-
-        elif "remote_folder" in calcjob.outputs:
-            try:
-                fn_out = calcjob.base.attributes.get("output_filename")
-                self.filename = fn_out
-                with NamedTemporaryFile() as tmpfile:
-                    calcjob.outputs.remote_folder.getfile(fn_out, tmpfile.name)
-                    return tmpfile.read().decode().splitlines()
-            except OSError:
-                return list()
+                return b""
+
+        elif "remote_folder" in calcjob.outputs and transport is not None:
+            fn_out = calcjob.base.attributes.get("output_filename")
+            self.filename = fn_out
+            path = os.path.join(calcjob.outputs.remote_folder.get_remote_path(), fn_out)
+            command = f"tail -c +{offset + 1} {shlex.quote(path)}"
+            if size is not None:
+                command += f" | head -c {size}"
+            retval, stdout, _ = transport.exec_command_wait_bytes(command)
+            # The file does not exist yet if the command failed.
+            return stdout if retval == 0 else b""
         else:
-            return list()
+            return b""
 
     _EOF = None
 
-    def _push_output(self, calcjob_uuid, delay=0.2):
+    def _push_output(self, calcjob_uuid):
         """Push new log lines onto the queue."""
-        lineno = 0
+        offset = 0
+        wait = self.delay
+        # The last line, until it is complete.
+        partial_line = b""
+        line_offsets = self._line_offsets
+        transport = None
         calcjob = load_node(calcjob_uuid)
-        while True:
-            try:
-                lines = self._fetch_output(calcjob)
-            except Exception as error:
-                self._output_queue.put([f"[ERROR: {error}]"])
-            else:
-                self._output_queue.put(lines[lineno:])
-                lineno = len(lines)
-            finally:
-                if calcjob.is_sealed or self._stop_follow_output.wait(delay):
-                    # Pushing EOF signals to the pull thread to stop.
-                    self._output_queue.put(self._EOF)
-                    break  # noqa: B012
+        try:
+            while True:
+                try:
+                    if (
+                        transport is None
+                        and "retrieved" not in calcjob.outputs
+                        and "remote_folder" in calcjob.outputs
+                    ):
+                        # The transport stays open for all the following reads.
+                        transport = calcjob.get_transport()
+                        transport.open()
+                    data = self._fetch_output(calcjob, offset, transport)
+                except Exception as error:
+                    # The message is indexed at the start of the next line.
+                    line_offsets.append(offset - len(partial_line))
+                    self._output_queue.put([f"[ERROR: {error}]"])
+                    if transport is not None:
+                        # Open a new connection for the next attempt.
+                        if transport.is_open:
+                            transport.close()
+                        transport = None
+                else:
+                    wait = self.delay if data else min(2 * wait, self.max_delay)
+                    line_start = offset - len(partial_line)
+                    *lines, partial_line = (partial_line + data).split(b"\n")
+                    for line in lines:
+                        line_offsets.append(line_start)
+                        line_start += len(line) + 1
+                    offset += len(data)
+                    self._output_queue.put([self._decode(line) for line in lines])
+                finally:
+                    if calcjob.is_sealed or self._stop_follow_output.wait(wait):
+                        if partial_line:
+                            line_offsets.append(offset - len(partial_line))
+                            self._output_queue.put([self._decode(partial_line)])
+                        # Pushing EOF signals to the pull thread to stop.
+                        self._output_queue.put(self._EOF)
+                        break  # noqa: B012
+        finally:
+            if transport is not None and transport.is_open:
+                transport.close()
+
+    @staticmethod
+    def _decode(line):
+        return line.decode(errors="replace").rstrip("\r")
 
     def _pull_output(self):
         """Pull new log lines from the queue and update traitlets."""
@@ -348,6 +541,9 @@ class CalcJobOutputFollower(traitlets.HasTraits):
             else:  # item is 'new lines'
                 with self.hold_trait_notifications():
                     self.output.extend(item)
+                    if self.max_lines is not None and len(self.output) > self.max_lines:
+                        # Drop the oldest lines, they are read again on demand.
+                        del self.output[: len(self.output) - self.max_lines]
                     self.lineno += len(item)
                 self._output_queue.task_done()
 
@@ -1,7 +1,6 @@
 # from aiidalab_qe.bands.result import Result
 from aiidalab_qe.common.panel import OutlinePanel
 
-from .result import Result
 from .setting import Setting
 from .workchain import workchain_and_builder
 
@@ -18,6 +17,6 @@ SeeK-path tool</a>.
 bands = {
     "outline": BandsOutline,
     "setting": Setting,
-    "result": Result,
+    "result": "aiidalab_qe.plugins.bands.result:Result",
     "workchain": workchain_and_builder,
 }
@@ -13,6 +13,9 @@ class Result(ResultPanel):
     def __init__(self, node=None, **kwargs):
         super().__init__(node=node, **kwargs)
 
+    def _load_data(self, node):
+        return BandPdosWidget.load_data(bands=getattr(node.outputs, "bands", None))
+
     def _update_view(self):
         # Check if the workchain has the outputs
         try:
@@ -20,7 +23,7 @@ class Result(ResultPanel):
         except AttributeError:
             bands_node = None
 
-        _bands_plot_view = BandPdosWidget(bands=bands_node)
+        _bands_plot_view = BandPdosWidget(bands=bands_node, **self.data)
         self.children = [
             _bands_plot_view,
         ]
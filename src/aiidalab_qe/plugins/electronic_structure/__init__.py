@@ -1,5 +1,3 @@
-from .result import Result
-
 electronic_structure = {
-    "result": Result,
+    "result": "aiidalab_qe.plugins.electronic_structure.result:Result",
 }
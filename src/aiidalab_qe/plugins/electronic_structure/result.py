@@ -11,6 +11,12 @@ class Result(ResultPanel):
     def __init__(self, node=None, **kwargs):
         super().__init__(node=node, **kwargs)
 
+    def _load_data(self, node):
+        return BandPdosWidget.load_data(
+            bands=getattr(node.outputs, "bands", None),
+            pdos=getattr(node.outputs, "pdos", None),
+        )
+
     def _update_view(self):
         """Update the view of the widget."""
         #
@@ -23,6 +29,8 @@ class Result(ResultPanel):
             bands_node = self.node.outputs.bands
         except AttributeError:
             bands_node = None
-        _bands_dos_widget = BandPdosWidget(bands=bands_node, pdos=pdos_node)
+        _bands_dos_widget = BandPdosWidget(
+            bands=bands_node, pdos=pdos_node, **self.data
+        )
         # update the electronic structure tab
         self.children = [_bands_dos_widget]
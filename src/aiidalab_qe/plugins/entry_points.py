@@ -0,0 +1,143 @@
+"""Process-wide registry of the plugin entry points of the app.
+
+The installed entry points are scanned once per group, each plugin is only
+loaded the first time one of its items is requested, and an item given as an
+import path, e.g. ``"aiidalab_qe.plugins.bands.result:Result"``, is only
+imported the first time this item is requested. Thus, the heavy modules of a
+plugin (e.g. its result panel) are not imported when the app starts.
+
+The registry is kept for the lifetime of the process, a plugin installed or
+fixed afterwards is only available once the app is restarted.
+
+This module does not depend on the app, so that it can be used by the
+workflows as well.
+"""
+
+from importlib import import_module
+from importlib.metadata import entry_points
+from threading import RLock
+
+from aiidalab_qe.profiling import phase
+
+# Marks the plugins that failed to load.
+_FAILED = object()
+
+
+def print_error(entry_point, e):
+    print(f"\033[91mFailed to load plugin entry point {entry_point.name}.\033[0m")
+    print(
+        "\033[93mThis may be due to compatibility issues with the current QEApp version.\033[0m"
+    )
+    print("\033[93mPlease contact the plugin author for further assistance.\033[0m")
+    print(
+        "\033[93mThus, the plugin will not be available. However, you can still use the rest of the app.\033[0m"
+    )
+    print(f"\033[91mError message: {e}\033[0m\n")
+
+
+def _import_object(path):
+    """Import the object of ``path``, given as ``"module:attribute"``."""
+    module_name, _, attribute = path.partition(":")
+    obj = import_module(module_name)
+    for name in attribute.split(".") if attribute else []:
+        obj = getattr(obj, name)
+    return obj
+
+
+class EntryPointRegistry:
+    """Cache the entry points, the loaded plugins and their imported items."""
+
+    def __init__(self):
+        self._lock = RLock()
+        self._entry_points = {}
+        self._entries = {}
+        self._items = {}
+
+    def clear(self):
+        """Forget the scanned entry points, the loaded plugins and their items."""
+        with self._lock:
+            self._entry_points.clear()
+            self._entries.clear()
+            self._items.clear()
+
+    def get_entry_points(self, group):
+        """Return the entry points of ``group``, without loading them."""
+        with self._lock:
+            if group not in self._entry_points:
+                self._entry_points[group] = {
+                    entry_point.name: entry_point
+                    for entry_point in entry_points().get(group, [])
+                }
+            return self._entry_points[group]
+
+    def get_names(self, group):
+        """Return the names of the entry points of ``group``."""
+        return list(self.get_entry_points(group))
+
+    def get_entry(self, group, name):
+        """Return the loaded entry point ``name`` of ``group``, or None if it failed."""
+        with self._lock:
+            key = (group, name)
+            if key not in self._entries:
+                entry_point = self.get_entry_points(group)[name]
+                try:
+                    # Attempt to load the entry point
+                    with phase(f"load plugin {name!r}"):
+                        self._entries[key] = entry_point.load()
+                except Exception as e:
+                    print_error(entry_point, e)
+                    self._entries[key] = _FAILED
+            entry = self._entries[key]
+            return None if entry is _FAILED else entry
+
+    def get_entries(self, group):
+        """Return all the loaded entry points of ``group`` by name."""
+        entries = {}
+        for name in self.get_entry_points(group):
+            entry = self.get_entry(group, name)
+            if entry is not None:
+                entries[name] = entry
+        return entries
+
+    def get_entry_item(self, group, name, item_name):
+        """Return the item ``item_name`` of the plugin ``name``, or None.
+
+        An item given as an import path is imported the first time.
+        """
+        entry = self.get_entry(group, name)
+        if entry is None or not entry.get(item_name, False):
+            return None
+        item = entry[item_name]
+        if not isinstance(item, str):
+            return item
+        with self._lock:
+            key = (group, name, item_name)
+            if key not in self._items:
+                try:
+                    with phase(f"import {item_name!r} of plugin {name!r}"):
+                        self._items[key] = _import_object(item)
+                except Exception as e:
+                    print_error(self.get_entry_points(group)[name], e)
+                    self._items[key] = _FAILED
+            item = self._items[key]
+            return None if item is _FAILED else item
+
+    def get_entry_items(self, group, item_name):
+        """Return the item ``item_name`` of all the plugins of ``group`` that have it."""
+        items = {}
+        for name in self.get_entry_points(group):
+            item = self.get_entry_item(group, name, item_name)
+            if item is not None:
+                items[name] = item
+        return items
+
+
+registry = EntryPointRegistry()
+
+
+def get_entries(entry_point_name="aiidalab_qe.properties"):
+    return registry.get_entries(entry_point_name)
+
+
+def get_entry_items(entry_point_name, item_name="outline"):
+    return registry.get_entry_items(entry_point_name, item_name)
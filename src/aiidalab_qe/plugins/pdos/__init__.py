@@ -1,7 +1,6 @@
 from aiidalab_qe.common.panel import OutlinePanel
 from aiidalab_qe.common.widgets import QEAppComputationalResourcesWidget
 
-from .result import Result
 from .setting import Setting
 from .workchain import workchain_and_builder
 
@@ -26,6 +25,6 @@ pdos = {
     "outline": PdosOutline,
     "code": {"dos": dos_code, "projwfc": projwfc_code},
     "setting": Setting,
-    "result": Result,
+    "result": "aiidalab_qe.plugins.pdos.result:Result",
     "workchain": workchain_and_builder,
 }
@@ -11,6 +11,9 @@ class Result(ResultPanel):
     def __init__(self, node=None, **kwargs):
         super().__init__(node=node, **kwargs)
 
+    def _load_data(self, node):
+        return BandPdosWidget.load_data(pdos=getattr(node.outputs, "pdos", None))
+
     def _update_view(self):
         """Update the view of the widget."""
 
@@ -19,7 +22,7 @@ class Result(ResultPanel):
         except AttributeError:
             pdos_node = None
 
-        _pdos_plot_view = BandPdosWidget(pdos=pdos_node)
+        _pdos_plot_view = BandPdosWidget(pdos=pdos_node, **self.data)
 
         # update the electronic structure tab
         self.children = [_pdos_plot_view]
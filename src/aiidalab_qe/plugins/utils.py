@@ -14,3 +14,38 @@ def set_component_resources(component, code_info):
         ]
         if "parallelization" in code_info:
             component.parallelization = orm.Dict(dict=code_info["parallelization"])
+
+
+def get_nodes_by_label(labels, node_class=orm.Data, group=None):
+    """Return the nodes with the given labels as a ``{label: node}`` dictionary.
+
+    All the nodes are fetched with a single query, restricted to the members
+    of ``group`` if given. If several nodes have the same label, the oldest
+    one is returned. Labels without a node are missing from the dictionary.
+    """
+    labels = list(set(labels))
+    if not labels:
+        return {}
+    qb = orm.QueryBuilder()
+    if group is not None:
+        qb.append(orm.Group, filters={"id": group.pk}, tag="group")
+        qb.append(
+            node_class,
+            with_group="group",
+            filters={"label": {"in": labels}},
+            tag="node",
+        )
+    else:
+        qb.append(node_class, filters={"label": {"in": labels}}, tag="node")
+    # The newest nodes come first, so that the oldest ones are kept.
+    qb.order_by({"node": {"id": "desc"}})
+    return {node.label: node for node in qb.all(flat=True)}
+
+
+def store_nodes(nodes):
+    """Store the ``nodes`` in a single database transaction."""
+    from aiida.manage import get_manager
+
+    with get_manager().get_profile_storage().transaction():
+        for node in nodes:
+            node.store()
@@ -1,22 +1,47 @@
-from importlib import resources
+from threading import Thread
 
-import yaml
+import ipywidgets as ipw
 from aiidalab_qe.common.widgets import QEAppComputationalResourcesWidget
 
 from aiidalab_qe.common.panel import OutlinePanel
-from aiidalab_qe.plugins import xas as xas_folder
 
-from .result import Result
 from .setting import Setting
+from .setup_pseudos import PSEUDO_TOC, install  # noqa: F401
 from .workchain import workchain_and_builder
 
-PSEUDO_TOC = yaml.safe_load(resources.read_text(xas_folder, "pseudo_toc.yaml"))
-
 
 class XasOutline(OutlinePanel):
     title = "X-ray absorption spectroscopy (XAS)"
     help = """"""
 
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._install_thread = None
+        self.pseudo_install_status = ipw.HTML()
+        self.children += (self.pseudo_install_status,)
+        self.run.observe(self._observe_run, "value")
+
+    def _observe_run(self, change):
+        # The core-hole pseudopotentials are only provisioned once the property
+        # is selected.
+        if change["new"] and self._install_thread is None:
+            self._install_thread = Thread(target=self._install_pseudos)
+            self._install_thread.start()
+
+    def _install_pseudos(self):
+        try:
+            for msg in install():
+                self.pseudo_install_status.value = f"Core-hole pseudopotentials: {msg}"
+        except Exception as error:
+            self.pseudo_install_status.value = (
+                f"<span style='color: red'>Failed to install the core-hole "
+                f"pseudopotentials: {error}</span>"
+            )
+            # Try again the next time the property is selected.
+            self._install_thread = None
+        else:
+            self.pseudo_install_status.value = ""
+
 
 xs_code = QEAppComputationalResourcesWidget(
     description="xspectra.x", default_calc_job_plugin="quantumespresso.xspectra"
@@ -26,6 +51,6 @@ xas = {
     "outline": XasOutline,
     "code": {"xspectra": xs_code},
     "setting": Setting,
-    "result": Result,
+    "result": "aiidalab_qe.plugins.xas.result:Result",
     "workchain": workchain_and_builder,
 }
@@ -9,8 +9,12 @@ import numpy as np
 from IPython.display import HTML, display
 from scipy.interpolate import make_interp_spline
 
+from aiidalab_qe.common.cache import BROADENING_CACHE, round_to_step
 from aiidalab_qe.common.panel import ResultPanel
 
+# Maximum number of elements of the difference matrices used in ``broaden_xas``
+_BROADENING_CHUNK_ELEMENTS = 2**22
+
 
 class SpectrumDownloadButton(ipw.Button):
     """Download button with dynamic content
@@ -92,13 +96,27 @@ def export_xas_data(outputs):
         return None
 
 
+def _variable_gamma(x_vals, gamma_hole, gamma_max, center_energy):
+    """Return the energy-dependent broadening parameter at each energy of ``x_vals``.
+
+    Uses the arctangent functional form defined in Calandra and Bunau, PRB, 87, 205105 (2013),
+    bounded between ``gamma_hole`` (for negative energies) and ``gamma_hole + gamma_max``.
+    """
+    e = np.maximum(x_vals, 0) / center_energy
+    with np.errstate(divide="ignore"):
+        gamma_var = gamma_hole + gamma_max * (0.5 + np.arctan((e - 1) / (e**2)) / np.pi)
+    return np.where(x_vals > 0, gamma_var, gamma_hole)
+
+
 def broaden_xas(
     input_array, variable=False, gamma_hole=0.01, gamma_max=5, center_energy=15
 ):
     """Take an input spectrum and return a broadened spectrum as output using either a constant or variable parameter.
 
     :param input_array: The 2D array of x/y values to be broadened. Should be plotted with
-                        little or no broadening before using the function.
+                        little or no broadening before using the function. Several spectra with
+                        the same number of points can be broadened at once by passing an array of
+                        shape (number of spectra, number of points, 2).
     :param gamma_hole: The broadening parameter for the Lorenzian broadening function. In constant mode (variable=False),
                        this value is applied to the entire spectrum. In variable mode (variable=True), this value defines
                        the starting broadening parameter of the arctangent function. Refers to the natural linewidth of
@@ -126,43 +144,35 @@ def broaden_xas(
                 f"The following variables were not defined {missing} and are required for variable-energy broadening"
             )
 
-    x_vals = input_array[:, 0]
-    y_vals = input_array[:, 1]
-
-    lorenz_y = np.zeros(len(x_vals))
+    x_vals = input_array[..., 0]
+    y_vals = input_array[..., 1]
 
     if variable:
-        for x, y in zip(x_vals, y_vals):
-            if x < 0:  # the function is bounded between gamma_hole and gamma_max
-                gamma_var = gamma_hole
-            else:
-                e = x / center_energy
-
-                gamma_var = gamma_hole + gamma_max * (
-                    0.5 + np.arctan((e - 1) / (e**2)) / np.pi
-                )
-
-            if y <= 1.0e-6:  # do this to skip the calculation for very small values
-                lorenz_y = y
-            else:
-                lorenz_y += (
-                    gamma_var
-                    / 2.0
-                    / np.pi
-                    / ((x_vals - x) ** 2 + 0.25 * gamma_var**2)
-                    * y
-                )
+        gamma = _variable_gamma(x_vals, gamma_hole, gamma_max, center_energy)
+        # skip the contribution of very small values
+        y_vals = np.where(y_vals <= 1.0e-6, 0.0, y_vals)
     else:
-        for x, y in zip(x_vals, y_vals):
-            lorenz_y += (
-                gamma_hole
-                / 2.0
-                / np.pi
-                / ((x_vals - x) ** 2 + 0.25 * gamma_hole**2)
-                * y
-            )
+        gamma = np.full_like(x_vals, gamma_hole, dtype=float)
+
+    # Each point of the spectrum contributes a Lorentzian centered on it. The
+    # contributions are summed for a chunk of target energies at a time, to
+    # bound the size of the (target, source) difference matrix.
+    weights = gamma / 2.0 / np.pi * y_vals
+    half_gamma_sq = 0.25 * gamma**2
+    lorenz_y = np.empty(x_vals.shape)
+    n_spectra = int(np.prod(x_vals.shape[:-1]))
+    chunk_size = max(_BROADENING_CHUNK_ELEMENTS // (n_spectra * x_vals.shape[-1]), 1)
+    for start in range(0, x_vals.shape[-1], chunk_size):
+        target = x_vals[..., start : start + chunk_size, np.newaxis]
+        kernel = 1.0 / (
+            (target - x_vals[..., np.newaxis, :]) ** 2
+            + half_gamma_sq[..., np.newaxis, :]
+        )
+        lorenz_y[..., start : start + chunk_size] = np.einsum(
+            "...ij,...j->...i", kernel, weights
+        )
 
-    return np.column_stack((x_vals, lorenz_y))
+    return np.stack((x_vals, lorenz_y), axis=-1)
 
 
 def get_aligned_spectra(core_wc_dict, equivalent_sites_dict):
@@ -244,6 +254,45 @@ class Result(ResultPanel):
     def __init__(self, node=None, **kwargs):
         super().__init__(node=node, identifier="xas", **kwargs)
 
+    def _load_data(self, node):
+        """Return the final spectrum and the aligned site spectra of each element."""
+        final_spectra, equivalent_sites_data = export_xas_data(node.outputs)
+        xas_wc = [
+            n for n in node.called if n.process_label == "XspectraCrystalWorkChain"
+        ][0]
+        core_wcs = {
+            n.get_metadata_inputs()["metadata"]["call_link_label"]: n
+            for n in xas_wc.called
+            if n.process_label == "XspectraCoreWorkChain"
+        }
+        core_wc_dict = {
+            key.replace("_xspectra", ""): value for key, value in core_wcs.items()
+        }
+
+        spectra = {}
+        for label, final_spectrum_node in final_spectra.items():
+            element = label.split("_")[0]
+            element_sites = [
+                key
+                for key in equivalent_sites_data
+                if equivalent_sites_data[key]["symbol"] == element
+            ]
+            element_core_wcs = {
+                key: value
+                for key, value in core_wc_dict.items()
+                if key in element_sites
+            }
+            spectra[element] = {
+                "final_spectrum": np.column_stack(
+                    (final_spectrum_node.get_x()[1], final_spectrum_node.get_y()[0][1])
+                ),
+                "site_spectra": get_aligned_spectra(
+                    core_wc_dict=element_core_wcs,
+                    equivalent_sites_dict=equivalent_sites_data,
+                ),
+            }
+        return {"spectra": spectra}
+
     def _update_view(self):
         import plotly.graph_objects as go
 
@@ -275,20 +324,8 @@ class Result(ResultPanel):
             <div style="line-height: 140%; padding-top: 0px; padding-bottom: 0px; opacity:0.5;"><b>
             Select spectrum to plot</b></div>"""
         )
-        final_spectra, equivalent_sites_data = export_xas_data(self.outputs)
-        xas_wc = [
-            n for n in self.node.called if n.process_label == "XspectraCrystalWorkChain"
-        ][0]
-        core_wcs = {
-            n.get_metadata_inputs()["metadata"]["call_link_label"]: n
-            for n in xas_wc.called
-            if n.process_label == "XspectraCoreWorkChain"
-        }
-        core_wc_dict = {
-            key.replace("_xspectra", ""): value for key, value in core_wcs.items()
-        }
-
-        spectrum_select_options = [key.split("_")[0] for key in final_spectra.keys()]
+        spectra_data = self.data["spectra"]
+        spectrum_select_options = list(spectra_data)
 
         spectrum_select = ipw.Dropdown(
             description="",
@@ -358,32 +395,15 @@ class Result(ResultPanel):
         g.layout.xaxis.title = "Relative Photon Energy (eV)"
 
         chosen_spectrum = spectrum_select.value
-        chosen_spectrum_label = f"{chosen_spectrum}_xas"
-        spectra = final_spectra[chosen_spectrum_label]
-
-        raw_spectrum = np.column_stack((spectra.get_x()[1], spectra.get_y()[0][1]))
+        raw_spectrum = spectra_data[chosen_spectrum]["final_spectrum"]
 
         x = raw_spectrum[:, 0]
         y = raw_spectrum[:, 1]
         spline = make_interp_spline(x, y)
         norm_y = spline(x) / np.trapz(spline(x), x)
-        element = chosen_spectrum_label.split("_")[0]
-        element_sites = [
-            key
-            for key in equivalent_sites_data
-            if equivalent_sites_data[key]["symbol"] == element
-        ]
-        element_core_wcs = {}
-        total_multiplicity = 0
-        for site in element_sites:
-            site_multiplicity = equivalent_sites_data[site]["multiplicity"]
-            total_multiplicity += site_multiplicity
-            element_core_wcs[site] = core_wc_dict[site]
-
-        g.add_scatter(x=x, y=norm_y, name=f"{element} K-edge")
-        for entry in get_aligned_spectra(
-            core_wc_dict=element_core_wcs, equivalent_sites_dict=equivalent_sites_data
-        ):
+
+        g.add_scatter(x=x, y=norm_y, name=f"{chosen_spectrum} K-edge")
+        for entry in spectra_data[chosen_spectrum]["site_spectra"]:
             g.add_scatter(
                 x=entry[-1][:, 0],
                 y=entry[-1][:, 1],
@@ -394,24 +414,10 @@ class Result(ResultPanel):
             download_data.contents = lambda: write_csv(dataset)
             download_data.filename = f"{element}_XAS_Spectra.csv"
 
-        def response(change):
-            chosen_spectrum = spectrum_select.value
-            chosen_spectrum_label = f"{chosen_spectrum}_xas"
-            element_sites = [
-                key
-                for key in equivalent_sites_data
-                if equivalent_sites_data[key]["symbol"] == chosen_spectrum
-            ]
-            element_core_wcs = {
-                key: value
-                for key, value in core_wc_dict.items()
-                if key in element_sites
-            }
+        def get_datasets(chosen_spectrum, broadening_parameters):
+            """Return the broadened total and site spectra of an element."""
             spectra = []
-            final_spectrum_node = final_spectra[chosen_spectrum_label]
-            final_spectrum = np.column_stack(
-                (final_spectrum_node.get_x()[1], final_spectrum_node.get_y()[0][1])
-            )
+            final_spectrum = spectra_data[chosen_spectrum]["final_spectrum"]
             final_x_vals = final_spectrum[:, 0]
             final_y_vals = final_spectrum[:, 1]
             final_spectrum_spline = make_interp_spline(final_x_vals, final_y_vals)
@@ -427,39 +433,29 @@ class Result(ResultPanel):
                 )
             )
             datasets = []
-            for entry in get_aligned_spectra(
-                core_wc_dict=element_core_wcs,
-                equivalent_sites_dict=equivalent_sites_data,
-            ):
-                spectra.append(entry)
+            spectra.extend(spectra_data[chosen_spectrum]["site_spectra"])
+
+            raw_spectra = [entry[-1] for entry in spectra]
+            if broadening_parameters["gamma_hole"] == 0.0:
+                broad_spectra = raw_spectra
+            else:
+                # Broaden all the spectra at once if they have the same number of points
+                if len({spectrum.shape for spectrum in raw_spectra}) == 1:
+                    broad_spectra = broaden_xas(
+                        np.stack(raw_spectra), **broadening_parameters
+                    )
+                else:
+                    broad_spectra = [
+                        broaden_xas(spectrum, **broadening_parameters)
+                        for spectrum in raw_spectra
+                    ]
 
-            for entry in spectra:
+            for entry, broad_spectrum in zip(spectra, broad_spectra):
                 label = entry[0]
                 weighting = entry[1]
                 weighting_string = entry[2]
-                raw_spectrum = entry[-1]
-                x = raw_spectrum[:, 0]
-                y = raw_spectrum[:, 1]
-                if not variable_broad_select:
-                    gamma_max_select.disabled = True
-                    center_e_select.disabled = True
-                else:
-                    gamma_max_select.disabled = False
-                    center_e_select.disabled = False
-
-                if gamma_hole_select.value == 0.0:
-                    x = raw_spectrum[:, 0]
-                    y = raw_spectrum[:, 1]
-                else:
-                    broad_spectrum = broaden_xas(
-                        raw_spectrum,
-                        gamma_hole=gamma_hole_select.value,
-                        gamma_max=gamma_max_select.value,
-                        center_energy=center_e_select.value,
-                        variable=variable_broad_select.value,
-                    )
-                    x = broad_spectrum[:, 0]
-                    y = broad_spectrum[:, 1]
+                x = broad_spectrum[:, 0]
+                y = broad_spectrum[:, 1]
 
                 final_spline = make_interp_spline(x, y)
                 final_y_vals = final_spline(final_x_vals)
@@ -472,6 +468,40 @@ class Result(ResultPanel):
                         "weighting_string": weighting_string,
                     }
                 )
+            return datasets
+
+        def response(change):
+            chosen_spectrum = spectrum_select.value
+            variable = variable_broad_select.value
+            gamma_max_select.disabled = not variable
+            center_e_select.disabled = not variable
+
+            # The values are rounded to the slider steps to be used as cache keys
+            broadening_parameters = {
+                "gamma_hole": round_to_step(
+                    gamma_hole_select.value, gamma_hole_select.step
+                ),
+                "gamma_max": None,
+                "center_energy": None,
+                "variable": variable,
+            }
+            if variable:
+                broadening_parameters["gamma_max"] = round_to_step(
+                    gamma_max_select.value, gamma_max_select.step
+                )
+                broadening_parameters["center_energy"] = round_to_step(
+                    center_e_select.value, center_e_select.step
+                )
+            key = (
+                "xas",
+                self.node.uuid,
+                chosen_spectrum,
+                tuple(broadening_parameters.items()),
+            )
+            datasets = BROADENING_CACHE.get(key)
+            if datasets is None:
+                datasets = get_datasets(chosen_spectrum, broadening_parameters)
+                BROADENING_CACHE.set(key, datasets)
             _update_download_selection(datasets, chosen_spectrum)
 
             with g.batch_update():
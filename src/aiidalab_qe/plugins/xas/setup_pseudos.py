@@ -0,0 +1,170 @@
+"""Provisioning of the core-hole pseudopotentials of the XAS plugin.
+
+The pseudopotentials are downloaded to a local cache directory and imported
+into the AiiDA database when the XAS property is selected, or with the
+``install-xas-pseudos`` command, not when the plugin is imported.
+
+The manifest of the cache records the checksums of the extracted files, to
+detect a cache that was only partly extracted or modified since. It does not
+verify the downloaded archives, since their checksums are not published.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import tarfile
+from importlib import resources
+from pathlib import Path
+from typing import Iterable
+
+import requests
+import yaml
+from aiida import orm
+from filelock import FileLock, Timeout
+
+from aiidalab_qe.plugins import xas as xas_folder
+from aiidalab_qe.plugins.utils import get_nodes_by_label, store_nodes
+
+PSEUDO_TOC = yaml.safe_load(resources.read_text(xas_folder, "pseudo_toc.yaml"))
+
+BASE_URL = "https://github.com/PNOGillespie/Core_Level_Spectra_Pseudos/raw/main"
+CACHE_DIR = Path.home() / ".local" / "lib" / "cls_pseudos"
+FUNCTIONALS = ["pbe"]
+MANIFEST_FILENAME = "manifest.json"
+
+FN_LOCKFILE = Path.home().joinpath(".install-xas-pseudos.lock")
+
+# The folder of the archive holding each kind of files of the TOC.
+_TOC_FOLDERS = {
+    "gipaw_pseudos": "gipaw_pseudos",
+    "core_wavefunction_data": "core_wfc_data",
+    "core_hole_pseudos": "ch_pseudos/star1s",
+}
+
+
+def _expected_files(func):
+    """Return the files of the TOC of ``func`` as ``(kind, relative path)``."""
+    pseudos = PSEUDO_TOC["pseudos"][func]
+    files = []
+    for kind, folder in _TOC_FOLDERS.items():
+        filenames = pseudos[kind]
+        if kind == "core_hole_pseudos":
+            filenames = filenames["1s"]
+        files.extend((kind, f"{folder}/{filename}") for filename in filenames.values())
+    return files
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as handle:
+        for chunk in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _archive_filename(func):
+    return f"{func}_ch_pseudos.tgz"
+
+
+def cache_is_valid(func, cache_dir=None):
+    """Return whether the extracted files of ``func`` are unchanged since they
+    were extracted."""
+    folder = Path(cache_dir or CACHE_DIR) / func
+    try:
+        manifest = json.loads((folder / MANIFEST_FILENAME).read_text())
+        return all(
+            _sha256(folder / path) == manifest["files"][path]
+            for _, path in _expected_files(func)
+        )
+    except (OSError, KeyError, ValueError):
+        return False
+
+
+def _download_extract_pseudo_archive(func, cache_dir=None):
+    """Download and extract the archive of ``func`` and write its manifest.
+
+    The manifest is only written once all the files are extracted.
+    """
+    folder = Path(cache_dir or CACHE_DIR) / func
+    folder.mkdir(parents=True, exist_ok=True)
+    (folder / MANIFEST_FILENAME).unlink(missing_ok=True)
+    archive = folder / _archive_filename(func)
+
+    response = requests.get(f"{BASE_URL}/{func}/{archive.name}", timeout=30)
+    response.raise_for_status()
+    archive.write_bytes(response.content)
+
+    with tarfile.open(archive, "r:gz") as tarfil:
+        tarfil.extractall(folder)
+
+    manifest = {
+        "files": {path: _sha256(folder / path) for _, path in _expected_files(func)},
+    }
+    (folder / MANIFEST_FILENAME).write_text(json.dumps(manifest, indent=2))
+
+
+def _nodes_to_import():
+    """Return the files of the TOC without a node of the same label in the database."""
+    files = [
+        (func, kind, path)
+        for func in FUNCTIONALS
+        for kind, path in _expected_files(func)
+    ]
+    existing = get_nodes_by_label(Path(path).name for _, _, path in files)
+    return [file for file in files if Path(file[2]).name not in existing]
+
+
+def _import_nodes(files, cache_dir=None):
+    nodes = []
+    for func, kind, path in files:
+        filename = Path(path).name
+        source = Path(cache_dir or CACHE_DIR) / func / path
+        if kind == "core_wavefunction_data":
+            node = orm.SinglefileData(source, filename="stdout")
+        else:
+            node = orm.UpfData(source, filename=filename)
+        node.label = filename
+        nodes.append(node)
+    store_nodes(nodes)
+
+
+def pseudos_are_installed():
+    """Return whether all the pseudopotentials of the TOC are in the database."""
+    return not _nodes_to_import()
+
+
+def _install(force=False, cache_dir=None):
+    files = _nodes_to_import()
+    for func in FUNCTIONALS:
+        # The cache is only checked if some of its files must be imported.
+        if force or (
+            any(file[0] == func for file in files)
+            and not cache_is_valid(func, cache_dir)
+        ):
+            yield f"Downloading the {func.upper()} core-hole pseudopotentials..."
+            _download_extract_pseudo_archive(func, cache_dir)
+    if files:
+        yield f"Importing {len(files)} pseudopotentials..."
+        _import_nodes(files, cache_dir)
+
+
+def install(force=False, cache_dir=None) -> Iterable[str]:
+    """Download and import the pseudopotentials that are missing.
+
+    Nothing is done if they are already installed, unless ``force`` is set,
+    in which case the archives are downloaded again.
+    """
+    yield "Checking installation status..."
+    try:
+        with FileLock(FN_LOCKFILE, timeout=5):
+            yield from _install(force, cache_dir)
+
+    except Timeout:
+        # Assume that the installation was triggered by a different process.
+        yield "Installation was already started elsewhere, waiting for it to finish..."
+        with FileLock(FN_LOCKFILE, timeout=300):
+            if _nodes_to_import():
+                raise RuntimeError(
+                    "Installation process did not finish in the expected time."
+                )
@@ -1,15 +1,11 @@
-from importlib import resources
-
-import yaml
 from aiida import orm
 from aiida.plugins import WorkflowFactory
 from aiida_quantumespresso.common.types import ElectronicType, SpinType
-from aiidalab_qe.plugins.utils import set_component_resources
+from aiidalab_qe.plugins.utils import get_nodes_by_label, set_component_resources
 
-from aiidalab_qe.plugins import xas as xas_folder
+from .setup_pseudos import PSEUDO_TOC
 
 XspectraCrystalWorkChain = WorkflowFactory("quantumespresso.xspectra.crystal")
-PSEUDO_TOC = yaml.safe_load(resources.read_text(xas_folder, "pseudo_toc.yaml"))
 pseudo_data_dict = PSEUDO_TOC["pseudos"]
 xch_elements = PSEUDO_TOC["xas_xch_elements"]
 
@@ -32,11 +28,22 @@ def get_builder(codes, structure, parameters, **kwargs):
     core_wfc_data_labels = xas_parameters["core_wfc_data_labels"]
     pseudos = {}
     # Convert the pseudo and core_wfc_data node labels into nodes:
-    core_wfc_data = {k: orm.load_node(v) for k, v in core_wfc_data_labels.items()}
+    labels = list(core_wfc_data_labels.values())
     for element in elements_list:
-        pseudos[element] = {
-            k: orm.load_node(v) for k, v in pseudo_labels[element].items()
-        }
+        labels.extend(pseudo_labels[element].values())
+    nodes = get_nodes_by_label(labels)
+    # The pseudos are installed when the property is selected, they are not
+    # downloaded while the workflow is submitted.
+    missing = sorted(set(labels) - set(nodes))
+    if missing:
+        raise RuntimeError(
+            f"The core-hole pseudopotentials {', '.join(missing)} are not "
+            "installed. Select the XAS property in the workflow step to install "
+            "them, or run `python -m aiidalab_qe install-xas-pseudos`."
+        )
+    core_wfc_data = {k: nodes[v] for k, v in core_wfc_data_labels.items()}
+    for element in elements_list:
+        pseudos[element] = {k: nodes[v] for k, v in pseudo_labels[element].items()}
 
     # TODO should we override the cutoff_wfc, cutoff_rho by the new pseudo?
     # In principle we should, if we know what that value is, but that would
@@ -1,6 +1,5 @@
 from aiidalab_qe.common.panel import OutlinePanel
 
-from .result import Result
 from .setting import Setting
 from .workchain import workchain_and_builder
 
@@ -13,6 +12,6 @@ class XpsOutline(OutlinePanel):
 xps = {
     "outline": XpsOutline,
     "setting": Setting,
-    "result": Result,
+    "result": "aiidalab_qe.plugins.xps.result:Result",
     "workchain": workchain_and_builder,
 }
@@ -2,6 +2,7 @@
 
 import ipywidgets as ipw
 
+from aiidalab_qe.common.cache import BROADENING_CACHE, round_to_step
 from aiidalab_qe.common.panel import ResultPanel
 
 
@@ -31,7 +32,11 @@ def export_xps_data(outputs):
 def xps_spectra_broadening(
     points, equivalent_sites_data, gamma=0.3, sigma=0.3, label="", intensity=1.0
 ):
-    """Broadening the XPS spectra with Voigt function and return the spectra data"""
+    """Broadening the XPS spectra with Voigt function and return the spectra data
+
+    The spectra of all the sites of an element are evaluated at once on a
+    shared energy grid. Only the elements in ``points`` are broadened.
+    """
 
     import numpy as np
     from scipy.special import voigt_profile  # pylint: disable=no-name-in-module
@@ -39,34 +44,27 @@ def xps_spectra_broadening(
     result_spectra = {}
     fwhm_voight = gamma / 2 + np.sqrt(gamma**2 / 4 + sigma**2)
     for element, point in points.items():
-        result_spectra[element] = {}
-        final_spectra_y_arrays = []
-        total_multiplicity = sum(
-            [equivalent_sites_data[site]["multiplicity"] for site in point]
+        sites = list(point)
+        core_level_shifts = np.array([point[site] for site in sites])
+        multiplicities = np.array(
+            [equivalent_sites_data[site]["multiplicity"] for site in sites]
         )
-        max_core_level_shift = max(point.values())
-        min_core_level_shift = min(point.values())
         # Energy range for the Broadening function
         x_energy_range = np.linspace(
-            min_core_level_shift - fwhm_voight - 1.5,
-            max_core_level_shift + fwhm_voight + 1.5,
+            core_level_shifts.min() - fwhm_voight - 1.5,
+            core_level_shifts.max() + fwhm_voight + 1.5,
             500,
         )
-        for site in point:
-            # Weight for the spectra of every atom
-            intensity = equivalent_sites_data[site]["multiplicity"] * intensity
-            relative_core_level_position = point[site]
-            y = (
-                intensity
-                * voigt_profile(
-                    x_energy_range - relative_core_level_position, sigma, gamma
-                )
-                / total_multiplicity
-            )
-            result_spectra[element][site] = [x_energy_range, y]
-            final_spectra_y_arrays.append(y)
-        total = sum(final_spectra_y_arrays)
-        result_spectra[element]["total"] = [x_energy_range, total]
+        # Weight for the spectra of every atom
+        weights = intensity * multiplicities / multiplicities.sum()
+        # Shape: (number of sites, number of energies)
+        y = weights[:, np.newaxis] * voigt_profile(
+            x_energy_range - core_level_shifts[:, np.newaxis], sigma, gamma
+        )
+        result_spectra[element] = {
+            site: [x_energy_range, site_y] for site, site_y in zip(sites, y)
+        }
+        result_spectra[element]["total"] = [x_energy_range, y.sum(axis=0)]
     return result_spectra
 
 
@@ -78,6 +76,16 @@ class Result(ResultPanel):
         super().__init__(node=node, **kwargs)
         self.experimental_data = None  # Placeholder for experimental data
 
+    def _load_data(self, node):
+        chemical_shifts, binding_energies, equivalent_sites_data = export_xps_data(
+            node.outputs.xps
+        )
+        return {
+            "chemical_shifts": chemical_shifts,
+            "binding_energies": binding_energies,
+            "equivalent_sites_data": equivalent_sites_data,
+        }
+
     def _update_view(self):
         import plotly.graph_objects as go
 
@@ -104,6 +112,7 @@ class Result(ResultPanel):
             value=0.1,
             min=0.01,
             max=0.5,
+            step=0.01,
             description="Lorentzian profile ($\gamma$)",
             disabled=False,
             style={"description_width": "initial"},
@@ -112,6 +121,7 @@ class Result(ResultPanel):
             value=0.1,
             min=0.01,
             max=0.5,
+            step=0.01,
             description="Gaussian profile ($\sigma$)",
             disabled=False,
             style={"description_width": "initial"},
@@ -151,11 +161,9 @@ class Result(ResultPanel):
             ]
         )
         # get data
-        (
-            chemical_shifts,
-            binding_energies,
-            equivalent_sites_data,
-        ) = export_xps_data(self.outputs.xps)
+        chemical_shifts = self.data["chemical_shifts"]
+        binding_energies = self.data["binding_energies"]
+        equivalent_sites_data = self.data["equivalent_sites_data"]
         self.spectrum_select_options = [
             key.split("_")[0] for key in chemical_shifts.keys()
         ]
@@ -175,9 +183,10 @@ class Result(ResultPanel):
         )
         self.g.layout.xaxis.title = "Chemical shift (eV)"
         self.g.layout.xaxis.autorange = "reversed"
-        #
+        # Only the selected element is broadened
+        element = self.spectrum_select.value
         self.spectra = xps_spectra_broadening(
-            chemical_shifts,
+            {element: chemical_shifts[element]},
             equivalent_sites_data,
             gamma=gamma.value,
             sigma=sigma.value,
@@ -197,16 +206,31 @@ class Result(ResultPanel):
             else:
                 points = binding_energies
                 xaxis = "Binding Energy (eV)"
-            #
-            spectra = xps_spectra_broadening(
-                points,
-                equivalent_sites_data,
-                gamma=gamma.value,
-                sigma=sigma.value,
-                intensity=self.intensity.value,
+            element = self.spectrum_select.value
+            # The values are rounded to the slider steps to be used as cache keys
+            broadening_parameters = {
+                "gamma": round_to_step(gamma.value, gamma.step),
+                "sigma": round_to_step(sigma.value, sigma.step),
+                "intensity": self.intensity.value,
+            }
+            key = (
+                "xps",
+                self.node.uuid,
+                spectra_type.value,
+                element,
+                tuple(broadening_parameters.items()),
             )
+            element_spectra = BROADENING_CACHE.get(key)
+            if element_spectra is None:
+                element_spectra = xps_spectra_broadening(
+                    {element: points[element]},
+                    equivalent_sites_data,
+                    **broadening_parameters,
+                )[element]
+                BROADENING_CACHE.set(key, element_spectra)
+            self.spectra = {element: element_spectra}
 
-            for site, d in spectra[self.spectrum_select.value].items():
+            for site, d in element_spectra.items():
                 data.append(
                     {
                         "x": d[0],
@@ -269,10 +293,11 @@ class Result(ResultPanel):
         self.experimental_data = df
         # Calculate an initial guess for the intensity factor
         total = self.spectra[self.spectrum_select.value]["total"]
-        # Align the max value of the total spectra with the max value of the experimental data
+        # Align the max value of the total spectra with the max value of the experimental data.
+        # The spectra are proportional to the current intensity factor.
         max_exp = max(self.experimental_data[1])
         max_total = max(total[1])
-        self.intensity.value = max_exp / max_total
+        self.intensity.value = self.intensity.value * max_exp / max_total
 
     def plot_experimental_data(self):
         """Plot the experimental data alongside the calculated data."""
@@ -1,7 +1,7 @@
 from aiida.orm import Bool, Dict, Float, Group, QueryBuilder
 from aiida.plugins import WorkflowFactory
 from aiida_quantumespresso.common.types import ElectronicType, SpinType
-from aiidalab_qe.plugins.utils import set_component_resources
+from aiidalab_qe.plugins.utils import get_nodes_by_label, set_component_resources
 
 XpsWorkChain = WorkflowFactory("quantumespresso.xps")
 
@@ -30,6 +30,10 @@ def get_builder(codes, structure, parameters, **kwargs):
     pseudo_group = (
         QueryBuilder().append(Group, filters={"label": pseudo_group}).one()[0]
     )
+    # load all the pseudos of the core levels at once
+    labels = set(core_level_list)
+    labels.update(f"{label.split('_')[0]}_gs" for label in core_level_list)
+    group_pseudos = get_nodes_by_label(labels, group=pseudo_group)
     # set pseudo for element
     pseudos = {}
     elements_list = []
@@ -37,14 +41,8 @@ def get_builder(codes, structure, parameters, **kwargs):
     for label in core_level_list:
         element = label.split("_")[0]
         pseudos[element] = {
-            "core_hole": [
-                pseudo for pseudo in pseudo_group.nodes if pseudo.label == label
-            ][0],
-            "gipaw": [
-                pseudo
-                for pseudo in pseudo_group.nodes
-                if pseudo.label == f"{element}_gs"
-            ][0],
+            "core_hole": group_pseudos[label],
+            "gipaw": group_pseudos[f"{element}_gs"],
         }
         correction_energies[element] = (
             all_correction_energies[label]["core"]
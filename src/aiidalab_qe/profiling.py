@@ -0,0 +1,79 @@
+"""Opt-in timing of the startup of the app.
+
+The wall-clock time of the phases of the startup, e.g. the construction of
+each step of the app and the loading of each plugin, is recorded when the
+``AIIDALAB_QE_PROFILE_STARTUP`` environment variable is set to ``1``, or once
+the app is created with ``App(profile_startup=True)``. Otherwise, ``phase``
+does nothing.
+
+The report is printed by the ``profile-startup`` command of the CLI.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_STARTUP = os.environ.get("AIIDALAB_QE_PROFILE_STARTUP", "0") == "1"
+
+
+class StartupProfiler:
+    """Record the duration of nested phases."""
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.records = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def phase(self, name):
+        """Record the duration of the code run in the context as phase ``name``."""
+        if not self.enabled:
+            yield
+            return
+        stack = self._local.__dict__.setdefault("stack", [])
+        record = {"phase": name, "depth": len(stack), "seconds": None}
+        with self._lock:
+            self.records.append(record)
+        stack.append(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            stack.pop()
+
+    def clear(self):
+        with self._lock:
+            self.records.clear()
+
+    def report(self):
+        """Return the records of the finished phases, in the order they started."""
+        with self._lock:
+            return [
+                dict(record) for record in self.records if record["seconds"] is not None
+            ]
+
+    def format_table(self):
+        """Return the report as a table, nested phases are indented."""
+        rows = [
+            ("  " * record["depth"] + record["phase"], f"{record['seconds']:.3f}")
+            for record in self.report()
+        ]
+        width = max([len("Phase")] + [len(name) for name, _ in rows])
+        lines = [f"{'Phase':<{width}}  Time (s)", "-" * (width + 10)]
+        lines.extend(f"{name:<{width}}  {seconds:>8}" for name, seconds in rows)
+        return "\n".join(lines)
+
+    def to_json(self):
+        return json.dumps(self.report(), indent=2)
+
+
+profiler = StartupProfiler(enabled=PROFILE_STARTUP)
+
+
+def phase(name):
+    """Record the duration of a phase of the startup, if profiling is enabled."""
+    return profiler.phase(name)
@@ -97,6 +97,30 @@ def generate_structure_data():
     return _generate_structure_data
 
 
+@pytest.fixture
+def main_loop(monkeypatch):
+    """Replace the event loop of the kernel, to which the worker threads loading
+    the result panels schedule their callbacks, by one run with ``run()``."""
+
+    class MainLoop:
+        def __init__(self):
+            self.callbacks = []
+
+        def add_callback(self, callback, *args):
+            self.callbacks.append((callback, args))
+
+        def run(self):
+            while self.callbacks:
+                callback, args = self.callbacks.pop(0)
+                callback(*args)
+
+    loop = MainLoop()
+    monkeypatch.setattr(
+        "aiidalab_qe.app.result.workchain_viewer._get_main_loop", lambda: loop
+    )
+    return loop
+
+
 @pytest.fixture
 def generate_xy_data():
     """Return an ``XyData`` instance."""
@@ -709,3 +733,53 @@ def generate_qeapp_workchain(
         return wkchain
 
     return _generate_qeapp_workchain
+
+
+@pytest.fixture
+def generate_qeapp_calcjob_graph(generate_upf_data):
+    """Return a finished `QeAppWorkChain` node calling a relax and a bands
+    calculation, each with its input, pseudopotential and retrieved files."""
+
+    def _generate_qeapp_calcjob_graph():
+        from aiida import orm
+        from aiida.common import LinkType
+        from aiida.engine import ProcessState
+
+        qeapp = orm.WorkChainNode()
+        qeapp.set_process_label("QeAppWorkChain")
+        qeapp.set_process_state(ProcessState.FINISHED)
+        qeapp.set_exit_status(0)
+        qeapp.store()
+
+        for label, base_label in (("relax", "iteration_01"), ("bands", "scf")):
+            workchain = orm.WorkChainNode()
+            workchain.base.links.add_incoming(qeapp, LinkType.CALL_WORK, label)
+            workchain.store()
+            base = orm.WorkChainNode()
+            base.base.links.add_incoming(workchain, LinkType.CALL_WORK, base_label)
+            base.store()
+
+            calcjob = orm.CalcJobNode()
+            calcjob.set_option("input_filename", "aiida.in")
+            calcjob.base.repository.put_object_from_bytes(
+                f"&CONTROL {label} /".encode(), "aiida.in"
+            )
+            calcjob.base.links.add_incoming(base, LinkType.CALL_CALC, "iteration_01")
+            # every calculation has its own pseudopotential nodes
+            for element in ("Si", "O"):
+                pseudo = generate_upf_data(element).store()
+                calcjob.base.links.add_incoming(
+                    pseudo, LinkType.INPUT_CALC, f"pseudos__{element}"
+                )
+            calcjob.store()
+
+            retrieved = orm.FolderData()
+            retrieved.base.repository.put_object_from_bytes(
+                f"{label} output".encode(), "aiida.out"
+            )
+            retrieved.base.links.add_incoming(calcjob, LinkType.CREATE, "retrieved")
+            retrieved.store()
+
+        return qeapp
+
+    return _generate_qeapp_calcjob_graph
@@ -76,3 +76,92 @@ def test_unsaved_changes(app_to_submit):
     app._wizard_app_widget.selected_index = 2
     # the blocker should be removed
     assert len(app.submit_step.external_submission_blockers) == 0
+
+
+def test_lazy_steps():
+    """Test that the steps after the structure step are created when reached."""
+    from aiidalab_qe.app.main import App
+
+    app = App(qe_auto_setup=False)
+    assert all(lazy_step.step is None for lazy_step in app._lazy_steps)
+
+    # the configuration and submission steps are created together
+    app._wizard_app_widget.selected_index = 1
+    configure_step, submit_step, results_step = (
+        lazy_step.step for lazy_step in app._lazy_steps
+    )
+    assert configure_step is app.configure_step
+    assert submit_step is app.submit_step
+    assert results_step is None
+    assert app._lazy_steps[0].children == (configure_step,)
+
+    # the state of the created steps is shown by the wizard
+    configure_step.state = configure_step.State.CONFIGURED
+    assert app._lazy_steps[0].state is configure_step.State.CONFIGURED
+
+    assert app.results_step.process is None
+    assert app._lazy_steps[2].step is app.results_step
+
+
+@pytest.mark.usefixtures("sssp")
+def test_lazy_steps_process_selection(generate_qeapp_workchain, pw_code):
+    """Test that selecting a finished process creates all the steps and restores
+    their parameters."""
+    from aiida.engine import ProcessState
+
+    from aiidalab_qe.app.main import App
+
+    wkchain = generate_qeapp_workchain(
+        relax_type="positions", run_bands=True, run_pdos=False
+    )
+    wkchain.node.set_process_state(ProcessState.FINISHED)
+    wkchain.node.set_exit_status(0)
+
+    app = App(qe_auto_setup=False)
+    assert all(lazy_step.step is None for lazy_step in app._lazy_steps)
+    app.work_chain_selector.value = wkchain.node.pk
+
+    assert app._wizard_app_widget.selected_index == 3
+    assert all(lazy_step.step is not None for lazy_step in app._lazy_steps)
+    # the configuration is restored
+    configure_step = app.configure_step
+    assert configure_step.workchain_settings.relax_type.value == "positions"
+    assert configure_step.workchain_settings.properties["bands"].run.value is True
+    assert configure_step.workchain_settings.properties["pdos"].run.value is False
+    assert configure_step.state == configure_step.State.SUCCESS
+    # the submission parameters are restored
+    submit_step = app.submit_step
+    assert submit_step.process.pk == wkchain.node.pk
+    assert submit_step.pw_code.value == pw_code.uuid
+    assert submit_step.pw_code.num_cpus.value == 4
+    assert submit_step.state == submit_step.State.SUCCESS
+    # the results step shows the process
+    assert app.results_step.process == wkchain.node.uuid
+    assert app._lazy_steps[2].children == (app.results_step,)
+
+
+def test_setup_starts_with_app(monkeypatch):
+    """Test that the setup of the codes and pseudos starts with the app, before
+    the submission step is created, which then shows its status."""
+    from aiidalab_qe.app.main import App
+    from aiidalab_qe.common.setup_codes import QESetupWidget
+    from aiidalab_qe.common.setup_pseudos import PseudosInstallWidget
+
+    started = []
+    monkeypatch.setattr(
+        PseudosInstallWidget, "refresh", lambda self: started.append(self)
+    )
+    monkeypatch.setattr(QESetupWidget, "refresh", lambda self: started.append(self))
+
+    app = App(qe_auto_setup=True)
+    assert all(lazy_step.step is None for lazy_step in app._lazy_steps)
+    assert started == [app._sssp_installation_status, app._qe_setup_status]
+
+    # the pseudos are installed before the submission step is created
+    app._sssp_installation_status.set_trait("installed", True)
+    submit_step = app.submit_step
+    assert submit_step.sssp_installation_status is app._sssp_installation_status
+    assert submit_step.qe_setup_status is app._qe_setup_status
+    assert submit_step.sssp_installation_status not in submit_step.children
+    assert submit_step.qe_setup_status in submit_step.children
+    assert len(started) == 2
@@ -0,0 +1,123 @@
+import numpy as np
+
+
+def test_disk_cache_round_trip(tmp_path):
+    """Test that nested data with arrays is restored from the cache."""
+    from aiidalab_qe.common.cache import DiskCache
+
+    cache = DiskCache("test", cache_dir=tmp_path)
+    key = cache.key("uuid", {"group_tag": "kinds", "selected_atoms": [0, 1]})
+    data = {
+        "y": np.arange(6.0).reshape(2, 3),
+        "paths": [{"from": "GAMMA", "x": [0.0, 0.5]}],
+        "fermi_energy": np.float64(2.0),
+    }
+
+    assert cache.get(key) is None
+    cache.set(key, data)
+    restored = cache.get(key)
+
+    assert np.array_equal(restored["y"], data["y"])
+    assert restored["paths"] == data["paths"]
+    assert restored["fermi_energy"] == 2.0
+    # the key depends on the options
+    assert key != cache.key("uuid", {"group_tag": "atoms", "selected_atoms": [0, 1]})
+
+
+def test_disk_cache_concurrent_set(tmp_path):
+    """Test that threads storing the same key do not share a temporary file."""
+    import threading
+
+    from aiidalab_qe.common.cache import DiskCache
+
+    cache = DiskCache("test", cache_dir=tmp_path)
+    errors = []
+
+    def store(value):
+        y = np.random.default_rng(value).random(100000)
+        try:
+            for _ in range(10):
+                cache.set("key", {"y": y, "value": value})
+                stored = cache.get("key")
+                # the entry is never partially written
+                assert stored is not None
+                expected = np.random.default_rng(stored["value"]).random(100000)
+                assert np.array_equal(stored["y"], expected)
+        except Exception as error:
+            errors.append(error)
+
+    threads = [threading.Thread(target=store, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert [path.name for path in tmp_path.iterdir()] == ["key.npz"]
+
+
+def test_disk_cache_eviction(tmp_path):
+    """Test that the least recently used entries are evicted."""
+    import os
+    import time
+
+    from aiidalab_qe.common.cache import DiskCache
+
+    cache = DiskCache("test", cache_dir=tmp_path)
+    data = {"y": np.random.default_rng(0).random(1000)}
+    for key in ("a", "b", "c"):
+        cache.set(key, data)
+        # make sure the modification times are distinct
+        past = time.time() - 100 + len(os.listdir(tmp_path))
+        os.utime(tmp_path / f"{key}.npz", (past, past))
+
+    entry_size = (tmp_path / "a.npz").stat().st_size
+    # reading "a" makes it the most recently used entry
+    assert cache.get("a") is not None
+    cache.max_size = 2 * entry_size
+    cache.set("d", data)
+
+    assert sorted(path.stem for path in tmp_path.glob("*.npz")) == ["a", "d"]
+
+
+def test_disk_cache_corrupted_entry(tmp_path):
+    """Test that a corrupted entry is treated as a cache miss."""
+    from aiidalab_qe.common.cache import DiskCache
+
+    cache = DiskCache("test", cache_dir=tmp_path)
+    (tmp_path / "broken.npz").write_bytes(b"not a npz file")
+
+    assert cache.get("broken", default="missing") == "missing"
+    assert not (tmp_path / "broken.npz").exists()
+
+
+def test_disk_cache_dataclass(tmp_path):
+    """Test that registered dataclasses are restored from the cache."""
+    from aiidalab_qe.common.bandpdoswidget import Trace
+    from aiidalab_qe.common.cache import DiskCache
+
+    cache = DiskCache("test", cache_dir=tmp_path)
+    trace = Trace(label="Si", x=np.arange(3.0), y=np.ones(3), color="#000000")
+    cache.set("trace", {"dos": [trace]})
+    restored = cache.get("trace")["dos"][0]
+
+    assert isinstance(restored, Trace)
+    assert restored.label == "Si"
+    assert restored.line_style == "solid"
+    assert np.array_equal(restored.x, trace.x)
+
+
+def test_lru_cache():
+    """Test that the least recently used entries are evicted from memory."""
+    from aiidalab_qe.common.cache import LRUCache, round_to_step
+
+    cache = LRUCache(max_size=2)
+    cache.set(("uuid", "Si", round_to_step(0.30000000000000004, 0.1)), "a")
+    cache.set("b", "b")
+    # reading an entry makes it the most recently used one
+    assert cache.get(("uuid", "Si", 0.3)) == "a"
+    cache.set("c", "c")
+
+    assert cache.get("b") is None
+    assert cache.get(("uuid", "Si", 0.3)) == "a"
+    assert cache.get("c") == "c"
@@ -100,3 +100,34 @@ def test_download_and_install_pseudos(tmp_path, aiida_profile, monkeypatch):
 
     # Check the install without download is slower than install with download
     assert install_without_download_time > install_time
+
+
+def test_profile_startup(aiida_profile):
+    """Test that the time of each phase of the app construction is reported."""
+    import json
+
+    from aiidalab_qe.profiling import profiler
+
+    runner = CliRunner()
+    profile = aiida.get_profile()
+    try:
+        result: Result = runner.invoke(
+            cli.profile_startup, ["--profile", profile.name, "--json"]
+        )
+    finally:
+        profiler.enabled = False
+
+    assert result.exit_code == 0, result.output
+    report = json.loads(result.stdout)
+    phases = {record["phase"]: record for record in report}
+    assert phases["App"]["depth"] == 0
+    assert phases["structure step"]["depth"] == 1
+    assert phases["structure step"]["seconds"] <= phases["App"]["seconds"]
+    # the steps created once they are reached are reported as well
+    assert phases["configure step"]["depth"] == 1
+    assert phases["deferred steps"]["depth"] == 0
+
+    table = profiler.format_table()
+    assert table.splitlines()[0].split() == ["Phase", "Time", "(s)"]
+    assert "\n  structure step " in table
+    profiler.clear()
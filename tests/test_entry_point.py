@@ -5,3 +5,45 @@ def test_entry_point():
     assert "bands" in entries
     assert "pdos" in entries
     assert "workchain" in entries["bands"]
+
+
+def test_entry_point_registry(tmp_path, monkeypatch):
+    """Test that the entry points are scanned once and the items imported lazily."""
+    import sys
+    from importlib.metadata import EntryPoint
+
+    from aiidalab_qe.plugins import entry_points
+    from aiidalab_qe.plugins.entry_points import EntryPointRegistry
+
+    (tmp_path / "demo_plugin.py").write_text(
+        'demo = {"result": "demo_result:Result"}\n'
+    )
+    (tmp_path / "demo_result.py").write_text("class Result:\n    pass\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    group = "aiidalab_qe.properties"
+    scans = []
+
+    def mock_entry_points():
+        scans.append(None)
+        return {
+            group: [
+                EntryPoint("demo", "demo_plugin:demo", group),
+                EntryPoint("broken", "missing_module:broken", group),
+            ]
+        }
+
+    monkeypatch.setattr(entry_points, "entry_points", mock_entry_points)
+    registry = EntryPointRegistry()
+
+    assert registry.get_names(group) == ["demo", "broken"]
+    assert list(registry.get_entries(group)) == ["demo"]
+    # the result panel is only imported once it is requested
+    assert "demo_result" not in sys.modules
+    assert registry.get_entry_items(group, "outline") == {}
+    results = registry.get_entry_items(group, "result")
+    assert results["demo"] is sys.modules["demo_result"].Result
+    assert registry.get_entry_items(group, "result")["demo"] is results["demo"]
+    assert len(scans) == 1
+    sys.modules.pop("demo_plugin")
+    sys.modules.pop("demo_result")
@@ -9,3 +9,42 @@ def test_outline_panel():
     parameters = {"test_run": True}
     panel.set_panel_value(parameters)
     assert panel.run.value is True
+
+
+def test_result_panel_threaded_load(generate_xy_data, main_loop):
+    """Test the data of a result panel is extracted in a worker thread, and its
+    widgets are built in the main thread, where their callbacks use the data."""
+    import threading
+
+    import ipywidgets as ipw
+    import numpy as np
+
+    from aiidalab_qe.app.result.workchain_viewer import WorkChainViewer
+    from aiidalab_qe.common.panel import ResultPanel
+
+    class Result(ResultPanel):
+        def _load_data(self, node):
+            return {"y": node.get_y()[0][1]}
+
+        def _update_view(self):
+            self.slider = ipw.FloatSlider(value=1.0)
+            self.total = ipw.FloatText()
+
+            def response(change):
+                self.total.value = change["new"] * self.data["y"].sum()
+
+            self.slider.observe(response, "value")
+            self.children = [self.slider, self.total]
+
+    node = generate_xy_data(np.array([1, 2, 3]), [np.array([1, 2, 3])], "X", ["y"])
+    result = Result(node=node)
+    thread = threading.Thread(
+        target=WorkChainViewer._load_result, args=(result, node.uuid, main_loop)
+    )
+    thread.start()
+    thread.join()
+    assert isinstance(result.data["y"], np.ndarray)
+    assert not hasattr(result, "slider")
+    main_loop.run()
+    result.slider.value = 2.0
+    assert result.total.value == 12.0
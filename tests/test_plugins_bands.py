@@ -50,3 +50,31 @@ def test_structure_2d(generate_qeapp_workchain, generate_structure_data):
     assert "bands_kpoints_distance" not in wkchain.inputs.bands
     assert "bands_kpoints" in wkchain.inputs.bands
     assert len(wkchain.inputs.bands.bands_kpoints.labels) == 4
+
+
+@pytest.mark.parametrize(
+    ("render_mode", "trace_type"),
+    [("auto", "scattergl"), ("svg", "scatter"), ("webgl", "scattergl")],
+)
+def test_render_mode(monkeypatch, render_mode, trace_type):
+    """Test that WebGL traces are used for large band structures."""
+    import numpy as np
+
+    from aiidalab_qe.common.bandpdoswidget import BandPdosPlotly
+
+    x = np.linspace(0, 1, 100).tolist()
+    bands_data = {
+        "x": x,
+        "y": np.zeros((100, 20)),
+        "band_type_idx": np.zeros(20, dtype=int),
+        "paths": [{"x": x}],
+        "pathlabels": [["GAMMA", "X"], [0.0, 1.0]],
+        "fermi_energy": 0.0,
+    }
+    monkeypatch.setitem(BandPdosPlotly.SETTINGS, "render_mode", render_mode)
+    monkeypatch.setitem(BandPdosPlotly.SETTINGS, "webgl_threshold", 1000)
+
+    fig = BandPdosPlotly(bands_data=bands_data).bandspdosfigure
+    assert fig.data[0].type == trace_type
+    if trace_type == "scatter":
+        assert fig.data[0].line.shape == "spline"
@@ -26,3 +26,287 @@ def test_result(generate_qeapp_workchain):
         == "Density of states (eV)"
     )
     assert result.children[0].bandsplot_widget.layout.yaxis.title.text is None
+
+
+def test_projections_grouping(generate_bands_data):
+    """Test the grouping of the orbital projections by atoms, kinds and orbitals."""
+    import numpy as np
+    from aiida.plugins import DataFactory, OrbitalFactory
+
+    from aiidalab_qe.common.bandpdoswidget import _projections_curated_options
+
+    ProjectionData = DataFactory("core.array.projection")
+    OrbitalCls = OrbitalFactory("core.realhydrogen")
+
+    # Two Si atoms with s and pz orbitals, one O atom with an s orbital
+    states = [
+        ("Si", [0.0, 0.0, 0.0], 0, 0),
+        ("Si", [0.0, 0.0, 0.0], 1, 0),
+        ("Si", [1.0, 1.0, 1.0], 0, 0),
+        ("Si", [1.0, 1.0, 1.0], 1, 0),
+        ("O", [2.0, 2.0, 2.0], 0, 0),
+    ]
+    orbitals = [
+        OrbitalCls(
+            kind_name=kind_name,
+            position=position,
+            angular_momentum=angular_momentum,
+            magnetic_number=magnetic_number,
+            radial_nodes=0,
+        )
+        for kind_name, position, angular_momentum, magnetic_number in states
+    ]
+    energy = np.linspace(-1, 1, 4)
+    pdos = [np.full(4, float(2**i)) for i in range(len(orbitals))]
+
+    projections = ProjectionData()
+    projections.set_reference_bandsdata(generate_bands_data())
+    projections.set_projectiondata(
+        orbitals,
+        list_of_energy=[energy] * len(orbitals),
+        list_of_pdos=pdos,
+        bands_check=False,
+    )
+
+    def grouped(group_tag, plot_tag, selected_atoms):
+        return {
+            entry.label: entry.y[0]
+            for entry in _projections_curated_options(
+                projections, group_tag, plot_tag, selected_atoms
+            )
+        }
+
+    assert grouped("kinds", "total", []) == {"Si": 15.0, "O": 16.0}
+    assert grouped("atoms", "total", []) == {
+        "Si-[0.0, 0.0, 0.0]": 3.0,
+        "Si-[1.0, 1.0, 1.0]": 12.0,
+        "O-[2.0, 2.0, 2.0]": 16.0,
+    }
+    assert grouped("kinds", "orbital", [1, 2]) == {
+        "Si-s": 4.0,
+        "Si-p<sub>z</sub>": 8.0,
+        "O-s": 16.0,
+    }
+    assert grouped("kinds", "angular_momentum", [2]) == {"O-s": 16.0}
+    # the order of the groups follows the order of the orbitals
+    assert list(grouped("kinds", "total", [2, 0])) == ["Si", "O"]
+
+
+def test_update_figure():
+    """Test that only the PDOS traces of an existing figure are updated."""
+    import numpy as np
+
+    from aiidalab_qe.common.bandpdoswidget import BandPdosPlotly, Trace
+
+    def pdos_data(labels):
+        energy = np.linspace(-2, 2, 5)
+        return {
+            "dos": [Trace(label, energy, np.ones(5), "#8A8A8A") for label in labels],
+            "fermi_energy": 0.0,
+        }
+
+    fig = BandPdosPlotly(pdos_data=pdos_data(["Si", "O"])).bandspdosfigure
+    first_trace = fig.data[0]
+
+    BandPdosPlotly(pdos_data=pdos_data(["Si-s", "Si-p", "O-s"])).update_figure(fig)
+    assert [trace.name for trace in fig.data] == ["Si-s", "Si-p", "O-s"]
+    # the existing traces are updated in place
+    assert fig.data[0] is first_trace
+
+    BandPdosPlotly(pdos_data=pdos_data(["Total DOS"])).update_figure(fig)
+    assert [trace.name for trace in fig.data] == ["Total DOS"]
+
+
+def test_downsampled_traces_zoom():
+    """Test the whole lines are downsampled for the first render, and only the
+    visible range of the figure once it is zoomed in."""
+    import numpy as np
+
+    from aiidalab_qe.common.bandpdoswidget import BandPdosPlotly, Trace
+
+    energy = np.linspace(-30, 30, 10001)
+    pdos_data = {
+        "dos": [Trace("Si", energy, np.ones_like(energy), "#8A8A8A")],
+        "fermi_energy": 0.0,
+    }
+    plot = BandPdosPlotly(pdos_data=pdos_data)
+    fig = plot.bandspdosfigure
+    # the traces are not cropped to the initial range, e.g. for the autorange
+    assert fig.data[0].x[0] == -30 and fig.data[0].x[-1] == 30
+    assert len(fig.data[0].x) <= plot.SETTINGS["downsampling_points"]
+
+    fig.layout.xaxis.range = [-1, 1]
+    plot.update_figure(fig, zoomed=True)
+    assert -1.01 < min(fig.data[0].x) <= -1
+    assert 1 <= max(fig.data[0].x) < 1.01
+
+    # the options changed, the traces are not cropped
+    BandPdosPlotly(pdos_data=pdos_data).update_figure(fig)
+    assert fig.data[0].x[0] == -30 and fig.data[0].x[-1] == 30
+
+    # the zoom is reset
+    fig.layout.xaxis.range = [-1, 1]
+    plot.update_figure(fig, zoomed=True)
+    fig.layout.xaxis.range = plot.SETTINGS["horizontal_range_pdos"]
+    plot.update_figure(fig, zoomed=True)
+    assert fig.data[0].x[0] == -30 and fig.data[0].x[-1] == 30
+
+
+def test_downsampled_projections():
+    """Test the fat bands projections keep the points of their downsampled band."""
+    import numpy as np
+
+    from aiidalab_qe.common.bandpdoswidget import (
+        BandPdosPlotly,
+        Trace,
+        _prepare_projections_to_plot,
+    )
+
+    x = np.linspace(0, 1, 5001)
+    bands = np.vstack([np.sin(20 * x), np.cos(20 * x)]).T
+    bands_data = {
+        "x": x.tolist(),
+        "y": bands,
+        "band_type_idx": np.zeros(2, dtype=int),
+        "paths": [{"x": x.tolist()}],
+        "pathlabels": [["GAMMA", "X"], [0.0, 1.0]],
+        "fermi_energy": 0.0,
+    }
+    projections = [Trace("Si-s", None, np.ones_like(bands) * x[:, None], "#1f77b4")]
+    bands_data["projected_bands"] = _prepare_projections_to_plot(
+        bands_data, [projections], 0.5
+    )
+
+    plot = BandPdosPlotly(bands_data=bands_data, project_bands=True)
+    fig = plot.bandspdosfigure
+    band_trace, projection_trace = fig.data[0], fig.data[1]
+    n_points = len(band_trace.x) // 2 - 1
+    assert n_points <= plot.SETTINGS["downsampling_points"]
+
+    # each band is followed by its upper and lower boundary in reverse order
+    proj_x = np.array(projection_trace.x).reshape(2, -1)
+    proj_y = np.array(projection_trace.y).reshape(2, -1)
+    band_x = np.array(band_trace.x).reshape(2, -1)[:, :-1]
+    band_y = np.array(band_trace.y).reshape(2, -1)[:, :-1]
+    assert np.array_equal(proj_x[:, :n_points], band_x)
+    assert np.array_equal(proj_x[:, 2 * n_points - 1 : n_points - 1 : -1], band_x)
+    upper, lower = proj_y[:, :n_points], proj_y[:, 2 * n_points - 1 : n_points - 1 : -1]
+    assert np.allclose((upper + lower) / 2, band_y)
+    assert np.allclose(upper - lower, band_x)
+
+    fig.layout.xaxis.range = [0.2, 0.3]
+    plot.update_figure(fig, update_bands=True, zoomed=True)
+    assert min(fig.data[1].x) < 0.2 < 0.3 < np.nanmax(fig.data[1].x) < 0.31
+
+
+def test_is_downsampled_without_traces():
+    """Test a figure without any line is not downsampled."""
+    from aiidalab_qe.common.bandpdoswidget import BandPdosPlotly
+
+    plot = BandPdosPlotly(pdos_data={"dos": [], "fermi_energy": 0.0})
+    assert not plot.is_downsampled
+
+
+def test_zoom_resampled_once(monkeypatch):
+    """Test a zoom changing both axes resamples the traces only once."""
+    import numpy as np
+
+    from aiidalab_qe.common.bandpdoswidget import BandPdosPlotly, BandPdosWidget, Trace
+
+    energy = np.linspace(-30, 30, 10001)
+    pdos_data = {
+        "dos": [Trace("Si", energy, np.ones_like(energy), "#8A8A8A")],
+        "fermi_energy": 0.0,
+    }
+    widget = BandPdosWidget(pdos="pdos", pdos_data=pdos_data)
+    calls = []
+    update_figure = BandPdosPlotly.update_figure
+    monkeypatch.setattr(
+        BandPdosPlotly,
+        "update_figure",
+        lambda self, *args, **kwargs: calls.append(args)
+        or update_figure(self, *args, **kwargs),
+    )
+
+    layout = widget.bandsplot_widget.layout
+    layout.xaxis.range = [-1, 1]
+    layout.yaxis.range = [0, 2]
+    assert len(calls) == 2
+    widget._on_zoom(layout, layout.xaxis.range, layout.yaxis.range)
+    assert len(calls) == 2
+    widget.bandsplot_widget.plotly_relayout(
+        {"xaxis.range": [-2, 2], "yaxis.range": [0, 3]}
+    )
+    assert len(calls) == 3
+    assert -2.01 < min(widget.bandsplot_widget.data[0].x) <= -2
+
+
+def test_downsample_lines():
+    """Test the min-max downsampling of the lines sent to the frontend."""
+    import numpy as np
+
+    from aiidalab_qe.common.bandpdoswidget import downsample_lines
+
+    x = np.linspace(-10, 10, 10001)
+    y = np.vstack([np.zeros_like(x), np.sin(x)])
+    # A narrow peak must survive the downsampling
+    y[0, 1234] = 5.0
+
+    x_down, y_down = downsample_lines(x, y, 500)
+    assert x_down.shape == y_down.shape == (2, 500)
+    assert y_down[0].max() == 5.0
+    assert x_down[0, 0] == -10 and x_down[0, -1] == 10
+
+    # Only the visible range is resampled
+    x_down, y_down = downsample_lines(x, y, 500, x_range=[-1, 1])
+    assert -1.01 < x_down.min() <= -1
+    assert 1 <= x_down.max() < 1.01
+
+    # Short lines are left untouched
+    x_down, y_down = downsample_lines(x, y, 20000)
+    assert np.array_equal(y_down, y)
+
+
+def test_exported_data_keys():
+    """Test the downloaded data have the keys of the files exported before the
+    lines were kept as NumPy arrays."""
+    import json
+
+    import numpy as np
+
+    from aiidalab_qe.common.bandpdoswidget import Trace, _to_json_compatible
+
+    energy = np.linspace(-2, 2, 5)
+    pdos_data = {
+        "dos": [
+            Trace("Total DOS (↓)", energy, -np.ones(5), "#8A8A8A", "dash"),
+            Trace("Si-s (↓)", energy, -np.ones(5), "#1f77b4", "dash"),
+        ],
+        "fermi_energy": 0.0,
+    }
+    bands_data = {
+        "x": np.arange(3.0),
+        "projected_bands": [Trace("Si-s", np.arange(3.0), np.ones(3), "#1f77b4")],
+    }
+
+    exported = json.loads(json.dumps(_to_json_compatible(pdos_data)))
+    assert exported["dos"][0] == {
+        "label": "Total DOS (↓)",
+        "x": energy.tolist(),
+        "y": (-np.ones(5)).tolist(),
+        "borderColor": "#8A8A8A",
+        "backgroundColor": "#999999",
+        "backgroundAlpha": "40%",
+        "lineStyle": "dash",
+    }
+    assert list(exported["dos"][1]) == ["label", "x", "y", "borderColor", "lineStyle"]
+
+    exported = json.loads(json.dumps(_to_json_compatible(bands_data)))
+    assert exported["projected_bands"] == [
+        {
+            "x": [0.0, 1.0, 2.0],
+            "y": [1.0, 1.0, 1.0],
+            "label": "Si-s",
+            "color": "#1f77b4",
+        }
+    ]
@@ -35,3 +35,141 @@ def test_settings(submit_app_generator):
         .value
         == "xch_smear"
     )
+
+
+def _reference_broadening(x_vals, y_vals, gammas):
+    """Point-by-point Lorentzian broadening with one width per point."""
+    import numpy as np
+
+    lorenz_y = np.zeros(len(x_vals))
+    for x, y, gamma in zip(x_vals, y_vals, gammas):
+        lorenz_y += gamma / 2.0 / np.pi / ((x_vals - x) ** 2 + 0.25 * gamma**2) * y
+    return lorenz_y
+
+
+def test_broaden_xas():
+    """Test the constant and variable broadening of XAS spectra."""
+    import numpy as np
+
+    from aiidalab_qe.plugins.xas.result import broaden_xas
+
+    x_vals = np.linspace(-10, 40, 501)
+    y_vals = np.exp(-((x_vals - 2) ** 2)) + 0.5 * np.exp(-((x_vals - 20) ** 2) / 4)
+    # very small values are skipped in the variable mode
+    y_vals[x_vals < -5] = 1.0e-8
+    spectrum = np.column_stack((x_vals, y_vals))
+
+    broadened = broaden_xas(spectrum, gamma_hole=0.5)
+    assert broadened.shape == spectrum.shape
+    assert np.allclose(broadened[:, 0], x_vals)
+    assert np.allclose(
+        broadened[:, 1], _reference_broadening(x_vals, y_vals, np.full(501, 0.5))
+    )
+
+    broadened = broaden_xas(
+        spectrum, variable=True, gamma_hole=0.5, gamma_max=5, center_energy=15
+    )
+    e = np.maximum(x_vals, 1.0e-12) / 15
+    gammas = np.where(
+        x_vals > 0, 0.5 + 5 * (0.5 + np.arctan((e - 1) / e**2) / np.pi), 0.5
+    )
+    expected = _reference_broadening(
+        x_vals, np.where(y_vals > 1.0e-6, y_vals, 0), gammas
+    )
+    assert np.allclose(broadened[:, 1], expected)
+    assert np.all(np.isfinite(broadened))
+
+    # all the spectra of an element can be broadened at once
+    spectra = np.stack([spectrum, np.column_stack((x_vals - 1, 2 * y_vals))])
+    batch = broaden_xas(spectra, gamma_hole=0.5)
+    for single, broadened in zip(spectra, batch):
+        assert np.allclose(broaden_xas(single, gamma_hole=0.5), broadened)
+
+
+@pytest.mark.usefixtures("aiida_profile_clean")
+def test_install_pseudos(tmp_path, monkeypatch):
+    """Test that the pseudos are downloaded and imported once, on demand."""
+    import io
+    import tarfile
+
+    from aiida import orm
+
+    from aiidalab_qe.plugins.xas import setup_pseudos
+
+    archive = io.BytesIO()
+    with tarfile.open(fileobj=archive, mode="w:gz") as tar:
+        for _, path in setup_pseudos._expected_files("pbe"):
+            element = path.split("/")[-1].split(".")[0]
+            content = f'<UPF version="2.0.1">\n<PP_HEADER element="{element}"/>\n'
+            info = tarfile.TarInfo(path)
+            info.size = len(content)
+            tar.addfile(info, io.BytesIO(content.encode()))
+
+    downloads = []
+
+    class Response:
+        content = archive.getvalue()
+
+        def raise_for_status(self):
+            pass
+
+    def get(url, timeout):
+        downloads.append(url)
+        return Response()
+
+    monkeypatch.setattr(setup_pseudos.requests, "get", get)
+    monkeypatch.setattr(setup_pseudos, "FN_LOCKFILE", tmp_path / "install.lock")
+    cache_dir = tmp_path / "cache"
+
+    assert not setup_pseudos.pseudos_are_installed()
+    list(setup_pseudos.install(cache_dir=cache_dir))
+    assert len(downloads) == 1
+    assert setup_pseudos.cache_is_valid("pbe", cache_dir)
+    assert setup_pseudos.pseudos_are_installed()
+    node = orm.load_node(
+        orm.QueryBuilder()
+        .append(orm.UpfData, filters={"label": "Si.pbe-van_gipaw.UPF"}, project="id")
+        .one()[0]
+    )
+    assert node.element == "Si"
+
+    # nothing is done if the pseudos are installed
+    num_nodes = orm.QueryBuilder().append(orm.Data).count()
+    list(setup_pseudos.install(cache_dir=cache_dir))
+    assert len(downloads) == 1
+    assert orm.QueryBuilder().append(orm.Data).count() == num_nodes
+
+    # a modified file of the cache is downloaded again
+    (cache_dir / "pbe" / "gipaw_pseudos" / "Si.pbe-van_gipaw.UPF").write_text("")
+    assert not setup_pseudos.cache_is_valid("pbe", cache_dir)
+    list(setup_pseudos.install(force=True, cache_dir=cache_dir))
+    assert len(downloads) == 2
+    assert setup_pseudos.cache_is_valid("pbe", cache_dir)
+
+
+@pytest.mark.usefixtures("aiida_profile_clean")
+def test_get_builder_requires_pseudos(monkeypatch):
+    """Test the builder does not download the missing pseudos."""
+    from aiidalab_qe.plugins.xas import setup_pseudos, workchain
+
+    def get(*args, **kwargs):
+        raise AssertionError("the pseudos must not be downloaded")
+
+    monkeypatch.setattr(setup_pseudos.requests, "get", get)
+    parameters = {
+        "workchain": {"protocol": "fast"},
+        "xas": {
+            "core_hole_treatments": {"Si": "full"},
+            "elements_list": ["Si"],
+            "supercell_min_parameter": 4.0,
+            "pseudo_labels": {
+                "Si": {
+                    "gipaw": "Si.pbe-van_gipaw.UPF",
+                    "core_hole": "Si.star1s-pbe-van_gipaw.UPF",
+                }
+            },
+            "core_wfc_data_labels": {"Si": "Si.pbe-van_gipaw.dat"},
+        },
+    }
+    with pytest.raises(RuntimeError, match="python -m aiidalab_qe install-xas-pseudos"):
+        workchain.get_builder({}, None, parameters)
@@ -35,3 +35,57 @@ def test_settings():
     configure_step.settings["xps"].set_panel_value(parameters)
     assert configure_step.settings["xps"].core_level_list.children[0].value is True
     assert configure_step.settings["xps"].structure_type.value == "molecule"
+
+
+def test_xps_spectra_broadening():
+    """Test the broadening of the XPS spectra of all sites of an element."""
+    import numpy as np
+    from scipy.special import voigt_profile
+
+    from aiidalab_qe.plugins.xps.result import xps_spectra_broadening
+
+    equivalent_sites_data = {
+        "site_0": {"multiplicity": 1},
+        "site_1": {"multiplicity": 2},
+        "site_2": {"multiplicity": 3},
+    }
+    points = {"C": {"site_0": 0.0, "site_1": -1.0, "site_2": 2.5}}
+
+    spectra = xps_spectra_broadening(
+        points, equivalent_sites_data, gamma=0.2, sigma=0.1, intensity=2.0
+    )["C"]
+
+    x = spectra["total"][0]
+    assert len(x) == 500
+    for site, shift in points["C"].items():
+        weight = 2.0 * equivalent_sites_data[site]["multiplicity"] / 6
+        expected = weight * voigt_profile(x - shift, 0.1, 0.2)
+        assert np.allclose(spectra[site][1], expected)
+    total = sum(spectra[site][1] for site in points["C"])
+    assert np.allclose(spectra["total"][1], total)
+
+
+@pytest.mark.usefixtures("aiida_profile_clean")
+def test_get_nodes_by_label():
+    """Test that the pseudos are found by label with a single query."""
+    from aiida import orm
+
+    from aiidalab_qe.plugins.utils import get_nodes_by_label, store_nodes
+
+    nodes = [orm.Int(i) for i in range(4)]
+    for node, label in zip(nodes, ["O_1s", "O_gs", "C_1s", "O_1s"]):
+        node.label = label
+    store_nodes(nodes)
+    group = orm.Group(label="xps_pseudos").store()
+    group.add_nodes(nodes[1:])
+
+    # the oldest node is returned if several nodes have the same label
+    assert get_nodes_by_label(["O_1s", "O_gs", "N_1s"]) == {
+        "O_1s": nodes[0],
+        "O_gs": nodes[1],
+    }
+    assert get_nodes_by_label(["O_1s", "C_1s"], group=group) == {
+        "O_1s": nodes[3],
+        "C_1s": nodes[2],
+    }
+    assert get_nodes_by_label([]) == {}
@@ -0,0 +1,187 @@
+import pytest
+
+
+@pytest.fixture
+def frozen_now(monkeypatch):
+    """Freeze the current time of AiiDA, e.g. for the relative creation times.
+
+    The time is advanced by setting ``frozen_now.value``.
+    """
+    from types import SimpleNamespace
+
+    from aiida.common import timezone
+
+    frozen_now = SimpleNamespace(value=timezone.now())
+    monkeypatch.setattr(timezone, "now", lambda: frozen_now.value)
+    return frozen_now
+
+
+@pytest.mark.usefixtures("aiida_profile_clean", "frozen_now")
+def test_work_chain_selector_refresh():
+    """Test that the work chain selector only queries new and running work chains."""
+    from aiida import orm
+    from aiida.engine import ProcessState
+    from aiida.tools import delete_nodes
+
+    from aiidalab_qe.common.process import QeAppWorkChainSelector
+
+    def generate_work_chain(state):
+        node = orm.WorkChainNode()
+        node.set_process_label("QeAppWorkChain")
+        node.set_process_state(state)
+        return node.store()
+
+    finished = generate_work_chain(ProcessState.FINISHED)
+    running = generate_work_chain(ProcessState.RUNNING)
+    selector = QeAppWorkChainSelector()
+    assert [pk for _, pk in selector.work_chains_selector.options[1:]] == [
+        running.pk,
+        finished.pk,
+    ]
+    assert selector._last_pk == running.pk
+    assert selector._active_pks == {running.pk}
+
+    # nothing changed
+    assert not selector._update_options()
+
+    new = generate_work_chain(ProcessState.CREATED)
+    running.set_process_state(ProcessState.EXCEPTED)
+    selector.refresh_work_chains()
+    options = selector.work_chains_selector.options[1:]
+    assert [pk for _, pk in options] == [new.pk, running.pk, finished.pk]
+    assert "Excepted" in options[1][0]
+    assert selector._active_pks == {new.pk}
+
+    # setting the value to an unknown work chain fetches it
+    other = generate_work_chain(ProcessState.FINISHED)
+    selector.value = other.pk
+    assert selector.work_chains_selector.value == other.pk
+
+    # deleted work chains are removed
+    finished_pk = finished.pk
+    delete_nodes([finished_pk], dry_run=False)
+    selector.refresh_work_chains()
+    assert finished_pk not in [pk for _, pk in selector.work_chains_selector.options]
+
+
+@pytest.mark.usefixtures("aiida_profile_clean")
+def test_work_chain_selector_refresh_finished(frozen_now):
+    """Test that the options of the finished work chains are formatted again on
+    every refresh, and that the modified ones are queried again."""
+    from datetime import timedelta
+
+    from aiida import orm
+    from aiida.engine import ProcessState
+
+    from aiidalab_qe.common.process import QeAppWorkChainSelector
+
+    node = orm.WorkChainNode(label="before")
+    node.set_process_label("QeAppWorkChain")
+    node.set_process_state(ProcessState.FINISHED)
+    node.store()
+    frozen_now.value = node.ctime + timedelta(minutes=5)
+
+    selector = QeAppWorkChainSelector()
+    label, pk = selector.work_chains_selector.options[1]
+    assert pk == node.pk
+    assert "5m ago" in label and "before" in label
+    assert selector._active_pks == set()
+
+    frozen_now.value = node.ctime + timedelta(hours=2)
+    node.label = "after"
+    selector.refresh_work_chains()
+    label, _ = selector.work_chains_selector.options[1]
+    assert "2h ago" in label and "after" in label
+    assert "before" not in label
+
+
+@pytest.mark.usefixtures("aiida_profile_clean")
+def test_work_chain_selector_extra_fields(monkeypatch):
+    """Test that the extra fields are parsed from the projected extras."""
+    from aiida import orm
+    from aiida.engine import ProcessState
+
+    from aiidalab_qe.common.process import QeAppWorkChainSelector
+
+    node = orm.WorkChainNode()
+    node.set_process_label("QeAppWorkChain")
+    node.set_process_state(ProcessState.FINISHED)
+    node.store()
+    node.base.extras.set("structure", "Si2")
+    node.base.extras.set(
+        "workchain", {"relax_type": "positions", "properties": ["relax", "bands"]}
+    )
+
+    def parse_extra_info(self, pk):
+        raise AssertionError("the work chains must not be loaded one by one")
+
+    monkeypatch.setattr(QeAppWorkChainSelector, "parse_extra_info", parse_extra_info)
+    selector = QeAppWorkChainSelector()
+    label, pk = selector.work_chains_selector.options[1]
+
+    assert pk == node.pk
+    assert label.endswith("Si2\tstructure is relaxed\tbands")
+
+
+@pytest.mark.usefixtures("aiida_profile_clean")
+def test_adaptive_process_monitor():
+    """Test that the monitor polls less often while the process does not change."""
+    from aiida import orm
+    from aiida.engine import ProcessState
+
+    from aiidalab_qe.common.process import AdaptiveProcessMonitor
+
+    node = orm.WorkChainNode()
+    node.set_process_state(ProcessState.RUNNING)
+    node.store()
+
+    delays = []
+    calls = []
+
+    def wait(timeout):
+        delays.append(timeout)
+        if len(delays) == 4:
+            node.set_process_state(ProcessState.WAITING)
+        elif len(delays) == 6:
+            node.set_process_state(ProcessState.FINISHED)
+            node.seal()
+        # woken up by a state change
+        return len(delays) == 5
+
+    monitor = AdaptiveProcessMonitor(
+        timeout=0.1, max_timeout=0.5, callbacks=[lambda: calls.append(None)]
+    )
+    monitor._wait = wait
+    monitor._monitor_process(node.uuid)
+
+    assert delays == [0.1, 0.2, 0.4, 0.5, 0.1, 0.1]
+    # the callbacks are run after each wait and once more after the process is sealed
+    assert len(calls) == 7
+
+
+def test_adaptive_process_monitor_senders():
+    """Test that only the state changes of the process and of its descendants
+    wake up the monitor."""
+    from aiida import orm
+    from aiida.common import LinkType
+    from aiida.engine import ProcessState
+
+    from aiidalab_qe.common.process import AdaptiveProcessMonitor
+
+    node = orm.WorkChainNode()
+    node.set_process_state(ProcessState.FINISHED)
+    node.store()
+    child = orm.CalcJobNode()
+    child.base.links.add_incoming(node, LinkType.CALL_CALC, "child")
+    child.store()
+    other = orm.WorkChainNode().store()
+
+    monitor = AdaptiveProcessMonitor(timeout=0.1)
+    monitor._wait = lambda timeout: node.seal() or False
+    monitor._monitor_process(node.uuid)
+    assert monitor._senders == {node.pk, child.pk}
+
+    monitor._on_state_changed(None, None, other.pk, "state_changed.running.x", None)
+    assert not monitor._wake_up.is_set()
+    monitor._on_state_changed(None, None, child.pk, "state_changed.running.x", None)
+    assert monitor._wake_up.is_set()
@@ -1,3 +1,6 @@
+import pytest
+
+
 def test_result_step(app_to_submit, generate_qeapp_workchain):
     """Test the result step is properly updated when the process
     is running."""
@@ -7,8 +10,10 @@ def test_result_step(app_to_submit, generate_qeapp_workchain):
     assert step.state == step.State.ACTIVE
 
 
-def test_workchainview(generate_qeapp_workchain):
+def test_workchainview(generate_qeapp_workchain, main_loop):
     """Test the result tabs are properly updated"""
+    import ipywidgets as ipw
+
     from aiidalab_qe.app.result.workchain_viewer import WorkChainViewer
 
     wkchain = generate_qeapp_workchain()
@@ -16,6 +21,46 @@ def test_workchainview(generate_qeapp_workchain):
     assert len(wcv.result_tabs.children) == 5
     assert wcv.result_tabs._titles["0"] == "Workflow Summary"
     assert wcv.result_tabs._titles["1"] == "Final Geometry"
+    # the result panels are only loaded when their tab is first selected
+    result = wcv.result_tabs.children[2]
+    assert result.identifier not in wcv._results_loaded
+    wcv.result_tabs.selected_index = 2
+    wcv._result_threads[result.identifier].join()
+    # the widgets are built in the main thread
+    assert isinstance(result.children[0], ipw.HTML)
+    main_loop.run()
+    assert not isinstance(result.children[0], ipw.HTML)
+
+
+def test_workchainview_callback_after_threaded_load(
+    generate_qeapp_workchain, main_loop
+):
+    """Test the callbacks of a result panel loaded in a worker thread can
+    read the outputs in the main thread."""
+    from aiida import engine
+
+    from aiidalab_qe.app.result.workchain_viewer import WorkChainViewer
+
+    wkchain = generate_qeapp_workchain()
+    wkchain.node.set_exit_status(0)
+    wkchain.node.set_process_state(engine.ProcessState.FINISHED)
+    wcv = WorkChainViewer(wkchain.node)
+    index, result = next(
+        (index, tab)
+        for index, tab in enumerate(wcv.result_tabs.children)
+        if getattr(tab, "identifier", "") == "electronic_structure"
+    )
+    wcv.result_tabs.selected_index = index
+    wcv._result_threads[result.identifier].join()
+    main_loop.run()
+
+    widget = result.children[0]
+    pdos_data = widget.pdos_data
+    # not in the data extracted by the worker thread
+    widget.dos_plot_group.value = "angular_momentum"
+    widget.update_plot_button.click()
+    assert widget.pdos_data is not pdos_data
+    assert widget.pdos_data["dos"]
 
 
 def test_summary_report(data_regression, generate_qeapp_workchain):
@@ -61,3 +106,242 @@ def test_summary_view(generate_qeapp_workchain):
     for key, value in parameters.items():
         td = parsed.find("td", text=key).find_next_sibling("td")
         assert td.text == value
+
+
+@pytest.mark.usefixtures("aiida_profile_clean")
+def test_write_archive(tmp_path, generate_qeapp_calcjob_graph):
+    """Test the archive of the calculation job input and output files."""
+    import json
+    import stat
+    import zipfile
+
+    from aiidalab_qe.app.result.workchain_viewer import WorkChainOutputs
+
+    node = generate_qeapp_calcjob_graph()
+    filename = tmp_path / "archive.zip"
+    WorkChainOutputs._write_archive(node, filename)
+
+    with zipfile.ZipFile(filename) as archive:
+        names = archive.namelist()
+        links = json.loads(archive.read("pseudos/manifest.json"))
+        # the pseudopotentials are stored once, with links in each calculation
+        pseudos = [name for name in names if name.startswith("pseudos/")]
+        assert len(pseudos) == 3
+        assert set(links.values()) == set(pseudos) - {"pseudos/manifest.json"}
+        assert sorted(name for name in names if not name.startswith("pseudos/")) == [
+            "01-relax-iter1-pw1/aiida.in",
+            "01-relax-iter1-pw1/aiida.out",
+            "01-relax-iter1-pw1/pseudo/O.upf",
+            "01-relax-iter1-pw1/pseudo/Si.upf",
+            "02-bands-scf-pw1/aiida.in",
+            "02-bands-scf-pw1/aiida.out",
+            "02-bands-scf-pw1/pseudo/O.upf",
+            "02-bands-scf-pw1/pseudo/Si.upf",
+        ]
+        assert archive.read("02-bands-scf-pw1/aiida.out") == b"bands output"
+        assert b'element="Si"' in archive.read(links["02-bands-scf-pw1/pseudo/Si.upf"])
+        archive.extractall(tmp_path / "extracted")
+
+    # the links are extracted as symbolic links by the ``unzip`` command
+    link = archive.getinfo("01-relax-iter1-pw1/pseudo/Si.upf")
+    assert stat.S_ISLNK(link.external_attr >> 16)
+    assert (
+        tmp_path / "extracted" / "01-relax-iter1-pw1/pseudo/Si.upf"
+    ).read_text() == (f"../../{links['01-relax-iter1-pw1/pseudo/Si.upf']}")
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+@pytest.mark.usefixtures("aiida_profile_clean")
+@pytest.mark.parametrize("workers", [1, 4])
+def test_iter_object_handles(monkeypatch, workers):
+    """Test the objects of the archive are read in order, by a pool of threads
+    with their own disk-objectstore container."""
+    import io
+    import threading
+
+    from aiida.manage import get_manager
+
+    from aiidalab_qe.app.result import workchain_viewer
+    from aiidalab_qe.app.result.workchain_viewer import WorkChainOutputs
+
+    monkeypatch.setattr(workchain_viewer, "ARCHIVE_READ_WORKERS", workers)
+    repository = get_manager().get_profile_storage().get_repository()
+    contents = [f"object {i}".encode() * (i + 1) for i in range(20)]
+    keys = [
+        repository.put_object_from_filelike(io.BytesIO(content)) for content in contents
+    ]
+
+    threads = set()
+    container_class = type(repository._container)
+    get_object_stream = container_class.get_object_stream
+
+    def spy(container, key):
+        threads.add(threading.current_thread())
+        return get_object_stream(container, key)
+
+    monkeypatch.setattr(container_class, "get_object_stream", spy)
+    handles = WorkChainOutputs._iter_object_handles(repository, keys)
+    read = [(key, handle.read()) for key, handle in handles]
+    assert sorted(read) == sorted(zip(keys, contents))
+    if workers > 1:
+        assert read == list(zip(keys, contents))
+        assert threading.current_thread() not in threads
+        assert 1 < len(threads) <= workers
+
+    # the pending reads are dropped when the archive is not written to the end
+    handles = WorkChainOutputs._iter_object_handles(repository, keys)
+    key, handle = next(handles)
+    assert handle.read() == contents[keys.index(key)]
+    handles.close()
+
+
+@pytest.mark.usefixtures("aiida_profile_clean")
+def test_prebuild_archive(tmp_path, monkeypatch, generate_qeapp_calcjob_graph):
+    """Test the archive built in the background is served by the download button."""
+    import threading
+
+    from aiidalab_qe.app.result.workchain_viewer import WorkChainOutputs
+
+    node = generate_qeapp_calcjob_graph()
+    outputs = WorkChainOutputs(node, export_dir=tmp_path)
+    busy = []
+    outputs.observe(lambda change: busy.append(change["new"]), "_busy")
+    thread = threading.Thread(target=outputs.prebuild_archive)
+    thread.start()
+    thread.join()
+
+    fn_archive = tmp_path / f"{node.uuid}.zip"
+    assert fn_archive.is_file()
+    # the progress is shown instead of the button while building
+    assert busy == [True, False]
+
+    def write_archive(*args):
+        raise AssertionError("the archive must not be built again")
+
+    served = []
+    monkeypatch.setattr(WorkChainOutputs, "_write_archive", write_archive)
+    monkeypatch.setattr(outputs, "_serve_archive", served.append)
+    outputs._download_archive_button.click()
+    assert served == [fn_archive]
+
+
+def test_download_archive(
+    tmp_path, monkeypatch, main_loop, generate_qeapp_calcjob_graph
+):
+    """Test the download button builds the archive in the background and
+    serves it from the main thread once it is ready."""
+    from aiidalab_qe.app.result.workchain_viewer import WorkChainOutputs
+
+    node = generate_qeapp_calcjob_graph()
+    outputs = WorkChainOutputs(node, export_dir=tmp_path)
+    served = []
+    monkeypatch.setattr(outputs, "_serve_archive", served.append)
+    outputs._download_archive_button.click()
+    outputs._archive_thread.join()
+
+    fn_archive = tmp_path / f"{node.uuid}.zip"
+    assert fn_archive.is_file()
+    assert served == []
+    main_loop.run()
+    assert served == [fn_archive]
+
+
+@pytest.mark.usefixtures("aiida_profile_clean")
+def test_download_archive_failure(
+    tmp_path, monkeypatch, main_loop, generate_qeapp_calcjob_graph
+):
+    """Test a failure to build the archive is shown from the main thread."""
+    from aiidalab_qe.app.result.workchain_viewer import WorkChainOutputs
+
+    original_write_archive = WorkChainOutputs._write_archive
+
+    def write_archive(*args):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(WorkChainOutputs, "_write_archive", write_archive)
+    node = generate_qeapp_calcjob_graph()
+    outputs = WorkChainOutputs(node, export_dir=tmp_path)
+    served = []
+    monkeypatch.setattr(outputs, "_serve_archive", served.append)
+    outputs._download_archive_button.click()
+    outputs._archive_thread.join()
+
+    assert not outputs._busy
+    assert outputs._archive_message.value == ""
+    main_loop.run()
+    assert "No space left on device" in outputs._archive_message.value
+    assert served == []
+    assert not (tmp_path / f"{node.uuid}.zip").exists()
+
+    # the message is cleared when the download is tried again
+    monkeypatch.setattr(WorkChainOutputs, "_write_archive", original_write_archive)
+    outputs._download_archive_button.click()
+    outputs._archive_thread.join()
+    main_loop.run()
+    assert outputs._archive_message.value == ""
+    assert served == [tmp_path / f"{node.uuid}.zip"]
+
+
+@pytest.mark.usefixtures("aiida_profile_clean")
+def test_prebuild_archive_failure(
+    tmp_path, monkeypatch, main_loop, generate_qeapp_calcjob_graph
+):
+    """Test a failure to prebuild the archive from the process monitor of the
+    viewer is shown from the main thread."""
+    from types import SimpleNamespace
+
+    from aiidalab_qe.app.result.workchain_viewer import (
+        WorkChainOutputs,
+        WorkChainViewer,
+    )
+
+    def write_archive(*args):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(WorkChainOutputs, "_write_archive", write_archive)
+    monkeypatch.chdir(tmp_path)
+    node = generate_qeapp_calcjob_graph()
+    errors = []
+    viewer = SimpleNamespace(_main_loop=main_loop, _show_archive_error=errors.append)
+    WorkChainViewer._prebuild_archive(viewer, node.uuid)
+    assert errors == []
+    main_loop.run()
+    assert [str(error) for error in errors] == ["No space left on device"]
+
+    # the outputs are shown already
+    viewer.workflows_output = WorkChainOutputs(node, export_dir=tmp_path)
+    WorkChainViewer._prebuild_archive(viewer, node.uuid)
+    main_loop.run()
+    assert "No space left" in viewer.workflows_output._archive_message.value
+    assert not viewer.workflows_output._busy
+
+
+def test_download_archive_built_elsewhere(
+    tmp_path, monkeypatch, main_loop, generate_qeapp_calcjob_graph
+):
+    """Test the download button waits for the archive built by another
+    process, and serves it once it is ready."""
+    from filelock import FileLock
+
+    from aiidalab_qe.app.result.workchain_viewer import WorkChainOutputs
+
+    def write_archive(*args):
+        raise AssertionError("the archive must not be built again")
+
+    node = generate_qeapp_calcjob_graph()
+    outputs = WorkChainOutputs(node, export_dir=tmp_path)
+    served = []
+    monkeypatch.setattr(WorkChainOutputs, "_write_archive", write_archive)
+    monkeypatch.setattr(outputs, "_serve_archive", served.append)
+
+    fn_archive = tmp_path / f"{node.uuid}.zip"
+    with FileLock(fn_archive.with_suffix(".lock")):
+        outputs._download_archive_button.click()
+        # the progress is shown until the archive is ready
+        outputs._archive_thread.join(timeout=0.5)
+        assert outputs._busy
+        fn_archive.write_bytes(b"archive")
+    outputs._archive_thread.join()
+    main_loop.run()
+    assert served == [fn_archive]
+    assert not outputs._busy
@@ -0,0 +1,112 @@
+import pytest
+
+
+@pytest.fixture
+def generate_qeapp_jobs(aiida_profile):
+    """Store ``QeAppWorkChain`` process nodes with the given states and properties."""
+    from aiida import orm
+
+    from aiidalab_qe.workflows import QeAppWorkChain
+
+    def _generate_qeapp_jobs(jobs):
+        nodes = []
+        for label, state, properties in jobs:
+            node = orm.WorkChainNode(process_type=QeAppWorkChain.build_process_type())
+            node.label = label
+            node.set_process_state(state)
+            node.store()
+            node.base.extras.set("structure", "Si2")
+            node.base.extras.set(
+                "workchain", {"relax_type": "none", "properties": properties}
+            )
+            nodes.append(node)
+        return nodes
+
+    return _generate_qeapp_jobs
+
+
+def wait_for_update(qi):
+    """Wait until the scheduled update of the table is done."""
+    qi._timer.join()
+
+
+@pytest.mark.usefixtures("aiida_profile_clean")
+def test_query_interface(generate_qeapp_jobs):
+    """Test that the filters and the pagination are applied by the query."""
+    from aiida.engine import ProcessState
+
+    from aiidalab_qe.app.utils.search_jobs import QueryInterface
+
+    nodes = generate_qeapp_jobs(
+        [
+            ("Si2 bands", ProcessState.FINISHED, ["bands"]),
+            ("Si2 bands pdos", ProcessState.FINISHED, ["bands", "pdos"]),
+            ("Si2 pdos", ProcessState.EXCEPTED, ["relax", "pdos"]),
+        ]
+    )
+
+    qi = QueryInterface(debounce_delay=0)
+    assert qi.page_info.value == "Page 1 of 1 (3 jobs in total)"
+    assert qi.table.value.count("<tr>") == 4
+
+    qi.job_state_dropdown.value = "finished"
+    assert qi.get_query().count() == 2
+    qi.label_search_field.value = "PDOS"
+    assert qi.get_query().all(flat=True) == [nodes[1]]
+    qi.label_search_field.value = ""
+
+    qi.job_state_dropdown.value = ""
+    for checkbox in qi.properties_box.children:
+        checkbox.value = checkbox.description in ("bands", "pdos")
+    assert qi.get_query().all(flat=True) == [nodes[1]]
+    for checkbox in qi.properties_box.children:
+        checkbox.value = False
+
+    # the jobs are sorted by creation time, the most recent first
+    qi.page_size_dropdown.options = [2, *qi.page_size_dropdown.options]
+    qi.page_size_dropdown.value = 2
+    wait_for_update(qi)
+    assert qi.page_info.value == "Page 1 of 2 (3 jobs in total)"
+    assert f"<td>{nodes[2].pk}</td>" in qi.table.value
+    qi.next_page_button.click()
+    wait_for_update(qi)
+    assert qi.page_info.value == "Page 2 of 2 (3 jobs in total)"
+    assert qi.next_page_button.disabled
+    assert f"<td>{nodes[0].pk}</td>" in qi.table.value
+    assert f"<td>{nodes[2].pk}</td>" not in qi.table.value
+    # changing a filter goes back to the first page
+    qi.time_start.value = nodes[0].ctime.date()
+    wait_for_update(qi)
+    assert qi.page == 0
+    assert qi.get_query().count() == 3
+
+
+@pytest.mark.usefixtures("aiida_profile_clean")
+def test_query_interface_debounce(generate_qeapp_jobs):
+    """Test that only the last of several quick changes of a filter updates the table."""
+    from aiida.engine import ProcessState
+
+    from aiidalab_qe.app.utils.search_jobs import QueryInterface
+
+    nodes = generate_qeapp_jobs(
+        [
+            ("Si2 bands", ProcessState.FINISHED, ["bands"]),
+            ("Si2 pdos", ProcessState.FINISHED, ["pdos"]),
+        ]
+    )
+    qi = QueryInterface(debounce_delay=0.5)
+    table = qi.table.value
+    for value in ("p", "pd", "pdo"):
+        qi.label_search_field.value = value
+    # nothing is updated before the delay has passed
+    assert qi.table.value == table
+    wait_for_update(qi)
+    assert qi.page_info.value == "Page 1 of 1 (1 jobs in total)"
+    assert f"<td>{nodes[1].pk}</td>" in qi.table.value
+
+    # an update scheduled before the last change of the filters is discarded
+    qi.label_search_field.value = ""
+    qi.update_table(generation=qi._generation - 1)
+    assert qi.page_info.value == "Page 1 of 1 (1 jobs in total)"
+    wait_for_update(qi)
+    assert qi.page_info.value == "Page 1 of 1 (2 jobs in total)"
@@ -0,0 +1,118 @@
+import time
+
+
+def wait_until(condition, timeout=10):
+    """Wait until ``condition()`` is true, for at most ``timeout`` seconds."""
+    start = time.time()
+    while not condition():
+        assert time.time() - start < timeout, "timed out"
+        time.sleep(0.05)
+
+
+def test_calcjob_output_follower(tmp_path, fixture_localhost):
+    """Test that only the new bytes of the remote output file are fetched."""
+    from aiida import orm
+    from aiida.common import LinkType
+
+    from aiidalab_qe.common.widgets import CalcJobOutputFollower
+
+    calcjob = orm.CalcJobNode(computer=fixture_localhost)
+    calcjob.set_option("output_filename", "aiida.out")
+    calcjob.store()
+    remote = orm.RemoteData(remote_path=str(tmp_path), computer=fixture_localhost)
+    remote.base.links.add_incoming(calcjob, LinkType.CREATE, "remote_folder")
+    remote.store()
+    output_file = tmp_path / "aiida.out"
+    output_file.write_bytes(b"line 1\nline 2\nline")
+
+    offsets = []
+    follower = CalcJobOutputFollower()
+    fetch_output = follower._fetch_output
+
+    def spy_fetch_output(calcjob, offset=0, transport=None):
+        offsets.append(offset)
+        return fetch_output(calcjob, offset, transport)
+
+    follower._fetch_output = spy_fetch_output
+    follower.calcjob_uuid = calcjob.uuid
+    try:
+        # the last line is only shown once it is complete
+        wait_until(lambda: follower.output == ["line 1", "line 2"])
+
+        with output_file.open("ab") as handle:
+            handle.write(b" 3\nline 4\n")
+        wait_until(lambda: follower.lineno == 4)
+        assert follower.output == ["line 1", "line 2", "line 3", "line 4"]
+        assert follower.filename == "aiida.out"
+        # the file is read from the end of the previous read
+        wait_until(lambda: offsets[-1] == output_file.stat().st_size)
+        assert offsets[0] == 0
+        assert len(set(offsets)) == 3
+
+        calcjob.seal()
+        follower._push_thread.join(timeout=10)
+        assert not follower._push_thread.is_alive()
+    finally:
+        # stop following
+        follower.calcjob_uuid = None
+
+
+def test_calcjob_output_follower_max_lines(tmp_path, fixture_localhost):
+    """Test that only the last lines are kept and older ones are read again."""
+    from aiida import orm
+    from aiida.common import LinkType
+
+    from aiidalab_qe.common.widgets import CalcJobOutputFollower, LogOutputWidget
+
+    calcjob = orm.CalcJobNode(computer=fixture_localhost)
+    calcjob.set_option("output_filename", "aiida.out")
+    calcjob.store()
+    remote = orm.RemoteData(remote_path=str(tmp_path), computer=fixture_localhost)
+    remote.base.links.add_incoming(calcjob, LinkType.CREATE, "remote_folder")
+    remote.store()
+    lines = [f"line {i}" for i in range(10)]
+    (tmp_path / "aiida.out").write_text("\n".join(lines) + "\n")
+
+    follower = CalcJobOutputFollower(max_lines=3)
+    follower.calcjob_uuid = calcjob.uuid
+    try:
+        wait_until(lambda: follower.lineno == 10)
+        assert follower.output == lines[-3:]
+        assert follower.first_lineno == 7
+        assert follower.get_lines(8) == lines[8:]
+        # older lines are read again from the file
+        assert follower.get_lines(2, 5) == lines[2:5]
+        assert follower.get_lines(5) == lines[5:]
+        assert follower.get_lines() == lines
+    finally:
+        follower.calcjob_uuid = None
+
+    log_output = LogOutputWidget(max_lines=2)
+    log_output.append(lines[:3])
+    log_output.append(lines[3:4])
+    assert log_output.value == "line 2\nline 3"
+    log_output.clear()
+    assert log_output.value == ""
+
+
+def test_log_output_widget_sends_new_lines():
+    """Test that appending lines only updates the pages of the output they change."""
+    from aiidalab_qe.common.widgets import LogOutputWidget
+
+    log_output = LogOutputWidget(max_lines=250)
+    log_output.append([f"line {i}" for i in range(290)])
+    pages = log_output._rolling_output.children
+    assert len(pages) == 3
+    assert "line 40\n" in pages[0].value
+    assert "line 39\n" not in pages[0].value
+
+    updated = []
+    for page in pages:
+        page.observe(lambda change: updated.append(change["owner"]), "value")
+    log_output.append(["line 290"])
+    # the middle page is not sent again
+    assert updated == [pages[0], pages[-1]]
+    assert "line 40\n" not in pages[0].value
+    assert log_output._rolling_output.children == pages
+    assert log_output.value.splitlines()[-1] == "line 290"
+    assert len(log_output.value.splitlines()) == 250